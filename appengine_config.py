@@ -1,6 +1,19 @@
 """`appengine_config` gets loaded when starting a new application instance."""
+import os
+import time
+
+# PROFILE_IMPORTS: 'true' in app.yaml logs what a cold start spends its time
+# importing (see util/import_profile.py).
+_profile_imports = os.environ.get('PROFILE_IMPORTS') == 'true'
+if _profile_imports:
+    from util import import_profile
+    import_profile.install()
+
 import vendor
 # insert `lib` as a site directory so our `main` module can load
 # third-party libraries, and override built-ins with newer
 # versions.
+_vendor_start = time.time()
 vendor.add('lib')
+if _profile_imports:
+    import_profile.record('vendor.add(lib)', (time.time() - _vendor_start) * 1000)
@@ -0,0 +1,436 @@
+"""Compact, pre-indexed model of Lever feedback forms.
+
+Each raw feedback dict from Lever is parsed once into a `Feedback`. Its fields
+are indexed by label and its sort rank, form version and lowercased labels
+are computed up front, so compiling a packet doesn't rescan or re-lowercase
+the same fields over and over.
+"""
+import logging
+from operator import attrgetter
+
+logger = logging.getLogger(__name__)
+
+TEAM_FEEDBACK_KEY = u"Did the candidate give you any information about their interests that would help determine team fit?"
+ANYTHING_ELSE_TO_KNOW_KEY = u"Is there anything else we should consider when making the final hiring decision?"
+RATING_KEY = u'Rating'
+TEAM_SUGGESTION_KEY = u'Team Suggestions'
+INTERN_EVALUATION_PREFIX = 'Intern Evaluations'
+
+FIELD_BLACKLIST = frozenset([
+    TEAM_FEEDBACK_KEY,
+    ANYTHING_ELSE_TO_KNOW_KEY,
+    RATING_KEY,
+])
+
+
+class InterviewTypes(object):
+    PROBLEM_SOLVING = 'problem solving'
+    SYSTEM_DESIGN = 'system design'
+    PLAYS_WELL = 'plays well with others'
+    OWNERSHIP = 'ownership'
+
+
+FEEDBACK_ORDERING = [
+    InterviewTypes.PROBLEM_SOLVING,
+    InterviewTypes.SYSTEM_DESIGN,
+    InterviewTypes.PLAYS_WELL,
+    InterviewTypes.OWNERSHIP,
+]
+
+
+def _assign_arbitrary_feedback_ordering(feedback_title):
+    feedback_title = feedback_title.lower()
+    for rank, interview_type in enumerate(FEEDBACK_ORDERING):
+        if interview_type in feedback_title:
+            # Increment by 1 since 0 is reserved for phone interviews, which
+            # must come first :P
+            return rank + 1
+    return None
+
+
+# Interview type codes: 0 for titles outside FEEDBACK_ORDERING, then the
+# FEEDBACK_ORDERING categories in order.
+INTERVIEW_TYPES = ['other'] + FEEDBACK_ORDERING
+
+
+def interview_type_code(title):
+    return _assign_arbitrary_feedback_ordering(title) or 0
+
+
+def _truncate_header(header):
+    # Strip out the word "Engineering" because it's redundant
+    if header['interview_type'].startswith('Engineering - '):
+        header['interview_type'] = header['interview_type'][len('Engineering - '):]
+    try:
+        score = int(header['score'][0])
+        header['score'] = str(score)
+    except Exception:
+        pass
+    return header
+
+
+class Field(object):
+    """A form question, parsed once per distinct label text.
+
+    Lever forms reuse the same questions across every candidate, so a `Field`
+    is interned by its text and shared by all the feedback that asks it.
+    """
+    __slots__ = ('text', 'label', 'is_overall', 'is_notes', 'is_blacklisted')
+
+    def __init__(self, text):
+        lowered = text.lower()
+        self.text = text
+        # Intern form labels look like "Technical Ability - how well did...".
+        self.label = text.split('-')[0].strip()
+        self.is_overall = lowered.startswith('overall')
+        self.is_notes = lowered.startswith('notes')
+        self.is_blacklisted = text in FIELD_BLACKLIST
+
+
+class FormLayout(object):
+    """The sequence of questions on a form, indexed once per distinct form.
+
+    Every feedback submitted on the same Lever form template has the same
+    questions in the same order, so the label index, form version and the
+    positions shown in a packet are computed once per template and shared.
+    """
+    __slots__ = ('fields', 'positions', 'visible_fields', 'form_version')
+
+    def __init__(self, texts):
+        self.fields = [Field(text) for text in texts]
+        self.positions = {}
+        for position, text in reversed(list(enumerate(texts))):
+            # The first position wins for a repeated label, like a linear
+            # scan would.
+            self.positions[text] = position
+        self.visible_fields = [
+            (position, field.text)
+            for position, field in enumerate(self.fields)
+            if not field.is_blacklisted
+        ]
+        # New form was released that allowed the reviewer to provide notes for
+        # each evaluation metric, whereas before there was one overall notes
+        # field.
+        notes_field_count = sum(1 for field in self.fields if field.is_notes)
+        self.form_version = 2 if notes_field_count > 1 else 1
+
+
+# Distinct form layouts and feedback titles seen by this instance. Both are
+# small, closed sets, but cap them anyway in case forms are generated.
+_MAX_INTERNED = 10000
+_layouts = {}
+_sort_ranks_by_title = {}
+
+
+def layout_for(texts):
+    layout = _layouts.get(texts)
+    if layout is None:
+        if len(_layouts) >= _MAX_INTERNED:
+            _layouts.clear()
+        layout = _layouts[texts] = FormLayout(texts)
+    return layout
+
+
+def _sort_rank(title):
+    """Rank of a feedback title: 0 for phone screens, then FEEDBACK_ORDERING.
+
+    None means the title isn't ranked and sorts by completion time instead.
+    """
+    try:
+        return _sort_ranks_by_title[title]
+    except KeyError:
+        pass
+    if len(_sort_ranks_by_title) >= _MAX_INTERNED:
+        _sort_ranks_by_title.clear()
+    lowered_title = title.lower()
+    if 'phone' in lowered_title:
+        rank = 0
+    else:
+        rank = _assign_arbitrary_feedback_ordering(lowered_title)
+    _sort_ranks_by_title[title] = rank
+    return rank
+
+
+class Feedback(object):
+    """One completed feedback form, with its fields indexed by label."""
+    __slots__ = (
+        'raw',
+        'id',
+        'text',
+        'user',
+        'completed_at',
+        'layout',
+        'field_values',
+        'sort_key',
+        'is_intern_evaluation',
+    )
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.id = raw.get('id')
+        self.text = raw['text']
+        self.user = raw['user']
+        self.completed_at = raw['completedAt']
+
+        raw_fields = raw['fields']
+        texts = tuple([field['text'] for field in raw_fields])
+        self.layout = layout_for(texts)
+        self.field_values = [field['value'] for field in raw_fields]
+
+        # Phone interviews always go first, then the documented interview
+        # order, then everything else by completion time.
+        rank = _sort_rank(self.text)
+        self.sort_key = rank if rank is not None else self.completed_at
+        self.is_intern_evaluation = self.text.startswith(INTERN_EVALUATION_PREFIX)
+
+    @property
+    def fields(self):
+        """(Field, value) pairs in form order."""
+        return zip(self.layout.fields, self.field_values)
+
+    @property
+    def intern_form_version(self):
+        return self.layout.form_version
+
+    def value(self, label, default=None):
+        position = self.layout.positions.get(label)
+        if position is None:
+            if default is None:
+                raise KeyError(label)
+            return default
+        return self.field_values[position]
+
+    def intern_fields(self):
+        if self.layout.form_version == 2:
+            return _determine_intern_fields_form_v2(self.fields)
+        return _determine_intern_fields_form_v1(self.fields)
+
+
+def _determine_intern_fields_form_v1(fields):
+    cleaned_fields = dict(
+        overall_score=None,
+        notes=None,
+        other_random_fields=[],
+    )
+    for field, value in fields:
+        if field.is_overall:
+            cleaned_fields['overall_score'] = value
+            continue
+        if field.is_notes:
+            cleaned_fields['notes'] = value
+            continue
+        cleaned_fields['other_random_fields'].append({
+            'label': field.label,
+            'text': value,
+        })
+    return cleaned_fields
+
+
+def _determine_intern_fields_form_v2(fields):
+    cleaned_fields = dict(
+        overall_score=None,
+        notes=None,
+        other_random_fields=[],
+    )
+    current_eval_field = {}
+    for field, value in fields:
+        if field.is_overall:
+            cleaned_fields['overall_score'] = value
+            continue
+        if field.is_notes:
+            # Notes field corresponds to previous eval field in v2. Append to
+            # fields list then clear the slate.
+            current_eval_field['notes'] = value
+            cleaned_fields['other_random_fields'].append(current_eval_field)
+            current_eval_field = {}
+            continue
+        if current_eval_field:
+            # Have a current eval being considering means there was no notes,
+            # so we can persist the current as is and assume this iteration is
+            # starting a next one.
+            cleaned_fields['other_random_fields'].append(current_eval_field)
+        current_eval_field = {
+            'label': field.label,
+            'text': value,
+        }
+    if current_eval_field:
+        cleaned_fields['other_random_fields'].append(current_eval_field)
+    return cleaned_fields
+
+
+def parse_feedbacks(raw_feedbacks):
+    return [Feedback(raw) for raw in raw_feedbacks]
+
+
+def compile_packet(raw_feedbacks, users):
+    """Build the (headers, feedbacks) pair the Catapult page renders.
+
+    `users` maps Lever user IDs to user dicts. Feedback whose interviewer or
+    rating is missing is still returned, but without a header. The raw dicts
+    are left alone: each returned feedback is a copy with the page's fields
+    added, since the raw ones may be shared, e.g. by the in-memory store.
+    """
+    parsed = sorted(parse_feedbacks(raw_feedbacks), key=attrgetter('sort_key'))
+    headers = []
+    feedbacks = []
+    for model in parsed:
+        feedback = dict(model.raw)
+        feedbacks.append(feedback)
+        try:
+            user = users[model.user]
+            feedback['username'] = user['name']
+            feedback['score'] = model.value(RATING_KEY)
+            header = {
+                'score': feedback['score'],
+                'interviewer': user['name'].strip(),
+                'interview_type': model.text.strip(),
+            }
+            headers.append(_truncate_header(header))
+
+            values = model.field_values
+            feedback['feedback_text'] = values[0]
+            feedback['feedback_texts'] = [{
+                'header': text,
+                'text': values[position],
+            } for position, text in model.layout.visible_fields]
+
+            # There are two types of team feedback, the old "Team Suggestion"
+            # and the newer, really long one defined by TEAM_FEEDBACK_KEY.
+            # Account for both of these and conditionally include them in the
+            # feedback payload
+            feedback['team_suggestion'] = model.value(TEAM_SUGGESTION_KEY, '')
+            feedback['team_feedback'] = model.value(TEAM_FEEDBACK_KEY, '')
+            feedback['anything_else_we_should_know'] = model.value(
+                ANYTHING_ELSE_TO_KNOW_KEY,
+                '',
+            )
+        except Exception:
+            logger.exception('could not compile feedback %s', feedback.get('id'))
+    return headers, feedbacks
+
+
+def compile_intern_packet(raw_feedbacks, users):
+    """Build the (headers, feedbacks) pair the Trebuchet page renders."""
+    parsed = sorted(parse_feedbacks(raw_feedbacks), key=attrgetter('completed_at'))
+    headers = []
+    feedbacks = []
+    for model in parsed:
+        user = users[model.user]
+        cleaned_fields = model.intern_fields()
+        cleaned_fields['username'] = user['name']
+        # Lever's stamps, so rendered fragments can be cached per revision.
+        cleaned_fields['id'] = model.id
+        cleaned_fields['completedAt'] = model.completed_at
+        cleaned_fields['updatedAt'] = model.raw.get('updatedAt')
+        feedbacks.append(cleaned_fields)
+        headers.append(dict(
+            score=cleaned_fields['overall_score'],
+            interviewer=user['name'].strip(),
+        ))
+    return headers, feedbacks
+
+
+def score_value(score):
+    """The number a rating like u'3 - Hire' starts with, or None."""
+    try:
+        return int(score.strip()[0])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def summarize_intern_packet(candidate, headers):
+    """One row of the cohort report, from `compile_intern_packet`'s headers.
+
+    Headers are in completion order, so the last score is the latest one.
+    Unparseable scores count as evaluations but not towards the numbers.
+    """
+    scores = [score_value(header['score']) for header in headers]
+    numeric = [score for score in scores if score is not None]
+    return dict(
+        candidate_id=candidate['id'],
+        name=candidate.get('name'),
+        evaluations=len(headers),
+        mean_score=round(sum(numeric) / float(len(numeric)), 2) if numeric else None,
+        min_score=min(numeric) if numeric else None,
+        max_score=max(numeric) if numeric else None,
+        latest_score=numeric[-1] if numeric else None,
+        scores=scores,
+    )
+
+
+EXPORT_COLUMNS = [
+    'type',
+    'candidate_id',
+    'candidate_name',
+    'feedback_id',
+    'interview',
+    'interviewer_id',
+    'interviewer',
+    'completed_at',
+    'score',
+    'notes',
+    'team_feedback',
+    'anything_else',
+    'answers',
+]
+
+
+def export_feedback_records(candidate, raw_feedbacks, users):
+    """Yield a flat record per feedback, normalized the way `compile_packet` does.
+
+    Every record has the EXPORT_COLUMNS keys; `answers` is a list of
+    question/answer dicts.
+    """
+    _, feedbacks = compile_packet(raw_feedbacks, users)
+    for feedback in feedbacks:
+        yield dict(
+            type='feedback',
+            candidate_id=candidate['id'],
+            candidate_name=candidate.get('name'),
+            feedback_id=feedback.get('id'),
+            interview=feedback['text'],
+            interviewer_id=feedback['user'],
+            interviewer=feedback.get('username'),
+            completed_at=feedback['completedAt'],
+            score=feedback.get('score'),
+            notes=None,
+            team_feedback=(
+                feedback.get('team_feedback') or feedback.get('team_suggestion') or None
+            ),
+            anything_else=feedback.get('anything_else_we_should_know') or None,
+            answers=[
+                dict(question=text['header'], answer=text['text'])
+                for text in feedback.get('feedback_texts', [])
+            ],
+        )
+
+
+def export_intern_records(candidate, raw_feedbacks, users):
+    """Yield a flat record per intern evaluation, oldest first, like
+    `compile_intern_packet` builds them.
+    """
+    parsed = sorted(parse_feedbacks(raw_feedbacks), key=attrgetter('completed_at'))
+    for model in parsed:
+        fields = model.intern_fields()
+        yield dict(
+            type='intern_evaluation',
+            candidate_id=candidate['id'],
+            candidate_name=candidate.get('name'),
+            feedback_id=model.id,
+            interview=model.text,
+            interviewer_id=model.user,
+            interviewer=users.get(model.user, {}).get('name'),
+            completed_at=model.completed_at,
+            score=fields['overall_score'],
+            notes=fields['notes'],
+            team_feedback=None,
+            anything_else=None,
+            answers=[
+                dict(
+                    question=field.get('label'),
+                    answer=field.get('text'),
+                    notes=field.get('notes'),
+                )
+                for field in fields['other_random_fields']
+            ],
+        )
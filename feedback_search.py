@@ -0,0 +1,458 @@
+"""In-memory inverted index over interview feedback text, for /search.
+
+Each feedback is split into a few documents, one per kind of text in FIELDS:
+the form's answers, the team-fit answers, the "anything else" answer, and an
+intern evaluation's fields and notes. Postings are `array`s of document
+numbers and term counts, and per-document data are parallel arrays, so the
+index stays compact. A query ranks feedback by the BM25 scores of its
+documents; a feedback matches when its documents contain every query term
+between them. Interviewer, interview type, field and date narrow a query and
+are counted as facets of its results.
+
+`add_candidate` replaces whatever was indexed for a candidate before, and
+`catch_up` indexes the candidates the feedback store saved since the last
+call and drops the ones it deleted, so the index follows the store as Lever
+syncs. Catching up can be spread over several calls with a time budget, so
+building the index over a big store doesn't hold up any one request.
+"""
+import array
+import collections
+import heapq
+import itertools
+import math
+import re
+import threading
+import time
+import zlib
+
+import feedback_model
+import feedback_store
+
+FIELDS = ['answers', 'team', 'anything_else', 'intern']
+FIELD_LABELS = {
+    'answers': 'Interview answers',
+    'team': 'Team fit',
+    'anything_else': 'Anything else',
+    'intern': 'Intern evaluation',
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+STOPWORDS = frozenset("""
+    a about an and are as at be been but by can did do does for from had has
+    have he her him his how i if in into is it its me my no not of on or our
+    she so that the their them there they this to was we were what when which
+    who will with would you your
+""".split())
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Share of dead documents at which the index is rebuilt without them.
+COMPACT_RATIO = 0.25
+SNIPPET_CHARS = 200
+MAX_TERM_COUNT = 0xffff
+
+
+def tokenize(text):
+    return [
+        token
+        for token in TOKEN_RE.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def _text(value):
+    """Field values are usually strings, sometimes lists of choices or None."""
+    if value is None:
+        return u''
+    if isinstance(value, list):
+        return u'\n'.join(_text(item) for item in value)
+    return unicode(value)
+
+
+def feedback_texts(model):
+    """(field, text) pairs to index for a parsed `feedback_model.Feedback`."""
+    if model.is_intern_evaluation:
+        fields = model.intern_fields()
+        parts = [_text(fields['notes'])]
+        for field in fields['other_random_fields']:
+            parts.append(_text(field.get('text')))
+            parts.append(_text(field.get('notes')))
+        return [('intern', u'\n'.join(parts))]
+
+    team_keys = (feedback_model.TEAM_SUGGESTION_KEY, feedback_model.TEAM_FEEDBACK_KEY)
+    answers = [
+        _text(model.field_values[position])
+        for position, text in model.layout.visible_fields
+        if text not in team_keys
+    ]
+    return [
+        ('answers', u'\n'.join(answers)),
+        ('team', u'\n'.join(_text(model.value(key, u'')) for key in team_keys)),
+        ('anything_else', _text(model.value(feedback_model.ANYTHING_ELSE_TO_KNOW_KEY, u''))),
+    ]
+
+
+IndexedFeedback = collections.namedtuple('IndexedFeedback', [
+    'feedback_id',
+    'candidate_id',
+    'interviewer_id',
+    'interview',
+    'interview_type',
+    'completed_at',
+    'is_intern_evaluation',
+])
+
+
+class FeedbackIndex(object):
+    """Inverted index of feedback text with interviewer, type and date facets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()
+        self._indexed_through = None
+        self._caught_up_at = 0
+        # A catch-up pass spread over several calls: when it started, the
+        # synced_at it has indexed through, and the candidates it indexed with
+        # that synced_at (which the next call sees again).
+        self._pass_started = None
+        self._pass_position = None
+        self._pass_position_ids = set()
+        self._reset()
+
+    def _reset(self):
+        # term -> (document numbers, counts of the term in each)
+        self._postings = {}
+        # Per document.
+        self._doc_feedback = array.array('I')
+        self._doc_field = array.array('B')
+        self._doc_length = array.array('I')
+        self._doc_live = array.array('B')
+        self._doc_text = []
+        # Per feedback; its documents are numbered consecutively.
+        self._feedbacks = []
+        self._feedback_first_doc = array.array('I')
+        self._feedback_doc_count = array.array('B')
+        self._candidate_docs = {}
+        self._candidate_names = {}
+        self._live_docs = 0
+        self._live_length = 0
+
+    def add_candidate(self, candidate, raw_feedbacks):
+        """Index a candidate's completed feedback, replacing any indexed before."""
+        parsed = []
+        for raw in raw_feedbacks:
+            if raw.get('completedAt') is None:
+                continue
+            model = feedback_model.Feedback(raw)
+            documents = []
+            for field, text in feedback_texts(model):
+                tokens = tokenize(text)
+                if tokens:
+                    documents.append((
+                        FIELDS.index(field),
+                        text,
+                        collections.Counter(tokens),
+                        len(tokens),
+                    ))
+            if documents:
+                parsed.append((IndexedFeedback(
+                    model.id,
+                    candidate['id'],
+                    model.user,
+                    model.text,
+                    feedback_model.interview_type_code(model.text),
+                    model.completed_at,
+                    model.is_intern_evaluation,
+                ), documents))
+
+        with self._lock:
+            self._remove(candidate['id'])
+            self._candidate_names[candidate['id']] = candidate.get('name')
+            docs = self._candidate_docs[candidate['id']] = []
+            for entry, documents in parsed:
+                self._feedback_first_doc.append(len(self._doc_feedback))
+                self._feedback_doc_count.append(len(documents))
+                self._feedbacks.append(entry)
+                for field, text, counts, length in documents:
+                    doc = len(self._doc_feedback)
+                    docs.append(doc)
+                    self._doc_feedback.append(len(self._feedbacks) - 1)
+                    self._doc_field.append(field)
+                    self._doc_length.append(length)
+                    self._doc_live.append(1)
+                    self._doc_text.append(zlib.compress(text.encode('utf-8')))
+                    self._live_docs += 1
+                    self._live_length += length
+                    for term, count in counts.iteritems():
+                        postings = self._postings.get(term)
+                        if postings is None:
+                            postings = self._postings[term] = (
+                                array.array('I'),
+                                array.array('H'),
+                            )
+                        postings[0].append(doc)
+                        postings[1].append(min(count, MAX_TERM_COUNT))
+            if len(self._doc_live) - self._live_docs > COMPACT_RATIO * len(self._doc_live):
+                self._compact()
+
+    def remove_candidate(self, candidate_id):
+        with self._lock:
+            self._remove(candidate_id)
+            self._candidate_names.pop(candidate_id, None)
+
+    def _remove(self, candidate_id):
+        for doc in self._candidate_docs.pop(candidate_id, ()):
+            self._doc_live[doc] = 0
+            self._live_docs -= 1
+            self._live_length -= self._doc_length[doc]
+
+    def _compact(self):
+        """Rebuild the index without the documents of replaced candidates."""
+        old = dict(
+            postings=self._postings,
+            doc_field=self._doc_field,
+            doc_length=self._doc_length,
+            doc_live=self._doc_live,
+            doc_text=self._doc_text,
+            feedbacks=self._feedbacks,
+            first_doc=self._feedback_first_doc,
+            doc_count=self._feedback_doc_count,
+        )
+        candidate_names = self._candidate_names
+        self._reset()
+        self._candidate_names = candidate_names
+
+        doc_numbers = {}
+        for feedback, entry in enumerate(old['feedbacks']):
+            first = old['first_doc'][feedback]
+            if not old['doc_live'][first]:
+                continue
+            self._feedback_first_doc.append(len(self._doc_feedback))
+            self._feedback_doc_count.append(old['doc_count'][feedback])
+            self._feedbacks.append(entry)
+            docs = self._candidate_docs.setdefault(entry.candidate_id, [])
+            for doc in xrange(first, first + old['doc_count'][feedback]):
+                doc_numbers[doc] = len(self._doc_feedback)
+                docs.append(len(self._doc_feedback))
+                self._doc_feedback.append(len(self._feedbacks) - 1)
+                self._doc_field.append(old['doc_field'][doc])
+                self._doc_length.append(old['doc_length'][doc])
+                self._doc_live.append(1)
+                self._doc_text.append(old['doc_text'][doc])
+                self._live_docs += 1
+                self._live_length += old['doc_length'][doc]
+
+        for term, (docs, counts) in old['postings'].iteritems():
+            new_docs = array.array('I')
+            new_counts = array.array('H')
+            for doc, count in itertools.izip(docs, counts):
+                if doc in doc_numbers:
+                    new_docs.append(doc_numbers[doc])
+                    new_counts.append(count)
+            if new_docs:
+                self._postings[term] = (new_docs, new_counts)
+
+    def catch_up(self, store, max_age=None, time_budget=None):
+        """Index every candidate `store` saved since the last catch_up, and
+        drop the ones it deleted.
+
+        The first pass indexes the whole store. With `time_budget` (seconds) a
+        call stops once it has run that long, and the next call carries on
+        where it stopped. With `max_age` (seconds), nothing happens if the
+        last completed pass was more recent than that. A call made while
+        another one is catching up returns at once instead of waiting.
+        """
+        if max_age is not None and time.time() - self._caught_up_at < max_age:
+            return
+        if not self._catch_up_lock.acquire(False):
+            return
+        try:
+            if max_age is not None and time.time() - self._caught_up_at < max_age:
+                return
+            deadline = time.time() + time_budget if time_budget is not None else None
+            if self._pass_started is None:
+                self._pass_started = int(time.time() * 1000)
+                self._pass_position = self._indexed_through
+                self._pass_position_ids = set()
+            for synced_at, candidate, feedbacks in store.iter_synced(since=self._pass_position):
+                if synced_at == self._pass_position:
+                    if candidate['id'] in self._pass_position_ids:
+                        continue
+                else:
+                    self._pass_position = synced_at
+                    self._pass_position_ids = set()
+                self.add_candidate(candidate, feedbacks)
+                self._pass_position_ids.add(candidate['id'])
+                if deadline is not None and time.time() > deadline:
+                    return
+            if self._indexed_through is not None:
+                for candidate_id in store.iter_deleted(since=self._indexed_through):
+                    self.remove_candidate(candidate_id)
+            self._indexed_through = self._pass_started - feedback_store.SYNC_OVERLAP_MS
+            self._pass_started = None
+            self._pass_position_ids = set()
+            self._caught_up_at = time.time()
+        finally:
+            self._catch_up_lock.release()
+
+    def caught_up(self):
+        """Whether a catch_up pass over the store has ever completed."""
+        return self._caught_up_at > 0
+
+    def search(
+        self,
+        query,
+        interviewer_id=None,
+        interview_type=None,
+        field=None,
+        since=None,
+        until=None,
+        limit=50,
+    ):
+        """Rank the feedback matching `query` and the filters.
+
+        `interview_type` is an index into feedback_model.INTERVIEW_TYPES,
+        `field` one of FIELDS, and `since`/`until` bound completion time in
+        ms. Without query terms, matching feedback is listed newest first.
+        Returns dict(total, results, facets).
+        """
+        terms = []
+        for token in tokenize(query or u''):
+            if token not in terms:
+                terms.append(token)
+        field_code = FIELDS.index(field) if field else None
+
+        with self._lock:
+            allowed = {}
+
+            def feedback_allowed(feedback):
+                if feedback not in allowed:
+                    entry = self._feedbacks[feedback]
+                    allowed[feedback] = (
+                        (interviewer_id is None or entry.interviewer_id == interviewer_id)
+                        and (interview_type is None or entry.interview_type == interview_type)
+                        and (since is None or entry.completed_at >= since)
+                        and (until is None or entry.completed_at < until)
+                    )
+                return allowed[feedback]
+
+            def doc_matches(doc):
+                return (
+                    self._doc_live[doc]
+                    and (field_code is None or self._doc_field[doc] == field_code)
+                    and feedback_allowed(self._doc_feedback[doc])
+                )
+
+            if field_code is None and (interviewer_id, interview_type, since, until) == (None,) * 4:
+                doc_allowed = self._doc_live.__getitem__
+            else:
+                doc_allowed = doc_matches
+
+            if terms:
+                hits = self._ranked_hits(terms, doc_allowed)
+            else:
+                hits = [
+                    (self._feedbacks[self._doc_feedback[doc]].completed_at, self._doc_feedback[doc])
+                    for doc in xrange(len(self._doc_live))
+                    if doc_allowed(doc)
+                ]
+                # A feedback with several matching documents is listed once.
+                hits = list(set(hits))
+
+            results = [
+                self._result(number, score, terms, field_code)
+                for score, number in heapq.nlargest(limit, hits)
+            ]
+            facets = self._facets(number for _, number in hits)
+        return dict(total=len(hits), results=results, facets=facets)
+
+    def _ranked_hits(self, terms, doc_allowed):
+        """(BM25 score, feedback number) for feedback containing all `terms`."""
+        if not self._live_docs:
+            return []
+        average_length = float(self._live_length) / self._live_docs
+        doc_feedback = self._doc_feedback
+        doc_length = self._doc_length
+        scores = collections.defaultdict(float)
+        matched = collections.defaultdict(int)
+        for bit, term in enumerate(terms):
+            postings = self._postings.get(term)
+            if postings is None:
+                return []
+            docs, counts = postings
+            frequency = len(docs)
+            idf = math.log(1 + (self._live_docs - frequency + 0.5) / (frequency + 0.5))
+            for doc, count in itertools.izip(docs, counts):
+                if not doc_allowed(doc):
+                    continue
+                feedback = doc_feedback[doc]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_length[doc] / average_length)
+                scores[feedback] += idf * count * (BM25_K1 + 1) / (count + norm)
+                matched[feedback] |= 1 << bit
+        every_term = (1 << len(terms)) - 1
+        return [
+            (score, number)
+            for number, score in scores.iteritems()
+            if matched[number] == every_term
+        ]
+
+    def _result(self, feedback, score, terms, field_code):
+        entry = self._feedbacks[feedback]
+        first = self._feedback_first_doc[feedback]
+        texts = [
+            zlib.decompress(self._doc_text[doc]).decode('utf-8')
+            for doc in xrange(first, first + self._feedback_doc_count[feedback])
+            if field_code is None or self._doc_field[doc] == field_code
+        ]
+        return dict(
+            entry._asdict(),
+            candidate_name=self._candidate_names.get(entry.candidate_id),
+            interview_type=feedback_model.INTERVIEW_TYPES[entry.interview_type],
+            score=score if terms else None,
+            snippet=_snippet(texts, terms),
+        )
+
+    def _facets(self, feedbacks):
+        interviewers = collections.Counter()
+        interview_types = collections.Counter()
+        years = collections.Counter()
+        for feedback in feedbacks:
+            entry = self._feedbacks[feedback]
+            interviewers[entry.interviewer_id] += 1
+            interview_types[entry.interview_type] += 1
+            years[time.gmtime(entry.completed_at / 1000).tm_year] += 1
+        return dict(
+            interviewers=interviewers.most_common(),
+            interview_types=sorted(interview_types.items()),
+            years=sorted(years.items(), reverse=True),
+        )
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                candidates=len(self._candidate_docs),
+                feedbacks=len(self._feedbacks),
+                documents=len(self._doc_live),
+                live_documents=self._live_docs,
+                terms=len(self._postings),
+                postings=sum(len(docs) for docs, _ in self._postings.itervalues()),
+                caught_up=self.caught_up(),
+            )
+
+
+def _snippet(texts, terms):
+    """About SNIPPET_CHARS of `texts` around the first query term found."""
+    pattern = None
+    if terms:
+        pattern = re.compile(
+            r'\b(?:%s)' % '|'.join(re.escape(term) for term in terms),
+            re.IGNORECASE,
+        )
+    for text in texts:
+        match = pattern.search(text) if pattern else None
+        if match is None and pattern is not None:
+            continue
+        start = max(match.start() - SNIPPET_CHARS // 4, 0) if match else 0
+        snippet = u' '.join(text[start:start + SNIPPET_CHARS].split())
+        return (u'...' if start else u'') + snippet
+    return u' '.join(texts[0][:SNIPPET_CHARS].split()) if texts else u''
@@ -0,0 +1,399 @@
+"""Local copy of Lever candidates, feedback and users, kept current by sync.
+
+Pages read a candidate and their whole feedback history in one store lookup
+instead of paginating Lever. `sync_from_lever` pulls the candidates Lever says
+changed since the last sync's high-water mark and re-fetches only their
+feedback; webhooks refresh single candidates in between.
+
+Production uses Datastore (NDB). Outside App Engine, e.g. under the tools'
+testbed, an in-memory store stands in.
+"""
+import logging
+import threading
+import time
+
+from google.appengine.ext import ndb
+
+from util import background
+from util import concurrency
+
+logger = logging.getLogger(__name__)
+
+# Candidates whose feedback is re-fetched in parallel during a sync.
+SYNC_WORKERS = 4
+# The next sync starts this far before the current one did, so changes made
+# while it ran, or hidden by clock skew between us and Lever, are not missed.
+SYNC_OVERLAP_MS = 5 * 60 * 1000
+# A sync run stops after the page it's on once it has run this long, well
+# inside the cron request deadline and the 5 minutes between runs; the next
+# run picks up from there.
+SYNC_TIME_BUDGET_SECONDS = 4 * 60
+# How long a run holds the sync lease. Past the request deadline, so only a
+# run that died without releasing it loses it.
+SYNC_LEASE_SECONDS = 11 * 60
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class StoredCandidate(ndb.Model):
+    candidate = ndb.JsonProperty(compressed=True, indexed=False)
+    feedbacks = ndb.JsonProperty(compressed=True, indexed=False)
+    # Indexed so readers can catch up on just the candidates synced lately.
+    synced_at = ndb.IntegerProperty()
+
+
+class DeletedCandidate(ndb.Model):
+    """Tombstone of a candidate deleted in Lever, so every instance's search
+    index drops them too."""
+    deleted_at = ndb.IntegerProperty()
+
+
+class StoredUser(ndb.Model):
+    user = ndb.JsonProperty(indexed=False)
+
+
+class SyncState(ndb.Model):
+    high_water_mark = ndb.IntegerProperty(indexed=False)
+    # The walk over Lever's changed candidates in progress, if any: when it
+    # started, and the offset of the next page.
+    walk_started = ndb.IntegerProperty(indexed=False)
+    cursor = ndb.StringProperty(indexed=False)
+    # Candidates that failed to sync, to retry on the next run.
+    failed_ids = ndb.JsonProperty(indexed=False)
+    lease_until = ndb.IntegerProperty(indexed=False)
+
+
+SYNC_FIELDS = ('high_water_mark', 'walk_started', 'cursor', 'failed_ids')
+
+
+class NdbFeedbackStore(object):
+    """FeedbackStore on Datastore, one entity per candidate and per user."""
+
+    SYNC_STATE_ID = 'lever'
+
+    def get_candidate(self, candidate_id):
+        """Return (candidate, feedbacks), or None for an unknown candidate."""
+        stored = StoredCandidate.get_by_id(candidate_id)
+        if stored is None:
+            return None
+        return stored.candidate, stored.feedbacks
+
+    def put_candidate(self, candidate, feedbacks):
+        StoredCandidate(
+            id=candidate['id'],
+            candidate=candidate,
+            feedbacks=feedbacks,
+            synced_at=_now_ms(),
+        ).put()
+
+    def iter_candidates(self, since=None, batch_size=200):
+        """Yield (candidate, feedbacks) for every stored candidate, or only
+        those stored at or after `since` (ms).
+        """
+        query = StoredCandidate.query()
+        if since is not None:
+            query = query.filter(StoredCandidate.synced_at >= since)
+        for stored in query.iter(batch_size=batch_size):
+            yield stored.candidate, stored.feedbacks
+
+    def iter_synced(self, since=None, batch_size=200):
+        """Yield (synced_at, candidate, feedbacks) for the candidates stored at
+        or after `since` (ms), oldest first, so a reader can stop and resume.
+        """
+        query = StoredCandidate.query()
+        if since is not None:
+            query = query.filter(StoredCandidate.synced_at >= since)
+        for stored in query.order(StoredCandidate.synced_at).iter(batch_size=batch_size):
+            yield stored.synced_at, stored.candidate, stored.feedbacks
+
+    def delete_candidate(self, candidate_id):
+        """Forget a candidate, leaving a tombstone for `iter_deleted`."""
+        DeletedCandidate(id=candidate_id, deleted_at=_now_ms()).put()
+        ndb.Key(StoredCandidate, candidate_id).delete()
+
+    def iter_deleted(self, since=None, batch_size=200):
+        """Yield the IDs of candidates deleted at or after `since` (ms)."""
+        query = DeletedCandidate.query()
+        if since is not None:
+            query = query.filter(DeletedCandidate.deleted_at >= since)
+        for key in query.iter(batch_size=batch_size, keys_only=True):
+            yield key.id()
+
+    def get_users(self, user_ids):
+        user_ids = list(user_ids)
+        stored = ndb.get_multi([ndb.Key(StoredUser, user_id) for user_id in user_ids])
+        return dict(
+            (user_id, entity.user)
+            for user_id, entity in zip(user_ids, stored)
+            if entity is not None
+        )
+
+    def put_users(self, users):
+        ndb.put_multi([StoredUser(id=user['id'], user=user) for user in users])
+
+    def sync_state(self):
+        """Return the SYNC_FIELDS of the sync's progress as a dict."""
+        state = SyncState.get_by_id(self.SYNC_STATE_ID)
+        return dict(
+            (field, getattr(state, field) if state is not None else None)
+            for field in SYNC_FIELDS
+        )
+
+    def put_sync_state(self, sync_state):
+        state = SyncState.get_by_id(self.SYNC_STATE_ID) or SyncState(id=self.SYNC_STATE_ID)
+        for field in SYNC_FIELDS:
+            setattr(state, field, sync_state[field])
+        state.put()
+
+    @ndb.transactional
+    def acquire_sync_lease(self, seconds):
+        """Take the sync lease for `seconds`; False if a run already holds it."""
+        state = SyncState.get_by_id(self.SYNC_STATE_ID) or SyncState(id=self.SYNC_STATE_ID)
+        now = _now_ms()
+        if state.lease_until is not None and state.lease_until > now:
+            return False
+        state.lease_until = now + seconds * 1000
+        state.put()
+        return True
+
+    @ndb.transactional
+    def release_sync_lease(self):
+        state = SyncState.get_by_id(self.SYNC_STATE_ID)
+        if state is not None:
+            state.lease_until = None
+            state.put()
+
+
+class MemoryFeedbackStore(object):
+    """FeedbackStore in process memory, for development and tests."""
+
+    def __init__(self):
+        self._candidates = {}
+        self._synced_at = {}
+        self._deleted_at = {}
+        self._users = {}
+        self._sync_state = dict.fromkeys(SYNC_FIELDS)
+        self._lease_until = None
+        self._lock = threading.Lock()
+
+    def get_candidate(self, candidate_id):
+        with self._lock:
+            return self._candidates.get(candidate_id)
+
+    def put_candidate(self, candidate, feedbacks):
+        with self._lock:
+            self._candidates[candidate['id']] = (candidate, feedbacks)
+            self._synced_at[candidate['id']] = _now_ms()
+
+    def iter_candidates(self, since=None):
+        with self._lock:
+            stored = [
+                stored
+                for candidate_id, stored in self._candidates.iteritems()
+                if since is None or self._synced_at[candidate_id] >= since
+            ]
+        return iter(stored)
+
+    def iter_synced(self, since=None):
+        with self._lock:
+            stored = sorted(
+                (synced_at, candidate_id)
+                for candidate_id, synced_at in self._synced_at.iteritems()
+                if since is None or synced_at >= since
+            )
+            return iter([
+                (synced_at,) + self._candidates[candidate_id]
+                for synced_at, candidate_id in stored
+            ])
+
+    def delete_candidate(self, candidate_id):
+        with self._lock:
+            self._candidates.pop(candidate_id, None)
+            self._synced_at.pop(candidate_id, None)
+            self._deleted_at[candidate_id] = _now_ms()
+
+    def iter_deleted(self, since=None):
+        with self._lock:
+            return iter([
+                candidate_id
+                for candidate_id, deleted_at in self._deleted_at.iteritems()
+                if since is None or deleted_at >= since
+            ])
+
+    def get_users(self, user_ids):
+        with self._lock:
+            return dict(
+                (user_id, self._users[user_id])
+                for user_id in user_ids
+                if user_id in self._users
+            )
+
+    def put_users(self, users):
+        with self._lock:
+            for user in users:
+                self._users[user['id']] = user
+
+    def sync_state(self):
+        with self._lock:
+            return dict(self._sync_state)
+
+    def put_sync_state(self, sync_state):
+        with self._lock:
+            self._sync_state = dict((field, sync_state[field]) for field in SYNC_FIELDS)
+
+    def acquire_sync_lease(self, seconds):
+        with self._lock:
+            now = _now_ms()
+            if self._lease_until is not None and self._lease_until > now:
+                return False
+            self._lease_until = now + seconds * 1000
+            return True
+
+    def release_sync_lease(self):
+        with self._lock:
+            self._lease_until = None
+
+
+def make_store():
+    if background.running_on_app_engine():
+        return NdbFeedbackStore()
+    return MemoryFeedbackStore()
+
+
+def refresh_candidate(client, store, candidate_id):
+    """Re-fetch one candidate and their feedback from Lever into `store`."""
+    plan = concurrency.FetchPlan()
+    plan.start('candidate', client.get_candidate, candidate_id)
+    plan.start('feedbacks', client.get_candidate_feedback, candidate_id)
+    candidate = plan.result('candidate')
+    feedbacks = plan.result('feedbacks')
+    store.put_candidate(candidate, feedbacks)
+    return candidate, feedbacks
+
+
+def sync_from_lever(client, store, load_user=None, time_budget=SYNC_TIME_BUDGET_SECONDS):
+    """Copy the candidates updated since the last completed sync into `store`.
+
+    A sync walks Lever's pages of changed candidates and saves its place in
+    the store after each page, so a run that has used up `time_budget`
+    seconds (None for no limit) stops there and the next one resumes. The
+    high-water mark only moves once a walk is complete; the first one copies
+    everything, over as many runs as it takes. A candidate that fails to sync
+    is logged and retried once on the next run, without holding up the
+    rest. Interviewers the store hasn't seen are fetched with `load_user`
+    (default `client.get_user`). A lease in the store keeps runs from
+    overlapping.
+
+    Returns dict(synced, failed, complete), or None if another run holds the
+    lease.
+    """
+    if not store.acquire_sync_lease(SYNC_LEASE_SECONDS):
+        logger.info('lever sync already running, skipping this run')
+        return None
+    try:
+        return _sync_from_lever(client, store, load_user or client.get_user, time_budget)
+    finally:
+        store.release_sync_lease()
+
+
+def _sync_users(store, load_user, user_ids):
+    """Fetch the interviewers in `user_ids` the store doesn't have yet."""
+
+    def load_new_user(user_id):
+        try:
+            return load_user(user_id)
+        except Exception:
+            # A deleted interviewer shouldn't hold up the rest of the sync.
+            logger.exception('could not sync lever user %s', user_id)
+            return None
+
+    new_user_ids = set(user_ids) - set(store.get_users(user_ids))
+    if new_user_ids:
+        store.put_users([
+            user
+            for user in concurrency.bounded_map(
+                load_new_user,
+                sorted(new_user_ids),
+                max_workers=SYNC_WORKERS,
+            )
+            if user is not None
+        ])
+    return len(new_user_ids)
+
+
+def _sync_from_lever(client, store, load_user, time_budget):
+    deadline = time.time() + time_budget if time_budget is not None else None
+    state = store.sync_state()
+    if state['walk_started'] is None:
+        state['walk_started'] = _now_ms()
+        state['cursor'] = None
+    mark = state['high_water_mark']
+    retry_ids = state['failed_ids'] or []
+    failed_ids = []
+    synced = 0
+    new_users = 0
+
+    def interviewers(feedbacks):
+        return set(feedback['user'] for feedback in feedbacks)
+
+    def sync_candidate(candidate):
+        feedbacks = client.get_candidate_feedback(candidate['id'])
+        store.put_candidate(candidate, feedbacks)
+        return interviewers(feedbacks)
+
+    def retry_candidate(candidate_id):
+        return interviewers(refresh_candidate(client, store, candidate_id)[1])
+
+    user_ids = set()
+    for candidate_id, candidate_users, error in concurrency.imap(
+        retry_candidate,
+        retry_ids,
+        max_workers=SYNC_WORKERS,
+    ):
+        if error is not None:
+            logger.error('giving up syncing lever candidate %s: %s', candidate_id, error)
+        else:
+            synced += 1
+            user_ids.update(candidate_users)
+    new_users += _sync_users(store, load_user, user_ids)
+
+    complete = True
+    for candidates, next_offset in client.iter_candidate_pages_updated_since(
+        mark,
+        offset=state['cursor'],
+    ):
+        # The next page is on its way while this one's feedback is fetched.
+        user_ids = set()
+        for candidate, candidate_users, error in concurrency.imap(
+            sync_candidate,
+            candidates,
+            max_workers=SYNC_WORKERS,
+        ):
+            if error is not None:
+                logger.error('could not sync lever candidate %s: %s', candidate['id'], error)
+                failed_ids.append(candidate['id'])
+            else:
+                synced += 1
+                user_ids.update(candidate_users)
+        new_users += _sync_users(store, load_user, user_ids)
+
+        state['cursor'] = next_offset
+        state['failed_ids'] = failed_ids
+        store.put_sync_state(state)
+        if next_offset is not None and deadline is not None and time.time() > deadline:
+            complete = False
+            break
+
+    if complete:
+        state['high_water_mark'] = state['walk_started'] - SYNC_OVERLAP_MS
+        state['walk_started'] = None
+        state['cursor'] = None
+    state['failed_ids'] = failed_ids
+    store.put_sync_state(state)
+    logger.info(
+        'synced %d candidates (%d failed) and %d new users from lever since %s%s',
+        synced, len(failed_ids), new_users, mark, '' if complete else ', to be continued',
+    )
+    return dict(synced=synced, failed=len(failed_ids), complete=complete)
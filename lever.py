@@ -1,93 +1,268 @@
 import logging
 import json
-import urllib2
-import urllib3
-
-import requests
+import threading
 
 import secret
+from util import breaker
+from util import concurrency
+from util import http_cache
+from util import ratelimit
+from util import tracing
+
+# urllib3 and util.transport are imported where they're used: they pull in
+# ssl and httplib, which an instance only needs once it first calls Lever,
+# usually from the warmup request.
 
 logger = logging.getLogger(__name__)
 
+# Settings for the process-wide Lever transport. Override them with
+# configure_transport() before the first request goes out.
+TRANSPORT_SETTINGS = dict(
+    pool_size=10,
+    num_pools=2,
+    connect_timeout=5.0,
+    read_timeout=30.0,
+    max_retries=3,
+    backoff_base=0.25,
+    backoff_cap=8.0,
+)
+
+# Client-side limits shared by every Lever call this process makes. Lever
+# allows 10 requests a second with bursts of 20, per API key.
+RATE_LIMIT_SETTINGS = dict(
+    rate=10.0,
+    burst=20,
+    initial_limit=8,
+    min_limit=1,
+    max_limit=32,
+    batch_share=0.75,
+)
+
+# Items per page asked of Lever's paginated endpoints; Lever allows 1-100.
+PAGE_LIMIT = 100
+
+# Consecutive failures (errors or 5xx) of one endpoint before calls to it
+# fail fast, and how long they do.
+BREAKER_SETTINGS = dict(
+    failure_threshold=5,
+    reset_timeout=30.0,
+)
+
+_transport = None
+_transport_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class LeverError(Exception):
+    pass
+
+
+class LeverNotFound(LeverError):
+    pass
+
+
+class LeverUnavailable(LeverError):
+    """Lever is failing, or its circuit breaker is open."""
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                from util.transport import PooledTransport
+                _transport = PooledTransport(
+                    governor=ratelimit.Governor(**RATE_LIMIT_SETTINGS),
+                    **TRANSPORT_SETTINGS
+                )
+    return _transport
+
+
+def endpoint_name(path):
+    """Collapse IDs in a Lever path, e.g. '/candidates/:id/feedback'."""
+    parts = path.split('?', 1)[0].split('/')
+    return '/'.join(
+        part if index % 2 or not part else ':id'
+        for index, part in enumerate(parts)
+    )
+
+
+def get_breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = breaker.CircuitBreaker(endpoint, **BREAKER_SETTINGS)
+        return _breakers[endpoint]
+
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return dict((circuit.name, circuit.stats()) for circuit in breakers)
+
+
+def configure_transport(rate_limit=None, **settings):
+    """Update transport and rate limit settings and drop the current pool."""
+    global _transport
+    with _transport_lock:
+        TRANSPORT_SETTINGS.update(settings)
+        RATE_LIMIT_SETTINGS.update(rate_limit or {})
+        _transport = None
+
+
+def _check_status(path, response):
+    """Raise the LeverError for an error `response` to a call to `path`."""
+    if response.status == 404:
+        raise LeverNotFound(path)
+    if response.status >= 500 or response.status == 429:
+        raise LeverUnavailable('%s returned %s' % (path, response.status))
+    if response.status >= 400:
+        raise LeverError('%s returned %s' % (path, response.status))
+
+
 class LeverClient(object):
+    """Lever API client.
 
-    def _make_lever_request(self, relative_url, data=None):
-        passman = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        passman.add_password(
-            None,
-            secret.lever_api_path,
-            secret.lever_api_key,
-            '',
+    With a `validated_cache` (util.http_cache.ValidatedCache), GETs of single
+    records and of the first page of a list are sent as conditional
+    requests, and a 304 reuses the body parsed last time.
+    """
+
+    def __init__(self, validated_cache=None):
+        self.validated_cache = validated_cache
+
+    def _validated_key(self, path, fields):
+        """The validated cache key for a GET, or None if it isn't revalidated.
+
+        Only GETs whose sole query parameter, if any, is the page `limit` are
+        revalidated; later pages and filtered lists aren't worth keeping.
+        """
+        if self.validated_cache is None:
+            return None
+        if not fields:
+            return path
+        if set(fields) != set(['limit']):
+            return None
+        return '%s?limit=%s' % (path, fields['limit'])
+
+    def _request(self, method, path, fields=None, body=None, headers=None, retry=None):
+        import urllib3
+        request_headers = urllib3.util.make_headers(
+            keep_alive=True,
+            basic_auth='%s:' % secret.lever_api_key,
         )
-        authhandler = urllib2.HTTPBasicAuthHandler(passman)
-        opener = urllib2.build_opener(authhandler)
-        urllib2.install_opener(opener)
-        try:
-            pagehandle = urllib2.urlopen(
-                secret.lever_api_path + relative_url,
-            )
-        except Exception as e:
-            exc_str = 'error reading from lever %s' % relative_url
-            logger.exception(exc_str)
-            print e
-            return '{}'
-        return pagehandle.read()
+        if headers:
+            request_headers.update(headers)
+        endpoint = endpoint_name(path)
+        circuit = get_breaker(endpoint)
+        if not circuit.allow():
+            raise LeverUnavailable('%s is failing, not calling it' % (endpoint,))
+        with tracing.span('lever', endpoint, method=method) as span:
+            try:
+                response = get_transport().request(
+                    method,
+                    secret.lever_api_path + path,
+                    fields=fields,
+                    body=body,
+                    headers=request_headers,
+                    retry=retry,
+                )
+            except urllib3.exceptions.HTTPError as e:
+                circuit.record_failure()
+                logger.exception('error calling lever %s %s', method, path)
+                raise LeverUnavailable('%s failed: %s' % (endpoint, e))
+            span['status'] = response.status
+        if response.status >= 500:
+            circuit.record_failure()
+        else:
+            circuit.record_success()
+        return response
+
+    def _make_lever_request(self, relative_url, data=None):
+        """Return the raw body of a GET of `relative_url`."""
+        response = self._request('GET', relative_url)
+        _check_status(relative_url, response)
+        return response.data
 
     def _make_lever_request2(self, path, fields=None):
-        headers = urllib3.util.make_headers(basic_auth='%s:' % secret.lever_api_key)
-        from urllib3.contrib.appengine import AppEngineManager
-        http = AppEngineManager()
-        response = http.request(
+        key = self._validated_key(path, fields)
+        entry = self.validated_cache.get(key) if key is not None else None
+        response = self._request(
             'GET',
-            secret.lever_api_path + path,
+            path,
             fields=fields,
-            headers=headers,
+            headers=http_cache.conditional_headers(entry),
         )
-        return json.loads(response.data)
+        if response.status == 304 and entry is not None:
+            self.validated_cache.refresh(key, entry)
+            return entry['data']
+        _check_status(path, response)
+        data = json.loads(response.data)
+        if key is not None:
+            self.validated_cache.store(key, response.headers, data)
+        return data
 
     def _post_to_lever(self, url, perform_as, data):
-        try:
-            return requests.post(
-                secret.lever_api_path + url + '?perform_as=' + perform_as + '&dedupe=true',
-                data=json.dumps(data),
-                headers={'Content-Type': 'application/json'},
-                auth=(secret.lever_api_key, ''),
-            ).json()
-
-        except Exception as e:
-            print e
-            return '{}'
+        # dedupe=true makes the POST safe to retry.
+        response = self._request(
+            'POST',
+            url + '?perform_as=' + perform_as + '&dedupe=true',
+            body=json.dumps(data),
+            headers={'Content-Type': 'application/json'},
+            retry=True,
+        )
+        _check_status(url, response)
+        return json.loads(response.data)
 
     def get_posting(self, posting_id):
-        try:
-            return requests.get(
-                secret.lever_api_path + '/postings/' + posting_id,
-                auth=(secret.lever_api_key, ''),
-            ).json()
+        return self._make_lever_request2('/postings/' + posting_id)
 
-        except Exception as e:
-            print e
-            return '{}'
+    def iter_pages(self, path, params=None, limit=PAGE_LIMIT, prefetch=True):
+        """Yield the `data` list of each page of a paginated Lever endpoint.
 
-    def get_all_postings(self, team_name):
-        postings = []
-        offset = None
+        Pages are asked for `limit` items at a time. With `prefetch`, the
+        next page is fetched while the caller works through the current one.
+        Nothing beyond that is requested, so a caller that stops iterating
+        stops the requests too.
+        """
+        for page in self._iter_responses(path, params, limit, prefetch):
+            yield page['data']
+
+    def _iter_responses(self, path, params, limit, prefetch, offset=None):
+        """Yield whole page responses, starting from the `next` token `offset`."""
+        params = dict(params or {}, limit=limit)
+        if offset is not None:
+            params['offset'] = offset
+        page = self._make_lever_request2(path, fields=params)
         while True:
-            params = dict(
-                team=team_name,
-            )
-            if offset is not None:
-                params['offset'] = offset
-            posting_slice = requests.get(
-                secret.lever_api_path + '/postings',
-                params=params,
-                auth=(secret.lever_api_key, ''),
-            ).json()
-            postings.extend(posting_slice['data'])
-            if posting_slice['hasNext']:
-                offset = posting_slice['next']
+            following = None
+            if page['hasNext']:
+                next_params = dict(params, offset=page['next'])
+                if prefetch:
+                    following = concurrency.spawn(
+                        self._make_lever_request2,
+                        path,
+                        fields=next_params,
+                    )
+            yield page
+            if not page['hasNext']:
+                return
+            if following is not None:
+                page = following.result()
             else:
-                return postings
+                page = self._make_lever_request2(path, fields=next_params)
+
+    def iter_items(self, path, params=None, limit=PAGE_LIMIT, prefetch=True):
+        """Yield the items of a paginated Lever endpoint one at a time."""
+        for data in self.iter_pages(path, params, limit, prefetch):
+            for item in data:
+                yield item
+
+    def iter_postings(self, team_name, limit=PAGE_LIMIT):
+        return self.iter_items('/postings', dict(team=team_name), limit)
+
+    def get_all_postings(self, team_name):
+        return list(self.iter_postings(team_name))
 
     def get_user(self, user_id):
         user_resp = self._make_lever_request2(
@@ -101,27 +276,39 @@ class LeverClient(object):
         )
         return candidate_resp['data']
 
-    def get_candidate_feedback(self, candidate_id):
-        feedbacks = []
-        offset = None
+    def iter_posting_candidates(self, posting_id, limit=PAGE_LIMIT):
+        return self.iter_items('/candidates', dict(posting_id=posting_id), limit)
+
+    def get_posting_candidates(self, posting_id):
+        return list(self.iter_posting_candidates(posting_id))
+
+    def iter_candidates_updated_since(self, updated_at_start=None, limit=PAGE_LIMIT):
+        """Candidates updated at or after `updated_at_start` (ms), or all of them."""
         params = {}
-        while True:
-            """
-            params = dict(
-                team=team_name,
-            )
-            """
-            if offset is not None:
-                params['offset'] = offset
-            feedback_slice = self._make_lever_request2(
-                '/candidates/%s/feedback' % (candidate_id,),
-                fields=params,
-            )
-            feedbacks.extend(feedback_slice['data'])
-            if feedback_slice['hasNext']:
-                offset = feedback_slice['next']
-            else:
-                return feedbacks
+        if updated_at_start is not None:
+            params['updated_at_start'] = updated_at_start
+        return self.iter_items('/candidates', params, limit)
+
+    def iter_candidate_pages_updated_since(self, updated_at_start=None, offset=None, limit=PAGE_LIMIT):
+        """Yield (candidates, next offset) per page of `iter_candidates_updated_since`.
+
+        The next offset is None on the last page. Passing one back as `offset`
+        resumes the walk after that page.
+        """
+        params = {}
+        if updated_at_start is not None:
+            params['updated_at_start'] = updated_at_start
+        for page in self._iter_responses('/candidates', params, limit, True, offset):
+            yield page['data'], page['next'] if page['hasNext'] else None
+
+    def get_candidates_updated_since(self, updated_at_start=None):
+        return list(self.iter_candidates_updated_since(updated_at_start))
+
+    def iter_candidate_feedback(self, candidate_id, limit=PAGE_LIMIT):
+        return self.iter_items('/candidates/%s/feedback' % (candidate_id,), limit=limit)
+
+    def get_candidate_feedback(self, candidate_id):
+        return list(self.iter_candidate_feedback(candidate_id))
 
 
 if __name__ == '__main__':
@@ -1,233 +1,424 @@
 """`main` is the top level module for your Flask application."""
-from pprint import pprint
+import collections
+import csv
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import StringIO
+import calendar
+import time
 
 # Import the Flask Framework
 import flask
 from flask import Flask
 from flask import redirect
 from flask import request
-from google.appengine.api import memcache
 
-from util import login
+from util import auth
+from util import background
+from util import cache
+from util import concurrency
+from util import http_cache
+from util import import_profile
+from util import packet_cache
+from util import ratelimit
+from util import template_cache
+from util import tracing
+import feedback_model
+import feedback_search
+import feedback_store
+from feedback_model import ANYTHING_ELSE_TO_KNOW_KEY
+from feedback_model import TEAM_FEEDBACK_KEY
+import lever
 from lever import LeverClient
+import secret
 
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 # Note: We don't need to call run() since our application is embedded within
 # the App Engine WSGI application server.
 
+# Whether /feedback and /trebuchet stream their pages. ?stream=1 or ?stream=0
+# overrides it per request. The python27 runtime buffers whole responses, so
+# streaming only helps under other servers, e.g. the tools' test client; on
+# App Engine leave it off and get gzip and ETags instead.
+app.config['STREAM_PACKET_PAGES'] = False
+# Signed-in users at these domains can use the app, if they're also App
+# Engine admins. How long a user's role is trusted before it's looked up again:
+app.config['AUTH_DOMAINS'] = ['yelp.com']
+app.config['AUTH_SESSION_TTL'] = 5 * 60
+
+# Before anything loads a template, so they all come from the bytecode
+# `make deploy` built.
+template_cache.install(app)
+
 APP_NAME = 'Catapult'
-TEAM_FEEDBACK_KEY = u"Did the candidate give you any information about their interests that would help determine team fit?"
-ANYTHING_ELSE_TO_KNOW_KEY = u"Is there anything else we should consider when making the final hiring decision?"
 
 
-lever_client = LeverClient()
+USER_FETCH_WORKERS = 8
+COMMITTEE_WORKERS = 4
+COHORT_WORKERS = 8
+UNAVAILABLE_USER_NAME = u'(interviewer unavailable)'
+# https://jira.yelpcorp.com/browse/ENGREC-259, change lookback period to 7 months
+INTERN_EVAL_LOOKBACK_MONTHS = 7
+DAY_MS = 24 * 60 * 60 * 1000
+# Only for the in-process queue; on App Engine, queue.yaml bounds concurrency.
+PRECOMPUTE_LOCAL_WORKERS = 2
+
+
+lever_client = LeverClient(
+    validated_cache=http_cache.ValidatedCache('lever-validated'),
+)
+store = feedback_store.make_store()
+feedback_packets = packet_cache.PacketCache('feedback')
+intern_packets = packet_cache.PacketCache('intern')
+
+def _load_user(user_id):
+    user = store.get_users([user_id]).get(user_id)
+    if user is None:
+        user = lever_client.get_user(user_id)
+        store.put_users([user])
+    return user
+
+
+# Interviewer records practically never change, so they're kept for a week.
+user_cache = cache.TieredCache(
+    'lever-user',
+    _load_user,
+    max_size=2000,
+    local_ttl=60 * 60,
+    memcache_ttl=60 * 60 * 24 * 7,
+    max_workers=USER_FETCH_WORKERS,
+    negative_ttl=60 * 5,
+)
+# Candidates change as they move through the pipeline, so this only covers
+# the few seconds around a page load. It's used for candidates the store
+# hasn't synced yet.
+candidate_cache = cache.TieredCache(
+    'lever-candidate',
+    lever_client.get_candidate,
+    max_size=500,
+    local_ttl=30,
+    memcache_ttl=60,
+    negative_ttl=30,
+)
+
+
+def _load_posting(posting_id):
+    return lever_client.get_posting(posting_id)['data']
+
+
+posting_cache = cache.TieredCache(
+    'lever-posting',
+    _load_posting,
+    max_size=200,
+    local_ttl=60 * 5,
+    memcache_ttl=60 * 60,
+    negative_ttl=60,
+)
+
+
+@app.before_request
+def _start_trace():
+    tracing.activate(tracing.Trace(request.path))
+
+
+@app.teardown_request
+def _finish_trace(exc):
+    trace = tracing.current()
+    if trace is not None:
+        logger.info('request trace %s', json.dumps(trace.summary()))
+        tracing.deactivate()
 
-def _extract_fields_as_keyval(fields, key, allow_missing=False):
-    for field in fields:
-        if field['text'] == key:
-            return field['value']
-    if allow_missing:
-        return ''
-    raise KeyError(key)
 
-def _truncate_header(header):
-    # Strip out the word "Engineering" because it's redundant
-    if header['interview_type'].startswith('Engineering - '):
-        header['interview_type'] = header['interview_type'][len('Engineering - '):]
+def _resolve_users(user_ids):
+    """Look up Lever users by ID, returning a dict of user_id -> user.
+
+    Users that can't be fetched get a placeholder marked `unavailable`, so
+    their feedback still renders.
+    """
+    user_ids = set(user_ids)
+    users = user_cache.get_multi(user_ids)
+    for user_id in user_ids.difference(users):
+        users[user_id] = dict(
+            id=user_id,
+            name=UNAVAILABLE_USER_NAME,
+            unavailable=True,
+        )
+    return users
+
+
+def _mark_degraded(reason):
+    """Flag the page being rendered as showing incomplete or stale data."""
+    logger.warning('degraded page: %s', reason)
+    if flask.has_app_context():
+        flask.g.degraded = getattr(flask.g, 'degraded', []) + [reason]
+
+
+def _candidate_or_placeholder(plan, candidate_id):
     try:
-        score = int(header['score'][0])
-        header['score'] = str(score)
-    except Exception:
-        pass
-    return header
-
-class InterviewTypes(object):
-    PROBLEM_SOLVING = 'problem solving'
-    SYSTEM_DESIGN = 'system design'
-    PLAYS_WELL = 'plays well with others'
-    OWNERSHIP = 'ownership'
-
-
-FEEDBACK_ORDERING = [
-    InterviewTypes.PROBLEM_SOLVING,
-    InterviewTypes.SYSTEM_DESIGN,
-    InterviewTypes.PLAYS_WELL,
-    InterviewTypes.OWNERSHIP,
-]
+        return plan.result('candidate')
+    except (lever.LeverError, cache.CachedFailure):
+        return dict(id=candidate_id, name=candidate_id)
 
 
-def _assign_arbitrary_feedback_ordering(feedback):
-    feedback_title = feedback['text'].lower()
-    for rank, interview_type in enumerate(FEEDBACK_ORDERING):
-        if interview_type in feedback_title:
-            # Increment by 1 since 0 is reserved for phone interviews, which
-            # must come first :P
-            return rank + 1
-    return None
-
-
-def _compile_feedback(candidate_id):
-    feedbacks = lever_client.get_candidate_feedback(candidate_id)
-    headers = []
-
-    def arbitrary_order_to_be_consistent_with_docs(feedback):
-        # Regardless of if it's an arbitrary order or not, phone interviews
-        # always go first.
-        if 'phone' in feedback['text'].lower():
-            return 0
-        if _assign_arbitrary_feedback_ordering(feedback) is not None:
-            return _assign_arbitrary_feedback_ordering(feedback)
-        return feedback['completedAt']
-
-    feedbacks = sorted(
-        feedbacks,
-        key=arbitrary_order_to_be_consistent_with_docs,
+def _is_packet_feedback(feedback):
+    return (
+        feedback['completedAt'] is not None
+        and not feedback['text'].startswith(feedback_model.INTERN_EVALUATION_PREFIX)
     )
-    feedbacks = [
-        feedback for feedback in feedbacks
-        if feedback['completedAt'] is not None
-        and not feedback['text'].startswith("Intern Evaluations")
-    ]
-    for feedback in feedbacks:
-        try:
-            # TODO: We can probably cache this forever
-            user = memcache.get(feedback['user'])
-            if user is None:
-                user = lever_client.get_user(feedback['user'])
-                memcache.add(
-                    feedback['user'],
-                    user,
-                    60 * 60 * 24 * 7,
-                )
-
-            feedback['username'] = user['name']
-            feedback['score'] = _extract_fields_as_keyval(
-                feedback['fields'],
-                u'Rating',
-            )
-            header = dict(
-                score=feedback['score'],
-                interviewer=user['name'].strip(),
-                interview_type=feedback['text'].strip(),
-            )
-            headers.append(_truncate_header(header))
-
-            FIELD_BLACKLIST = [
-                TEAM_FEEDBACK_KEY,
-                ANYTHING_ELSE_TO_KNOW_KEY,
-                u'Rating',
-            ]
-            feedback['feedback_text'] = feedback['fields'][0]['value']
-            feedback['feedback_texts'] = [dict(
-                header=field['text'],
-                text=field['value'],
-            ) for field in feedback['fields']
-                if field['text'] not in FIELD_BLACKLIST
-            ]
-
-            # There are two types of team feedback, the old "Team Suggestion"
-            # and the newer, really long one defined by TEAM_FEEDBACK_KEY.
-            # Account for both of these and conditionally include them in the
-            # feedback payload
-            feedback['team_suggestion'] = _extract_fields_as_keyval(
-                feedback['fields'],
-                u'Team Suggestions',
-                allow_missing=True,
-            )
-            feedback['team_feedback'] = _extract_fields_as_keyval(
-                feedback['fields'],
-                TEAM_FEEDBACK_KEY,
-                allow_missing=True,
-            )
-            feedback['anything_else_we_should_know'] = _extract_fields_as_keyval(
-                feedback['fields'],
-                ANYTHING_ELSE_TO_KNOW_KEY,
-                allow_missing=True,
-            )
 
-        except Exception as e:
-            print e
-            print 11111, 'failure!'
-            pprint(feedback)
-    return headers, feedbacks
-
-def _is_intern_form_v2(fields):
-    # New form was released that allowed the reviewer to provide notes for each
-    # evaluation metric, whereas before there was one overall notes field.
-    # Figure out which one we're presenting for.
-    notes_field_count = 0
-    for field in fields:
-        if field['text'].lower().startswith('notes'):
-            notes_field_count += 1
-        if notes_field_count > 1:
-            return True
-    return False
-
-def _determine_intern_fields_form_v1(fields):
-    cleaned_fields = dict(
-        overall_score=None,
-        notes=None,
-        other_random_fields=[],
+
+def _plan_candidate(plan, candidate_id, load_candidate, refresh=False):
+    """Add the candidate and their feedback history to `plan`.
+
+    Both come from the store when it has the candidate. Otherwise, or with
+    `refresh`, they're fetched live with `load_candidate` and Lever's feedback
+    pagination, and `stored` saves them for next time.
+    """
+    stored = None if refresh else store.get_candidate(candidate_id)
+    if stored is not None:
+        candidate, feedbacks = stored
+        plan.provide('candidate', candidate)
+        plan.provide('all_feedbacks', feedbacks)
+        return
+    plan.start('candidate', load_candidate, candidate_id)
+    plan.start(
+        'all_feedbacks',
+        lever_client.get_candidate_feedback,
+        candidate_id,
     )
-    for field in fields:
-        if field['text'].lower().startswith('overall'):
-            cleaned_fields['overall_score'] = field['value']
-            continue
-        if field['text'].lower().startswith('notes'):
-            cleaned_fields['notes'] = field['value']
-            continue
-        clean_name = field['text'].split('-')[0].strip()
-        cleaned_fields['other_random_fields'].append(dict(
-            label=clean_name,
-            text=field['value'],
-        ))
-    return cleaned_fields
+    plan.after('stored', ['candidate', 'all_feedbacks'], store.put_candidate)
+
+
+def _plan_feedback_fetches(plan, candidate_id, keep_feedback):
+    """Add the feedback pagination to `plan`.
+
+    `feedbacks` holds the candidate's feedback that passes `keep_feedback`.
+    An `all_feedbacks` fetch already in the plan is reused rather than
+    paginated again.
+    """
+    if 'all_feedbacks' not in plan:
+        plan.start(
+            'all_feedbacks',
+            lever_client.get_candidate_feedback,
+            candidate_id,
+        )
+    plan.after(
+        'feedbacks',
+        ['all_feedbacks'],
+        lambda feedbacks: [
+            feedback
+            for feedback in feedbacks
+            if keep_feedback(feedback)
+        ],
+    )
+
 
-def _determine_intern_fields_form_v2(fields):
-    cleaned_fields = dict(
-        overall_score=None,
-        notes=None,
-        other_random_fields=[],
+def _plan_users(plan):
+    """Add `users`, the interviewers who wrote `feedbacks`, to `plan`.
+
+    Kept apart from `_plan_feedback_fetches` so a cached packet whose
+    feedback hasn't changed doesn't look anyone up.
+    """
+    if 'users' not in plan:
+        plan.after(
+            'users',
+            ['feedbacks'],
+            lambda feedbacks: _resolve_users(
+                feedback['user'] for feedback in feedbacks
+            ),
+        )
+
+
+def _compile_feedback(candidate_id, plan=None):
+    if plan is None:
+        plan = concurrency.FetchPlan()
+    if 'feedbacks' not in plan:
+        _plan_feedback_fetches(plan, candidate_id, _is_packet_feedback)
+    _plan_users(plan)
+    return feedback_model.compile_packet(
+        plan.result('feedbacks'),
+        plan.result('users'),
     )
-    current_eval_field = {}
-    for field in fields:
-        if field['text'].lower().startswith('overall'):
-            cleaned_fields['overall_score'] = field['value']
-            continue
-        if field['text'].lower().startswith('notes'):
-            # Notes field corresponds to previous eval field in v2. Append to
-            # fields list then clear the slate.
-            current_eval_field['notes'] = field['value']
-            cleaned_fields['other_random_fields'].append(current_eval_field)
-            current_eval_field = {}
-            continue
-        clean_name = field['text'].split('-')[0].strip()
-        if current_eval_field:
-            # Have a current eval being considering means there was no notes,
-            # so we can persist the current as is and assume this iteration is
-            # starting a next one.
-            cleaned_fields['other_random_fields'].append(current_eval_field)
-            current_eval_field = {}
-        current_eval_field = dict(
-            label=clean_name,
-            text=field['value'],
+
+
+def _n_months_ago_ms(n):
+    return (time.time() - n * 30 * 24 * 60 * 60) * 1000
+
+
+def _intern_cutoff_ms():
+    """INTERN_EVAL_LOOKBACK_MONTHS ago, rounded down to the start of the day.
+
+    Rounding keeps the cutoff steady for a day, so it can key cached intern
+    packets.
+    """
+    cutoff_ms = int(_n_months_ago_ms(INTERN_EVAL_LOOKBACK_MONTHS))
+    return cutoff_ms - cutoff_ms % DAY_MS
+
+
+def _recent_intern_feedback_filter(cutoff_ms=None):
+    """Return a `keep_feedback` test for intern evaluations since `cutoff_ms`.
+
+    The cutoff defaults to `_intern_cutoff_ms()`, worked out once here rather
+    than for every feedback.
+    """
+    if cutoff_ms is None:
+        cutoff_ms = _intern_cutoff_ms()
+
+    def is_recent_intern_feedback(feedback):
+        return (
+            feedback['completedAt'] is not None
+            and feedback['completedAt'] >= cutoff_ms
+            and feedback['text'].startswith(feedback_model.INTERN_EVALUATION_PREFIX)
+        )
+    return is_recent_intern_feedback
+
+
+def _compile_intern_feedback(candidate_id, plan=None, cutoff_ms=None):
+    if plan is None:
+        plan = concurrency.FetchPlan()
+    if 'feedbacks' not in plan:
+        _plan_feedback_fetches(plan, candidate_id, _recent_intern_feedback_filter(cutoff_ms))
+    _plan_users(plan)
+    return feedback_model.compile_intern_packet(
+        plan.result('feedbacks'),
+        plan.result('users'),
+    )
+
+
+def _cached_compile(packets, compile_packet, keep_feedback, candidate_id, plan, refresh,
+                    variant=None):
+    """Return `compile_packet(candidate_id, plan)`, reusing `packets` while current.
+
+    `plan` must come from `_plan_candidate`. If the candidate's
+    `lastInteractionAt` matches a recently checked cache entry it's served as
+    is; otherwise the feedback is only recompiled when its revision changed.
+    `refresh` ignores the cache. If Lever fails, the cached entry is served as
+    a degraded page. A packet compiled without the candidate's record isn't
+    cached.
+    """
+    entry = None if refresh else packets.get(candidate_id, variant)
+    try:
+        stamp = packet_cache.candidate_stamp(plan.result('candidate'))
+        have_candidate = True
+    except (lever.LeverError, cache.CachedFailure) as e:
+        # The page shows a placeholder candidate (_candidate_or_placeholder)
+        # with whatever feedback can still be had.
+        stamp = None
+        have_candidate = False
+        _mark_degraded("Couldn't look up the candidate in Lever (%s)." % (e,))
+    if entry is not None and packet_cache.stamp_trusted(entry, stamp):
+        return entry['packet']
+
+    try:
+        _plan_feedback_fetches(plan, candidate_id, keep_feedback)
+        revision = packet_cache.feedback_revision(plan.result('feedbacks'))
+    except (lever.LeverError, cache.CachedFailure) as e:
+        if entry is None:
+            raise
+        _mark_degraded(
+            "Couldn't reach Lever (%s), so this may be missing recent feedback." % (e,),
         )
-    if current_eval_field:
-        cleaned_fields['other_random_fields'].append(current_eval_field)
-    return cleaned_fields
+        return entry['packet']
 
-def _determine_intern_fields(fields):
-    if _is_intern_form_v2(fields):
-        return _determine_intern_fields_form_v2(fields)
+    if entry is not None and entry['revision'] == revision:
+        packet = entry['packet']
     else:
-        return _determine_intern_fields_form_v1(fields)
+        packet = compile_packet(candidate_id, plan)
+        if any(user.get('unavailable') for user in plan.result('users').itervalues()):
+            # Don't cache it, so the names fill in once Lever recovers.
+            _mark_degraded("Some interviewers couldn't be looked up in Lever.")
+            return packet
+    if not have_candidate:
+        # Nothing to stamp the entry with, and `stored` failed with the
+        # candidate.
+        return packet
+    packets.set(
+        candidate_id,
+        revision,
+        packet,
+        stamp=stamp,
+        variant=variant,
+    )
+    if 'stored' in plan:
+        plan.result('stored')
+    return packet
+
+
+def _cached_compile_feedback(candidate_id, plan, refresh=False):
+    return _cached_compile(
+        feedback_packets,
+        _compile_feedback,
+        _is_packet_feedback,
+        candidate_id,
+        plan,
+        refresh,
+    )
+
+
+def _cached_compile_intern_feedback(candidate_id, plan, refresh=False, cutoff_ms=None):
+    """Like `_cached_compile_feedback`, for evaluations since `cutoff_ms`.
+
+    The cutoff is part of the cache key, so evaluations that age out of the
+    lookback window drop off the cached packet too.
+    """
+    if cutoff_ms is None:
+        cutoff_ms = _intern_cutoff_ms()
+    return _cached_compile(
+        intern_packets,
+        lambda candidate_id, plan: _compile_intern_feedback(candidate_id, plan, cutoff_ms),
+        _recent_intern_feedback_filter(cutoff_ms),
+        candidate_id,
+        plan,
+        refresh,
+        variant=cutoff_ms,
+    )
+
+
+# Each instance keeps its own search index and catches up with the store at
+# most this often. A search spends at most SEARCH_CATCH_UP_BUDGET_SECONDS on
+# it, so the first searches on a new instance build the index a slice at a
+# time, after warmup has built as much as WARMUP_SEARCH_BUDGET_SECONDS allows.
+SEARCH_CATCH_UP_SECONDS = 60
+SEARCH_CATCH_UP_BUDGET_SECONDS = 0.5
+WARMUP_SEARCH_BUDGET_SECONDS = 30
+SEARCH_RESULTS = 50
+
+search_index = feedback_search.FeedbackIndex()
+
+
+def _precompute_packets(candidate_id):
+    """Refresh a candidate in the store and cache both of their packets."""
+    with ratelimit.lane(ratelimit.BATCH):
+        candidate, feedbacks = feedback_store.refresh_candidate(
+            lever_client,
+            store,
+            candidate_id,
+        )
+        for cached_compile in (_cached_compile_feedback, _cached_compile_intern_feedback):
+            plan = concurrency.FetchPlan()
+            plan.provide('candidate', candidate)
+            plan.provide('all_feedbacks', feedbacks)
+            cached_compile(candidate_id, plan, refresh=True)
+        search_index.add_candidate(candidate, feedbacks)
+
+
+precompute_queue = background.make_queue(
+    'precompute',
+    '/tasks/precompute',
+    _precompute_packets,
+    max_local_workers=PRECOMPUTE_LOCAL_WORKERS,
+)
 
 
 @app.route('/')
-@login.admin_required
-@login.company_login_required
-@login.login_required
+@auth.require(auth.ADMIN)
 def home():
     """Return a friendly HTTP greeting."""
     return flask.render_template(
@@ -237,9 +428,7 @@ def home():
 
 
 @app.route('/fetch_feedback', methods=['POST'])
-@login.login_required
-@login.company_login_required
-@login.admin_required
+@auth.require(auth.ADMIN)
 def fetch_feedback():
     """Return a friendly HTTP greeting."""
     candidate_id = request.form['candidate_id']
@@ -248,9 +437,7 @@ def fetch_feedback():
     )
 
 @app.route('/treb')
-@login.login_required
-@login.company_login_required
-@login.admin_required
+@auth.require(auth.ADMIN)
 def treb():
     return flask.render_template(
         'trebuchet.html',
@@ -259,9 +446,7 @@ def treb():
 
 
 @app.route('/fetch_internevals', methods=['POST'])
-@login.login_required
-@login.company_login_required
-@login.admin_required
+@auth.require(auth.ADMIN)
 def fetch_internevals():
     """Return a friendly HTTP greeting."""
     candidate_id = request.form['candidate_id']
@@ -270,83 +455,888 @@ def fetch_internevals():
     )
 
 
-def _more_than_n_months_old(timestamp, n=7):
-    # https://jira.yelpcorp.com/browse/ENGREC-259, change lookback period to 7 months
-    import datetime
-    dt = datetime.datetime.fromtimestamp(timestamp/1000)
-    return datetime.datetime.now() - datetime.timedelta(days=n * 30) > dt
-
-
 @app.route('/trebuchet/<candidate_id>')
-@login.login_required
-@login.company_login_required
-@login.admin_required
+@auth.require(auth.ADMIN)
 def intern_thing(candidate_id):
     """Return a friendly HTTP greeting."""
-    feedbacks = lever_client.get_candidate_feedback(candidate_id)
-    feedbacks = [feedback for feedback in feedbacks if feedback['completedAt'] is not None]
-    feedbacks = sorted(
-        feedbacks,
-        key=lambda x: x['completedAt'],
+    plan = concurrency.FetchPlan()
+    refresh = request.args.get('refresh') == '1'
+    _plan_candidate(plan, candidate_id, candidate_cache.get, refresh)
+    headers, final_feedbacks = _cached_compile_intern_feedback(
+        candidate_id,
+        plan,
+        refresh=refresh,
+    )
+    return _render_packet_page(
+        'trebuchet.html',
+        feedbacks=final_feedbacks,
+        candidate=_candidate_or_placeholder(plan, candidate_id),
+        headers=headers,
     )
 
-    headers = []
-    final_feedbacks = []
-    for feedback in feedbacks:
-        if not feedback['text'].startswith('Intern Evaluations'):
-            continue
-        if _more_than_n_months_old(feedback['completedAt'], n=7):
-            continue
-        user = memcache.get(feedback['user'])
-        if user is None:
-            user = lever_client.get_user(feedback['user'])
-            memcache.add(
-                feedback['user'],
-                user,
-                60 * 60 * 24 * 7,
-            )
+COHORT_COLUMNS = [
+    ('name', 'Intern'),
+    ('evaluations', 'Evaluations'),
+    ('mean_score', 'Mean score'),
+    ('min_score', 'Min'),
+    ('max_score', 'Max'),
+    ('latest_score', 'Latest'),
+]
+
+
+def _cohort_candidates(team=None, posting_id=None):
+    """Candidates on `posting_id`, or on any of `team`'s postings, deduplicated."""
+    if posting_id:
+        posting_ids = [posting_id]
+    else:
+        posting_ids = [
+            posting['id'] for posting in lever_client.get_all_postings(team)
+        ]
+    candidates = collections.OrderedDict()
+    for posting_candidates in concurrency.bounded_map(
+        lever_client.get_posting_candidates,
+        posting_ids,
+        max_workers=COHORT_WORKERS,
+    ):
+        for candidate in posting_candidates:
+            candidates.setdefault(candidate['id'], candidate)
+    return candidates.values()
+
+
+def _intern_cohort(candidates):
+    """Summarize the recent intern evaluations of every candidate in `candidates`.
+
+    Returns (rows, errors). Candidates without recent evaluations are left
+    out, and the ones Lever last touched before the cutoff are dropped before
+    their feedback is even looked at.
+    """
+    cutoff_ms = _intern_cutoff_ms()
+    candidates = [
+        candidate
+        for candidate in candidates
+        if (candidate.get('lastInteractionAt') or cutoff_ms) >= cutoff_ms
+    ]
 
-        cleaned_fields = _determine_intern_fields(feedback['fields'])
-        cleaned_fields['username'] = user['name']
-        final_feedbacks.append(cleaned_fields)
-        headers.append(dict(
-            score=cleaned_fields['overall_score'],
-            interviewer=user['name'].strip(),
+    def summarize(candidate):
+        plan = concurrency.FetchPlan()
+        _plan_candidate(plan, candidate['id'], lambda candidate_id: candidate)
+        headers, _ = _cached_compile_intern_feedback(
+            candidate['id'],
+            plan,
+            cutoff_ms=cutoff_ms,
+        )
+        if not headers:
+            return None
+        return feedback_model.summarize_intern_packet(plan.result('candidate'), headers)
+
+    rows = []
+    errors = []
+    for candidate, row, error in concurrency.imap_unordered(
+        summarize,
+        candidates,
+        max_workers=COHORT_WORKERS,
+    ):
+        if error is not None:
+            errors.append(dict(candidate_id=candidate['id'], error=error))
+        elif row is not None:
+            rows.append(row)
+    return rows, errors
+
+
+def _sort_cohort(rows, sort, descending):
+    # Missing scores sort last whichever way the column is ordered.
+    present = [row for row in rows if row[sort] is not None]
+    missing = [row for row in rows if row[sort] is None]
+    present.sort(key=lambda row: row[sort], reverse=descending)
+    return present + missing
+
+
+def _csv_line(values):
+    """One CSV line of `values`, utf-8 encoded, with None as an empty cell."""
+    out = StringIO.StringIO()
+    csv.writer(out).writerow([
+        unicode(value if value is not None else '').encode('utf-8')
+        for value in values
+    ])
+    return out.getvalue()
+
+
+def _cohort_csv(rows):
+    lines = [
+        _csv_line(
+            ['candidate_id'] + [column for column, _ in COHORT_COLUMNS] + ['scores'],
+        ),
+    ]
+    for row in rows:
+        lines.append(_csv_line(
+            [row['candidate_id']]
+            + [row[column] for column, _ in COHORT_COLUMNS]
+            + [' '.join(str(score) for score in row['scores'])]
         ))
+    return ''.join(lines)
+
+
+@app.route('/trebuchet/cohort')
+@auth.require(auth.ADMIN)
+def trebuchet_cohort():
+    """Intern evaluation summary for every intern on a team or posting."""
+    team = request.args.get('team', '').strip()
+    posting_id = request.args.get('posting_id', '').strip()
+    sort = request.args.get('sort', 'mean_score')
+    if sort not in dict(COHORT_COLUMNS):
+        sort = 'mean_score'
+    descending = request.args.get('order', 'desc') == 'desc'
+    if not team and not posting_id:
+        return flask.render_template(
+            'trebuchet_cohort.html',
+            title=APP_NAME,
+            columns=COHORT_COLUMNS,
+        )
+
+    rows, errors = _intern_cohort(_cohort_candidates(team, posting_id))
+    rows = _sort_cohort(rows, sort, descending)
+    if request.args.get('format') == 'csv':
+        return flask.Response(
+            _cohort_csv(rows),
+            mimetype='text/csv',
+            headers={
+                'Content-Disposition': 'attachment; filename=trebuchet-cohort.csv',
+            },
+        )
     return flask.render_template(
-        'trebuchet.html',
-        feedbacks=final_feedbacks,
-        candidate=lever_client.get_candidate(candidate_id),
-        headers=headers,
+        'trebuchet_cohort.html',
+        title=APP_NAME,
+        columns=COHORT_COLUMNS,
+        team=team,
+        posting_id=posting_id,
+        sort=sort,
+        descending=descending,
+        rows=rows,
+        errors=errors,
     )
 
+
 @app.route('/feedback/<candidate_id>')
-@login.login_required
-@login.company_login_required
-@login.admin_required
+@auth.require(auth.ADMIN)
 def feedback(candidate_id):
-    headers, feedbacks = _compile_feedback(candidate_id)
-    candidate = lever_client.get_candidate(candidate_id)
-    return flask.render_template(
+    plan = concurrency.FetchPlan()
+    refresh = request.args.get('refresh') == '1'
+    _plan_candidate(plan, candidate_id, lever_client.get_candidate, refresh)
+    headers, feedbacks = _cached_compile_feedback(
+        candidate_id,
+        plan,
+        refresh=refresh,
+    )
+    candidate = _candidate_or_placeholder(plan, candidate_id)
+    return _render_packet_page(
         'home.html',
         title=APP_NAME,
         candidate_id=candidate_id,
         candidate=candidate,
         headers=headers,
         feedbacks=feedbacks,
-        team_feedback_key=TEAM_FEEDBACK_KEY,
-        anything_to_know_key=ANYTHING_ELSE_TO_KNOW_KEY,
     )
 
+STREAM_FLUSH_BYTES = 4096
+GZIP_LEVEL = 6
+
+# Rendered (and usually gzipped) bytes of recently viewed packet pages, keyed
+# by ETag, so repeat views skip rendering and compression.
+rendered_pages = cache.LRUCache(max_size=200, ttl=60 * 60)
+# Rendered HTML of single feedback blocks, keyed by feedback and revision, so
+# a page whose packet gained one feedback only renders that one.
+rendered_fragments = cache.LRUCache(max_size=2000, ttl=60 * 60 * 24)
+FRAGMENT_CONTEXT = dict(
+    team_feedback_key=TEAM_FEEDBACK_KEY,
+    anything_to_know_key=ANYTHING_ELSE_TO_KNOW_KEY,
+)
+
+
+@app.template_global()
+def feedback_fragment(template_name, feedback):
+    """Render one feedback with the fragment template `template_name`.
+
+    Fragments are reused from `rendered_fragments` while the feedback's
+    revision stays the same. They never outlive the instance, so templates
+    changed by a deploy can't be served stale.
+    """
+    revision = packet_cache.fragment_revision(feedback)
+    key = None
+    if revision is not None:
+        key = (template_name, revision)
+        html = rendered_fragments.get(key)
+        if html is not None:
+            return html
+    template = app.jinja_env.get_template(template_name)
+    html = flask.Markup(template.render(feedback=feedback, **FRAGMENT_CONTEXT))
+    if key is not None:
+        rendered_fragments.set(key, html)
+    return html
+
+
+def _buffered(chunks, flush_bytes=STREAM_FLUSH_BYTES):
+    """Join small template chunks into writes of at least `flush_bytes`."""
+    buffered = []
+    size = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size >= flush_bytes:
+            yield u''.join(buffered)
+            buffered = []
+            size = 0
+    if buffered:
+        yield u''.join(buffered)
+
+
+def _stream_template(template_name, **context):
+    """Render a template as a streamed response.
+
+    Jinja pulls from any generators in `context` as it renders, so chunks go
+    out as soon as each one is produced, and the full page is never held in
+    memory as one string. That only holds where the WSGI server streams: App
+    Engine's python27 runtime collects the whole response before sending it.
+    """
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return flask.Response(
+        flask.stream_with_context(_buffered(template.stream(context))),
+    )
+
+
+def _page_etag(template_name, context):
+    """Fingerprint everything a packet page is rendered from.
+
+    The deployed version is included, so template changes alter it too.
+    """
+    digest = hashlib.sha1()
+    digest.update(os.environ.get('CURRENT_VERSION_ID', ''))
+    digest.update(template_name)
+    digest.update(json.dumps(context, sort_keys=True, default=repr))
+    return digest.hexdigest()
+
+
+def _gzip(body):
+    out = StringIO.StringIO()
+    with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as f:
+        f.write(body)
+    return out.getvalue()
+
+
+def _rendered_page(template_name, etag, compress, context):
+    """Return the page's bytes, gzipped if `compress`, reusing `rendered_pages`."""
+    with tracing.span('cache', 'rendered-page') as span:
+        body = rendered_pages.get(etag) if etag is not None else None
+        span['hits' if body is not None else 'misses'] = 1
+    if body is not None:
+        return body
+    with tracing.span('render', template_name):
+        body = flask.render_template(template_name, **context).encode('utf-8')
+    if compress:
+        body = _gzip(body)
+    if etag is not None:
+        rendered_pages.set(etag, body)
+    return body
+
+
+def _render_packet_page(template_name, **context):
+    """Render a packet page, or answer 304 if the client's copy is current.
+
+    Pages get a strong ETag over their content, except degraded ones, which
+    are never cached.
+    """
+    stream = request.args.get('stream')
+    if stream is None:
+        streaming = app.config['STREAM_PACKET_PAGES']
+    else:
+        streaming = stream == '1'
+    compress = not streaming and request.accept_encodings['gzip'] > 0
+    etag = None
+    if not getattr(flask.g, 'degraded', None):
+        # Gzipped bytes differ from plain ones, so they get their own ETag.
+        etag = _page_etag(template_name, context) + ('-gzip' if compress else '')
+
+    if etag is not None and request.if_none_match.contains(etag):
+        response = flask.Response(status=304)
+    elif streaming:
+        response = _stream_template(template_name, **context)
+    else:
+        response = flask.Response(
+            _rendered_page(template_name, etag, compress, context),
+            mimetype='text/html',
+        )
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Pages need a signed-in user, so only the browser keeps them, and it has
+    # to revalidate before every reuse.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _parse_candidate_ids(raw):
+    candidate_ids = []
+    for candidate_id in raw.replace(',', ' ').split():
+        if candidate_id not in candidate_ids:
+            candidate_ids.append(candidate_id)
+    return candidate_ids
+
+
+def _compile_packets(candidate_ids):
+    """Yield a packet dict per candidate, in the order they finish compiling.
+
+    Interviewer lookups go through the shared user cache, so interviewers who
+    sat on several of the panels are fetched once.
+    """
+    def compile_packet(candidate_id):
+        plan = concurrency.FetchPlan()
+        _plan_candidate(plan, candidate_id, lever_client.get_candidate)
+        headers, feedbacks = _cached_compile_feedback(candidate_id, plan)
+        return dict(
+            candidate_id=candidate_id,
+            candidate=_candidate_or_placeholder(plan, candidate_id),
+            headers=headers,
+            feedbacks=feedbacks,
+        )
+
+    for candidate_id, packet, error in concurrency.imap_unordered(
+        compile_packet,
+        candidate_ids,
+        max_workers=COMMITTEE_WORKERS,
+    ):
+        if error is not None:
+            yield dict(candidate_id=candidate_id, error=error)
+        else:
+            yield packet
+
+
+@app.route('/committee', methods=['GET', 'POST'])
+@auth.require(auth.ADMIN)
+def committee():
+    """Compile feedback packets for a list of candidates or a posting."""
+    if request.method == 'GET':
+        return flask.render_template(
+            'committee.html',
+            title=APP_NAME,
+        )
+
+    posting = None
+    candidate_ids = _parse_candidate_ids(request.form.get('candidate_ids', ''))
+    posting_id = request.form.get('posting_id', '').strip()
+    if posting_id:
+        posting = posting_cache.get(posting_id)
+        candidate_ids.extend(
+            candidate['id']
+            for candidate in lever_client.get_posting_candidates(posting_id)
+            if candidate['id'] not in candidate_ids
+        )
+    return _stream_template(
+        'committee.html',
+        title=APP_NAME,
+        posting=posting,
+        packets=_compile_packets(candidate_ids),
+    )
+
+
+EXPORT_WORKERS = 8
+EXPORT_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+EXPORT_KINDS = ('feedback', 'intern')
+
+
+def _export_kind(kind):
+    """Return (keep_feedback, build_records) for an export of `kind`."""
+    if kind == 'intern':
+        # Exports cover every completed intern evaluation, not just the
+        # lookback window the Trebuchet page shows.
+        return (
+            _recent_intern_feedback_filter(cutoff_ms=0),
+            feedback_model.export_intern_records,
+        )
+    return _is_packet_feedback, feedback_model.export_feedback_records
+
+
+def _export_candidate(candidate_id, keep_feedback, build_records):
+    """Return the export records for one candidate, as a list."""
+    with ratelimit.lane(ratelimit.BATCH):
+        plan = concurrency.FetchPlan()
+        _plan_candidate(plan, candidate_id, lever_client.get_candidate)
+        _plan_feedback_fetches(plan, candidate_id, keep_feedback)
+        _plan_users(plan)
+        records = list(build_records(
+            plan.result('candidate'),
+            plan.result('feedbacks'),
+            plan.result('users'),
+        ))
+        if 'stored' in plan:
+            plan.result('stored')
+        return records
+
+
+def _export_record_line(record, export_format):
+    if export_format == 'csv':
+        return _csv_line(
+            json.dumps(record[column]) if column == 'answers' else record.get(column)
+            for column in feedback_model.EXPORT_COLUMNS
+        )
+    return json.dumps(record, sort_keys=True) + '\n'
+
+
+def _export_chunks(candidate_ids, kind, export_format, after=None, max_workers=EXPORT_WORKERS):
+    """Yield (candidate_id, text) per candidate in `candidate_ids`, in order.
+
+    `text` holds the candidate's records in `export_format`. Candidates are
+    compiled `max_workers` at a time and only a small window of them is held
+    at once, so memory doesn't grow with the number of candidates. Candidates
+    up to and including `after` are skipped, to resume an interrupted export;
+    ValueError is raised if `after` isn't among them. A candidate that can't
+    be exported gets an `error` record instead.
+    """
+    keep_feedback, build_records = _export_kind(kind)
+    candidate_ids = iter(candidate_ids)
+    if after is not None:
+        for candidate_id in candidate_ids:
+            if candidate_id == after:
+                break
+        else:
+            raise ValueError('%s is not among the candidates to export' % (after,))
+
+    for candidate_id, records, error in concurrency.imap(
+        lambda candidate_id: _export_candidate(candidate_id, keep_feedback, build_records),
+        candidate_ids,
+        max_workers=max_workers,
+    ):
+        if error is not None:
+            records = [dict(
+                dict.fromkeys(feedback_model.EXPORT_COLUMNS),
+                type='error',
+                candidate_id=candidate_id,
+                notes=str(error),
+                answers=[],
+            )]
+        yield candidate_id, ''.join(
+            _export_record_line(record, export_format) for record in records
+        )
+
+
+def _export_stream(candidate_ids, kind, export_format, after=None):
+    """The body of an /export response.
+
+    JSONL exports follow each candidate with a checkpoint record naming it;
+    passing that as `after` resumes the export from the next candidate.
+    """
+    if export_format == 'csv' and after is None:
+        yield _csv_line(feedback_model.EXPORT_COLUMNS)
+    for candidate_id, text in _export_chunks(candidate_ids, kind, export_format, after):
+        if export_format == 'jsonl':
+            text += json.dumps(dict(type='checkpoint', after=candidate_id)) + '\n'
+        yield text
+
+
+# App Engine's python27 runtime buffers whole responses, so /export holds the
+# entire export in memory, under the 32MB response limit and the request
+# deadline. Bigger exports are refused; tools/export_feedback handles them.
+EXPORT_MAX_CANDIDATES = 500
+
+
+@app.route('/export')
+@auth.require(auth.ADMIN)
+def export():
+    """Compiled feedback for a list of candidates or a posting, as a download.
+
+    ?candidate_ids=...|posting_id=... &kind=feedback|intern &format=jsonl|csv
+    &after=<candidate_id>. Only for up to EXPORT_MAX_CANDIDATES candidates;
+    use tools/export_feedback for more.
+    """
+    kind = request.args.get('kind', 'feedback')
+    export_format = request.args.get('format', 'jsonl')
+    if kind not in EXPORT_KINDS or export_format not in EXPORT_FORMATS:
+        flask.abort(400)
+    candidate_ids = _parse_candidate_ids(request.args.get('candidate_ids', ''))
+    posting_id = request.args.get('posting_id', '').strip()
+    if posting_id:
+        known = set(candidate_ids)
+        # Sorted, so a resumed export walks the posting in the same order.
+        candidate_ids.extend(sorted(
+            candidate['id']
+            for candidate in lever_client.get_posting_candidates(posting_id)
+            if candidate['id'] not in known
+        ))
+    if not candidate_ids:
+        flask.abort(400)
+    after = request.args.get('after') or None
+    if after is not None and after not in candidate_ids:
+        flask.abort(400, '%s is not among the candidates to export' % (after,))
+    if len(candidate_ids) > EXPORT_MAX_CANDIDATES:
+        flask.abort(400, '%d candidates is more than /export handles (%d); use tools/export_feedback' % (
+            len(candidate_ids), EXPORT_MAX_CANDIDATES))
+
+    # A span per Lever call over thousands of candidates would make the trace
+    # itself the thing that grows.
+    tracing.deactivate()
+    return flask.Response(
+        flask.stream_with_context(_export_stream(
+            candidate_ids,
+            kind,
+            export_format,
+            after=after,
+        )),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': 'attachment; filename=catapult-%s.%s' % (
+                kind, export_format),
+        },
+    )
+
+
+def _parse_date_ms(value):
+    """Milliseconds at the start of a YYYY-MM-DD day (UTC), or None."""
+    try:
+        return calendar.timegm(time.strptime(value, '%Y-%m-%d')) * 1000
+    except (TypeError, ValueError):
+        return None
+
+
+def _search_url(filters, **changes):
+    """/search with `filters`, some of them replaced by `changes`."""
+    args = dict(filters, **changes)
+    return flask.url_for('search', **dict(
+        (name, value)
+        for name, value in args.iteritems()
+        if value is not None and value != ''
+    ))
+
+
+@app.route('/search')
+@auth.require(auth.ADMIN)
+def search():
+    """Full-text search over every stored feedback, with facets."""
+    search_index.catch_up(
+        store,
+        max_age=SEARCH_CATCH_UP_SECONDS,
+        time_budget=SEARCH_CATCH_UP_BUDGET_SECONDS,
+    )
+    query = request.args.get('q', '').strip()
+    interviewer_id = request.args.get('interviewer') or None
+    interview_type = request.args.get('type', type=int)
+    field = request.args.get('field')
+    if field not in feedback_search.FIELDS:
+        field = None
+    since = request.args.get('since', '')
+    until = request.args.get('until', '')
+    filters = dict(
+        q=query,
+        interviewer=interviewer_id,
+        type=interview_type,
+        field=field,
+        since=since,
+        until=until,
+    )
+    if not any(value is not None and value != '' for value in filters.values()):
+        return flask.render_template(
+            'search.html',
+            title=APP_NAME,
+            filters=filters,
+            fields=feedback_search.FIELD_LABELS,
+            interview_types=feedback_model.INTERVIEW_TYPES,
+        )
+
+    until_ms = _parse_date_ms(until)
+    start = time.time()
+    found = search_index.search(
+        query,
+        interviewer_id=interviewer_id,
+        interview_type=interview_type,
+        field=field,
+        since=_parse_date_ms(since),
+        # Through the end of the `until` day.
+        until=until_ms + DAY_MS if until_ms is not None else None,
+        limit=SEARCH_RESULTS,
+    )
+    search_ms = (time.time() - start) * 1000
+
+    interviewers = found['facets']['interviewers'][:20]
+    users = _resolve_users(
+        [user_id for user_id, _ in interviewers]
+        + [result['interviewer_id'] for result in found['results']]
+    )
+    for result in found['results']:
+        result['interviewer'] = users[result['interviewer_id']]['name']
+        result['completed'] = time.strftime(
+            '%Y-%m-%d', time.gmtime(result['completed_at'] / 1000))
+    return flask.render_template(
+        'search.html',
+        title=APP_NAME,
+        filters=filters,
+        search_url=_search_url,
+        fields=feedback_search.FIELD_LABELS,
+        interview_types=feedback_model.INTERVIEW_TYPES,
+        total=found['total'],
+        indexing=not search_index.caught_up(),
+        results=found['results'],
+        interviewer_facets=[
+            (user_id, users[user_id]['name'], count)
+            for user_id, count in interviewers
+        ],
+        type_facets=found['facets']['interview_types'],
+        year_facets=found['facets']['years'],
+        search_ms=search_ms,
+    )
+
+
+# Each instance rebuilds the org's ratings table from the store at most this
+# often, or on ?refresh=1.
+RATINGS_TABLE_TTL = 60 * 60
+CALIBRATION_MIN_RATINGS = 5
+# Bounds on ?period_days, which sets how many drift rows the page gets.
+CALIBRATION_MIN_PERIOD_DAYS = 7
+CALIBRATION_MAX_PERIOD_DAYS = 5 * 365
+
+ratings_tables = cache.LRUCache(max_size=1, ttl=RATINGS_TABLE_TTL)
+
+
+def _ratings_table(refresh=False):
+    """A RatingsTable of every rated feedback in the store."""
+    # NumPy is only imported by the calibration view, not on every cold start.
+    import ratings
+    table = None if refresh else ratings_tables.get('org')
+    if table is None:
+        with tracing.span('ratings', 'build') as span:
+            table = ratings.from_feedbacks(
+                feedback
+                for _, feedbacks in store.iter_candidates()
+                for feedback in feedbacks
+            )
+            span['rows'] = len(table)
+        ratings_tables.set('org', table)
+    return table
+
+
+@app.route('/calibration')
+@auth.require(auth.ADMIN)
+def calibration():
+    """Interviewer calibration: per-interviewer and per-interview-type score
+    statistics, and how scores drift over time, across the whole store.
+    """
+    import ratings
+    table = _ratings_table(refresh=request.args.get('refresh') == '1')
+    min_ratings = request.args.get('min_ratings', CALIBRATION_MIN_RATINGS, type=int)
+    period_days = request.args.get(
+        'period_days',
+        ratings.DRIFT_PERIOD_MS // ratings.DAY_MS,
+        type=int,
+    )
+    period_days = min(max(period_days, CALIBRATION_MIN_PERIOD_DAYS), CALIBRATION_MAX_PERIOD_DAYS)
+
+    start = time.time()
+    interviewers = table.by_interviewer(min_ratings)
+    interview_types = table.by_interview_type()
+    drift = table.drift(period_days * ratings.DAY_MS)
+    aggregate_ms = (time.time() - start) * 1000
+
+    users = _resolve_users(row['interviewer_id'] for row in interviewers)
+    for row in interviewers:
+        row['interviewer'] = users[row['interviewer_id']]['name']
+    for row in drift:
+        row['period'] = time.strftime('%Y-%m-%d', time.gmtime(row['period_start'] / 1000))
+    report = dict(
+        ratings=len(table),
+        min_ratings=min_ratings,
+        period_days=period_days,
+        scores=table.score_range(),
+        interviewers=interviewers,
+        interview_types=interview_types,
+        drift=drift,
+        aggregate_ms=aggregate_ms,
+    )
+    if request.args.get('format') == 'json':
+        return flask.jsonify(report)
+    return flask.render_template(
+        'calibration.html',
+        title=APP_NAME,
+        **report
+    )
+
+
+@app.route('/debug/stats')
+@auth.require(auth.ADMIN)
+def debug_stats():
+    """Upstream latency percentiles, cache hit ratios and Lever rate limiting.
+
+    `ratelimit:*` spans are the time calls spent queued for a Lever slot.
+    """
+    return flask.jsonify(
+        spans=tracing.STATS.snapshot(),
+        lever_rate_limit=lever.get_transport().governor.stats(),
+        lever_breakers=lever.breaker_stats(),
+        lever_revalidation=lever_client.validated_cache.stats(),
+        startup=import_profile.report(),
+        search_index=search_index.stats(),
+        rendered_fragments=rendered_fragments.stats(),
+        caches=dict(
+            (tiered_cache.namespace, tiered_cache.stats())
+            for tiered_cache in (user_cache, candidate_cache, posting_cache)
+        ),
+    )
+
+
+WARMUP_LEVER_CONNECTIONS = 4
+WARMUP_TEMPLATES = [
+    'base.html',
+    '_packet.html',
+    '_feedback_paragraph.html',
+    '_intern_feedback_paragraph.html',
+    'home.html',
+    'trebuchet.html',
+    'committee.html',
+]
+
+
+@app.route('/_ah/warmup')
+def warmup():
+    """Pay a new instance's start-up costs before it takes real traffic.
+
+    Loads the Lever transport and opens connections to Lever, compiles the
+    packet templates, makes a first memcache call and builds the search
+    index, so a recruiter's first request waits on none of them.
+    """
+    with tracing.span('warmup', 'lever'):
+        try:
+            lever.get_transport().warm(
+                secret.lever_api_path,
+                connections=WARMUP_LEVER_CONNECTIONS,
+            )
+        except Exception:
+            logger.warning('could not connect to lever during warmup', exc_info=True)
+    with tracing.span('warmup', 'templates'):
+        for template_name in WARMUP_TEMPLATES:
+            app.jinja_env.get_template(template_name)
+    with tracing.span('warmup', 'memcache'):
+        feedback_packets.get('warmup')
+    with tracing.span('warmup', 'search'):
+        search_index.catch_up(store, time_budget=WARMUP_SEARCH_BUDGET_SECONDS)
+    return '', 200
+
+
+# Signed events older (or further in the future) than this are refused, so a
+# captured one can't be replayed later.
+WEBHOOK_MAX_AGE_MS = 5 * 60 * 1000
+
+
+def _valid_webhook_signature(payload):
+    """Check Lever's HMAC-SHA256 of `token + triggeredAt`, and that it's recent.
+
+    Without a signature token in secret.py every event is refused: the
+    endpoint is public, and an unchecked one would let anyone queue Lever
+    fetches.
+    """
+    signature_token = getattr(secret, 'lever_webhook_signature_token', None)
+    if signature_token is None:
+        logger.error('refusing lever webhook: lever_webhook_signature_token is not set')
+        return False
+    expected = hmac.new(
+        signature_token,
+        '%s%s' % (payload.get('token', ''), payload.get('triggeredAt', '')),
+        hashlib.sha256,
+    ).hexdigest()
+    if not hmac.compare_digest(expected, str(payload.get('signature', ''))):
+        logger.warning('refusing lever webhook: bad signature')
+        return False
+    try:
+        triggered_at = int(payload['triggeredAt'])
+    except (KeyError, TypeError, ValueError):
+        logger.warning('refusing lever webhook: no triggeredAt')
+        return False
+    if abs(time.time() * 1000 - triggered_at) > WEBHOOK_MAX_AGE_MS:
+        logger.warning('refusing lever webhook: triggered at %s', triggered_at)
+        return False
+    return True
+
+
+@app.route('/webhooks/lever', methods=['POST'])
+def lever_webhook():
+    """Precompute a candidate's packets when Lever reports a change to them."""
+    payload = request.get_json(force=True, silent=True) or {}
+    if not _valid_webhook_signature(payload):
+        flask.abort(403)
+    data = payload.get('data') or {}
+    candidate_id = data.get('candidateId') or data.get('opportunityId')
+    if not candidate_id:
+        return flask.jsonify(queued=False)
+
+    if payload.get('event') == 'candidateDeleted':
+        # Other instances drop the candidate from their search index when
+        # they next catch up with the store.
+        store.delete_candidate(candidate_id)
+        feedback_packets.invalidate(candidate_id)
+        intern_packets.invalidate(candidate_id, variant=_intern_cutoff_ms())
+        search_index.remove_candidate(candidate_id)
+        return flask.jsonify(queued=False)
+    queued = precompute_queue.add(candidate_id, dict(candidate_id=candidate_id))
+    return flask.jsonify(queued=queued)
+
+
+@app.route('/tasks/sync_lever')
+def sync_lever_task():
+    # Run by cron.yaml. App Engine strips this header from external requests.
+    if 'X-Appengine-Cron' not in request.headers:
+        flask.abort(403)
+    with ratelimit.lane(ratelimit.BATCH):
+        result = feedback_store.sync_from_lever(lever_client, store)
+    if result is None:
+        return flask.jsonify(skipped='another sync is running')
+    return flask.jsonify(result)
+
+
+@app.route('/tasks/precompute', methods=['POST'])
+def precompute_task():
+    # App Engine strips this header from external requests, so only the task
+    # queue can reach this handler.
+    if 'X-AppEngine-QueueName' not in request.headers:
+        flask.abort(403)
+    _precompute_packets(request.form['candidate_id'])
+    return '', 204
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     """Return a custom 404 error."""
     return 'Sorry, Nothing at this URL.', 404
 
 
+@app.errorhandler(lever.LeverNotFound)
+def lever_not_found(e):
+    return 'Sorry, Lever has no record of that: {}'.format(e), 404
+
+
+@app.errorhandler(lever.LeverError)
+@app.errorhandler(cache.CachedFailure)
+def lever_unavailable(e):
+    """Lever failed and there was nothing cached to fall back on."""
+    if getattr(e, 'error_type', None) == lever.LeverNotFound.__name__:
+        return lever_not_found(e)
+    return 'Sorry, Lever is unavailable right now, try again shortly: {}'.format(e), 503
+
+
 @app.errorhandler(500)
 def page_error(e):
     """Return a custom 500 error."""
     return 'Sorry, unexpected error: {}'.format(e), 500
 
-app.secret_key = 'Change me.'
+# Signs the session cookie util.auth keeps the signed-in principal in. Without
+# it, the principal is looked up on every request instead.
+app.secret_key = getattr(secret, 'session_secret_key', None)
+auth.configure(auth.Policy(
+    domains=app.config['AUTH_DOMAINS'],
+    session_ttl=app.config['AUTH_SESSION_TTL'],
+))
+
+if import_profile.active():
+    import_profile.log_report()
+    import_profile.uninstall()
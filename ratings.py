@@ -0,0 +1,243 @@
+"""Columnar table of interview ratings, for interviewer calibration.
+
+Every completed packet feedback with a numeric `Rating` becomes one row of a
+`RatingsTable`: parallel NumPy arrays of interviewer, interview type, score
+and completion time. Interviewers and interview types are small integer
+codes, so per-group statistics over the whole org are a handful of
+`numpy.bincount` calls instead of a Python loop over feedback dicts.
+
+Written against numpy 1.6, the version App Engine provides.
+"""
+import numpy
+
+import feedback_model
+
+INTERVIEW_TYPES = feedback_model.INTERVIEW_TYPES
+
+DAY_MS = 24 * 60 * 60 * 1000
+YEAR_MS = 365 * DAY_MS
+# Drift is reported per quarter by default.
+DRIFT_PERIOD_MS = 91 * DAY_MS
+
+
+def _or_none(value):
+    """A float for the report, or None where NumPy produced nan."""
+    return None if numpy.isnan(value) else float(value)
+
+
+def _group_sums(codes, groups, values):
+    """Sum of `values` per group code, for codes 0 to `groups` - 1."""
+    return numpy.bincount(codes, weights=values, minlength=groups)
+
+
+class _Columns(object):
+    """Column lists being filled in row by row, before they become arrays."""
+
+    def __init__(self):
+        self.interviewer_ids = []
+        self._interviewer_codes = {}
+        self.interviewers = []
+        self.interview_types = []
+        self.scores = []
+        self.completed_at = []
+
+    def add(self, interviewer_id, title, score, completed_at):
+        if score is None or completed_at is None:
+            return
+        code = self._interviewer_codes.get(interviewer_id)
+        if code is None:
+            code = self._interviewer_codes[interviewer_id] = len(self.interviewer_ids)
+            self.interviewer_ids.append(interviewer_id)
+        self.interviewers.append(code)
+        self.interview_types.append(feedback_model.interview_type_code(title))
+        self.scores.append(score)
+        self.completed_at.append(completed_at)
+
+    def table(self):
+        return RatingsTable(
+            self.interviewer_ids,
+            numpy.array(self.interviewers, dtype=numpy.int32),
+            numpy.array(self.interview_types, dtype=numpy.int8),
+            numpy.array(self.scores, dtype=numpy.float64),
+            numpy.array(self.completed_at, dtype=numpy.int64),
+        )
+
+
+def from_feedbacks(raw_feedbacks):
+    """Build a table from raw Lever feedback dicts, e.g. out of the store.
+
+    Intern evaluations, unfinished feedback and ratings that don't start
+    with a digit are left out.
+    """
+    columns = _Columns()
+    for raw in raw_feedbacks:
+        if raw['completedAt'] is None:
+            continue
+        model = feedback_model.Feedback(raw)
+        if model.is_intern_evaluation:
+            continue
+        columns.add(
+            model.user,
+            model.text,
+            feedback_model.score_value(model.value(feedback_model.RATING_KEY, u' ')),
+            model.completed_at,
+        )
+    return columns.table()
+
+
+def from_export_records(records):
+    """Build a table from `feedback_model.export_feedback_records` output."""
+    columns = _Columns()
+    for record in records:
+        if record['type'] != 'feedback':
+            continue
+        columns.add(
+            record['interviewer_id'],
+            record['interview'],
+            feedback_model.score_value(record['score']),
+            record['completed_at'],
+        )
+    return columns.table()
+
+
+class RatingsTable(object):
+    """Ratings as parallel arrays, one element per rated feedback.
+
+    `interviewers` holds indexes into `interviewer_ids`, `interview_types`
+    indexes into INTERVIEW_TYPES.
+    """
+
+    def __init__(self, interviewer_ids, interviewers, interview_types, scores, completed_at):
+        self.interviewer_ids = interviewer_ids
+        self.interviewers = interviewers
+        self.interview_types = interview_types
+        self.scores = scores
+        self.completed_at = completed_at
+
+    def __len__(self):
+        return len(self.scores)
+
+    def by_interviewer(self, min_ratings=1):
+        """Per-interviewer calibration rows, most ratings first.
+
+        `offset` is the interviewer's mean minus the org mean and `trend` the
+        least-squares slope of their scores over time, in points per year.
+        Interviewers with fewer than `min_ratings` ratings are left out.
+        """
+        if not len(self):
+            return []
+        groups = len(self.interviewer_ids)
+        codes = self.interviewers
+        # Years since the first rating, so the squares stay well conditioned.
+        years = (self.completed_at - self.completed_at.min()) / float(YEAR_MS)
+        counts = numpy.bincount(codes, minlength=groups).astype(numpy.float64)
+        sums = _group_sums(codes, groups, self.scores)
+        squares = _group_sums(codes, groups, self.scores ** 2)
+        year_sums = _group_sums(codes, groups, years)
+        year_squares = _group_sums(codes, groups, years ** 2)
+        cross = _group_sums(codes, groups, years * self.scores)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            means = sums / counts
+            variances = numpy.maximum(squares / counts - means ** 2, 0)
+            year_means = year_sums / counts
+            year_variances = year_squares / counts - year_means ** 2
+            trends = (cross / counts - year_means * means) / year_variances
+        # One rating, or all on the same day, says nothing about a trend.
+        trends[year_variances <= 1e-12] = numpy.nan
+
+        offsets = means - self.scores.mean()
+        order = numpy.argsort(-counts, kind='mergesort')
+        return [
+            dict(
+                interviewer_id=self.interviewer_ids[code],
+                ratings=int(counts[code]),
+                mean=float(means[code]),
+                std=float(numpy.sqrt(variances[code])),
+                offset=float(offsets[code]),
+                trend=_or_none(trends[code]),
+            )
+            for code in order
+            if counts[code] >= min_ratings
+        ]
+
+    def score_range(self):
+        """The whole-number scores from the lowest to the highest given."""
+        if not len(self):
+            return []
+        return range(int(self.scores.min()), int(self.scores.max()) + 1)
+
+    def by_interview_type(self):
+        """Per interview type: count, mean and the count of each score.
+
+        `distribution` lines up with `score_range()`.
+        """
+        scores = self.score_range()
+        if not scores:
+            return []
+        groups = len(INTERVIEW_TYPES)
+        codes = self.interview_types.astype(numpy.int32)
+        cells = numpy.bincount(
+            codes * len(scores) + (self.scores.astype(numpy.int32) - scores[0]),
+            minlength=groups * len(scores),
+        ).reshape(groups, len(scores))
+        counts = cells.sum(axis=1)
+        sums = _group_sums(codes, groups, self.scores)
+        return [
+            dict(
+                interview_type=INTERVIEW_TYPES[code],
+                ratings=int(counts[code]),
+                mean=float(sums[code] / counts[code]),
+                distribution=cells[code].tolist(),
+            )
+            for code in range(groups)
+            if counts[code]
+        ]
+
+    def drift(self, period_ms=DRIFT_PERIOD_MS):
+        """Org-wide count, mean and spread of scores per `period_ms`, oldest first.
+
+        `interviewer_spread` is the standard deviation of the interviewers'
+        means within the period: it grows as interviewers drift apart.
+        """
+        if not len(self):
+            return []
+        periods = self.completed_at // period_ms
+        first = periods.min()
+        index = (periods - first).astype(numpy.int32)
+        groups = int(index.max()) + 1
+        counts = numpy.bincount(index, minlength=groups).astype(numpy.float64)
+        sums = _group_sums(index, groups, self.scores)
+        squares = _group_sums(index, groups, self.scores ** 2)
+
+        # Means per (period, interviewer) cell, then their spread per period.
+        # Only cells with ratings get a slot: short periods over years of
+        # ratings would make a dense periods x interviewers grid huge.
+        interviewers = len(self.interviewer_ids)
+        cell = index.astype(numpy.int64) * interviewers + self.interviewers
+        cells, cell_codes = numpy.unique(cell, return_inverse=True)
+        cell_counts = numpy.bincount(cell_codes, minlength=len(cells))
+        cell_sums = _group_sums(cell_codes, len(cells), self.scores)
+        cell_means = cell_sums / cell_counts
+        cell_periods = cells // interviewers
+        interviewer_counts = numpy.bincount(cell_periods, minlength=groups).astype(numpy.float64)
+        mean_sums = _group_sums(cell_periods, groups, cell_means)
+        mean_squares = _group_sums(cell_periods, groups, cell_means ** 2)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            means = sums / counts
+            stds = numpy.sqrt(numpy.maximum(squares / counts - means ** 2, 0))
+            interviewer_means = mean_sums / interviewer_counts
+            spreads = numpy.sqrt(numpy.maximum(
+                mean_squares / interviewer_counts - interviewer_means ** 2, 0))
+        return [
+            dict(
+                period_start=int((first + period) * period_ms),
+                ratings=int(counts[period]),
+                interviewers=int(interviewer_counts[period]),
+                mean=float(means[period]),
+                std=float(stds[period]),
+                interviewer_spread=float(spreads[period]),
+            )
+            for period in range(groups)
+            if counts[period]
+        ]
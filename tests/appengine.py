@@ -0,0 +1,81 @@
+"""Base classes for tests that use App Engine APIs or the app itself."""
+import unittest
+
+from tools import gae_env
+
+
+class AppEngineTestCase(unittest.TestCase):
+    """Runs each test against fresh API stubs, signed in as an admin."""
+
+    def setUp(self):
+        self.testbed = gae_env.activate()
+        self.addCleanup(self.testbed.deactivate)
+
+    def patch(self, obj, name, value):
+        """Set `obj.name` to `value` until the test ends."""
+        if hasattr(obj, name):
+            self.addCleanup(setattr, obj, name, getattr(obj, name))
+        else:
+            self.addCleanup(delattr, obj, name)
+        setattr(obj, name, value)
+
+
+class FakeLever(object):
+    """Canned Lever records in place of a LeverClient.
+
+    Records are dicts keyed by ID. While `down`, every call raises
+    LeverUnavailable. `calls` lists (method, ID) for each call made.
+    """
+
+    def __init__(self):
+        self.candidates = {}
+        self.feedbacks = {}
+        self.users = {}
+        self.postings = {}
+        self.down = False
+        self.calls = []
+
+    def _get(self, method, records, record_id):
+        import lever
+        self.calls.append((method, record_id))
+        if self.down:
+            raise lever.LeverUnavailable('lever is down')
+        if record_id not in records:
+            raise lever.LeverNotFound(record_id)
+        return records[record_id]
+
+    def get_candidate(self, candidate_id):
+        return self._get('get_candidate', self.candidates, candidate_id)
+
+    def get_candidate_feedback(self, candidate_id):
+        return list(self._get('get_candidate_feedback', self.feedbacks, candidate_id))
+
+    def get_user(self, user_id):
+        return self._get('get_user', self.users, user_id)
+
+    def get_posting(self, posting_id):
+        return dict(data=self._get('get_posting', self.postings, posting_id))
+
+
+class AppTestCase(AppEngineTestCase):
+    """Tests against `main.app`, with Lever replaced by `self.lever`.
+
+    Each test gets an empty in-memory feedback store and empty caches.
+    """
+
+    def setUp(self):
+        super(AppTestCase, self).setUp()
+        gae_env.use_lever('http://localhost:1')
+        import feedback_store
+        import main
+        self.main = main
+        self.lever = FakeLever()
+        self.store = feedback_store.MemoryFeedbackStore()
+        self.patch(main, 'lever_client', self.lever)
+        self.patch(main, 'store', self.store)
+        self.patch(main.candidate_cache, 'loader', self.lever.get_candidate)
+        for tiered in [main.user_cache, main.candidate_cache, main.posting_cache]:
+            tiered.local.clear()
+        main.rendered_pages.clear()
+        main.rendered_fragments.clear()
+        self.client = main.app.test_client()
@@ -0,0 +1,76 @@
+import os
+
+from tests.appengine import AppEngineTestCase
+
+
+class AuthTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(AuthTest, self).setUp()
+        import flask
+        from util import auth
+        self.auth = auth
+        self.addCleanup(auth.configure, auth.policy)
+        auth.configure(auth.Policy(domains=['yelp.com'], session_ttl=60))
+
+        app = flask.Flask(__name__)
+        app.secret_key = 'test'
+
+        @app.route('/company')
+        @auth.require(auth.COMPANY)
+        def company():
+            return auth.current_principal().role
+
+        @app.route('/admin')
+        @auth.require(auth.ADMIN)
+        def admin():
+            return auth.current_principal().role
+
+        self.client = app.test_client()
+
+    def _sign_in(self, email, admin=False):
+        os.environ['USER_EMAIL'] = email
+        os.environ['USER_IS_ADMIN'] = '1' if admin else '0'
+
+    def test_roles(self):
+        policy = self.auth.policy
+        self.assertEqual(policy.role('ada@yelp.com', True), self.auth.ADMIN)
+        self.assertEqual(policy.role('ada@Yelp.com', False), self.auth.COMPANY)
+        self.assertEqual(policy.role('ada@example.com', True), self.auth.USER)
+
+    def test_signed_out_users_are_sent_to_sign_in(self):
+        self._sign_in('')
+        response = self.client.get('/company')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response.headers['Location'])
+
+    def test_role_is_enforced(self):
+        self._sign_in('ada@yelp.com')
+        self.assertEqual(self.client.get('/company').data, 'company')
+        response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('ada@yelp.com', response.data)
+        self.assertIn('Sign in as someone else', response.data)
+
+    def test_admin(self):
+        self._sign_in('ada@yelp.com', admin=True)
+        self.assertEqual(self.client.get('/admin').data, 'admin')
+
+    def test_session_keeps_the_role(self):
+        self._sign_in('ada@yelp.com', admin=True)
+        self.client.get('/admin')
+        # The role comes from the session cookie, not another lookup.
+        os.environ['USER_IS_ADMIN'] = '0'
+        self.assertEqual(self.client.get('/admin').data, 'admin')
+
+    def test_session_is_ignored_for_another_user(self):
+        self._sign_in('ada@yelp.com', admin=True)
+        self.client.get('/admin')
+        self._sign_in('grace@yelp.com')
+        self.assertEqual(self.client.get('/admin').status_code, 403)
+
+    def test_session_is_ignored_after_signing_out(self):
+        self._sign_in('ada@yelp.com', admin=True)
+        self.client.get('/admin')
+        self._sign_in('')
+        self.assertEqual(self.client.get('/admin').status_code, 302)
@@ -0,0 +1,122 @@
+import threading
+import time
+
+from tests.appengine import AppEngineTestCase
+
+
+class TieredCacheTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(TieredCacheTest, self).setUp()
+        from google.appengine.api import memcache
+        from util import cache
+        self.memcache = memcache
+        self.cache = cache
+        self.calls = []
+
+    def _tiered(self, loader=None, **kwargs):
+        def record(key):
+            self.calls.append(key)
+            return 'value-' + key
+        return self.cache.TieredCache('test', loader or record, **kwargs)
+
+    def test_get_loads_once_then_hits_locally(self):
+        tiered = self._tiered()
+        self.assertEqual(tiered.get('a'), 'value-a')
+        self.assertEqual(tiered.get('a'), 'value-a')
+        self.assertEqual(self.calls, ['a'])
+        self.assertEqual(self.memcache.get('test:a'), 'value-a')
+
+    def test_get_reads_memcache_before_loading(self):
+        self.memcache.set('test:a', 'from memcache')
+        tiered = self._tiered()
+        self.assertEqual(tiered.get('a'), 'from memcache')
+        self.assertEqual(self.calls, [])
+        self.assertEqual(tiered.memcache_hits, 1)
+
+    def test_concurrent_misses_are_coalesced(self):
+        release = threading.Event()
+
+        def slow_loader(key):
+            self.calls.append(key)
+            release.wait(5)
+            return 'value-' + key
+
+        tiered = self._tiered(slow_loader)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(tiered.get('a')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        while tiered.coalesced < 4 and all(thread.is_alive() for thread in threads):
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.calls, ['a'])
+        self.assertEqual(results, ['value-a'] * 5)
+        self.assertEqual(tiered.coalesced, 4)
+
+    def test_get_multi_loads_only_misses(self):
+        self.memcache.set('test:b', 'from memcache')
+        tiered = self._tiered()
+        tiered.get('a')
+        del self.calls[:]
+
+        found = tiered.get_multi(['a', 'b', 'c'])
+
+        self.assertEqual(found, {'a': 'value-a', 'b': 'from memcache', 'c': 'value-c'})
+        self.assertEqual(self.calls, ['c'])
+        self.assertEqual(self.memcache.get('test:c'), 'value-c')
+
+
+class TieredCacheFailureTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(TieredCacheFailureTest, self).setUp()
+        from google.appengine.api import memcache
+        from util import cache
+        self.memcache = memcache
+        self.cache = cache
+        self.fail = False
+        self.calls = []
+
+        def loader(key):
+            self.calls.append(key)
+            if self.fail:
+                raise IOError('lever is down')
+            return 'value-' + key
+
+        self.tiered = cache.TieredCache('test', loader, negative_ttl=30)
+
+    def test_failure_is_cached(self):
+        self.fail = True
+        with self.assertRaises(IOError):
+            self.tiered.get('a')
+        with self.assertRaises(self.cache.CachedFailure) as raised:
+            self.tiered.get('a')
+        self.assertEqual(raised.exception.error_type, 'IOError')
+        self.assertEqual(self.calls, ['a'])
+        self.assertIsInstance(self.memcache.get('test:a'), self.cache.NegativeEntry)
+
+    def test_get_multi_leaves_out_failures(self):
+        self.fail = True
+        self.assertEqual(self.tiered.get_multi(['a']), {})
+        self.assertEqual(self.tiered.get_multi(['a']), {})
+        self.assertEqual(self.calls, ['a'])
+
+    def test_stale_value_is_served_but_not_republished(self):
+        self.tiered.get_multi(['a'])
+        self.tiered.local.set('a', 'value-a', ttl=-1)
+        self.memcache.delete('test:a')
+        self.fail = True
+
+        self.assertEqual(self.tiered.get_multi(['a']), {'a': 'value-a'})
+        self.assertEqual(self.tiered.stale_served, 1)
+        self.assertIsNone(self.memcache.get('test:a'))
+        # Kept locally for the negative TTL rather than reloaded every time.
+        self.assertEqual(self.tiered.get('a'), 'value-a')
+        self.assertEqual(self.calls, ['a', 'a'])
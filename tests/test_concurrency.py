@@ -0,0 +1,49 @@
+import itertools
+import time
+import unittest
+
+from util import concurrency
+
+
+class ImapTest(unittest.TestCase):
+
+    def test_yields_in_input_order(self):
+        # Earlier items take longest, so they finish last.
+        delays = [0.05, 0.04, 0.03, 0.02, 0.01, 0]
+        results = list(concurrency.imap(
+            lambda delay: time.sleep(delay) or delay,
+            delays,
+            max_workers=6,
+        ))
+        self.assertEqual(results, [(delay, delay, None) for delay in delays])
+
+    def test_errors_are_yielded_in_place(self):
+        def invert(number):
+            return 1.0 / number
+
+        results = list(concurrency.imap(invert, [1, 0, 2], max_workers=2))
+        self.assertEqual([item for item, _, _ in results], [1, 0, 2])
+        self.assertEqual(results[0][1:], (1.0, None))
+        self.assertIsNone(results[1][1])
+        self.assertIsInstance(results[1][2], ZeroDivisionError)
+        self.assertEqual(results[2][1:], (0.5, None))
+
+    def test_reads_items_lazily(self):
+        consumed = []
+
+        def items():
+            for number in itertools.count():
+                consumed.append(number)
+                yield number
+
+        results = concurrency.imap(lambda number: number, items(), max_workers=2, window=3)
+        self.assertEqual([next(results) for _ in range(5)], [(n, n, None) for n in range(5)])
+        # Only the window beyond what was yielded has been read.
+        self.assertLessEqual(len(consumed), 5 + 3)
+
+
+class ImapUnorderedTest(unittest.TestCase):
+
+    def test_yields_every_item(self):
+        results = list(concurrency.imap_unordered(lambda number: number * 2, range(10)))
+        self.assertEqual(sorted(results), [(n, n * 2, None) for n in range(10)])
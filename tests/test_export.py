@@ -0,0 +1,90 @@
+import json
+
+from tests.appengine import AppEngineTestCase
+from tests.appengine import AppTestCase
+from tools import gae_env
+
+
+class ExportTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        gae_env.use_lever('http://localhost:1')
+        import main
+        self.main = main
+        self.failing = set()
+        self._patch(main, '_export_candidate', self._export_candidate)
+
+    def _patch(self, obj, name, value):
+        self.addCleanup(setattr, obj, name, getattr(obj, name))
+        setattr(obj, name, value)
+
+    def _export_candidate(self, candidate_id, keep_feedback, build_records):
+        if candidate_id in self.failing:
+            raise IOError('lever is down')
+        return [dict(type='feedback', candidate_id=candidate_id)]
+
+    def _export(self, candidate_ids, after=None):
+        return [
+            json.loads(line)
+            for text in self.main._export_stream(candidate_ids, 'feedback', 'jsonl', after=after)
+            for line in text.splitlines()
+        ]
+
+    def test_each_candidate_is_followed_by_a_checkpoint(self):
+        self.assertEqual(self._export(['a', 'b']), [
+            dict(type='feedback', candidate_id='a'),
+            dict(type='checkpoint', after='a'),
+            dict(type='feedback', candidate_id='b'),
+            dict(type='checkpoint', after='b'),
+        ])
+
+    def test_resumes_after_a_checkpoint(self):
+        records = self._export(['a', 'b', 'c', 'd'], after='b')
+        self.assertEqual(
+            [record['candidate_id'] for record in records if record['type'] == 'feedback'],
+            ['c', 'd'],
+        )
+
+    def test_unknown_resume_point(self):
+        with self.assertRaises(ValueError):
+            self._export(['a', 'b'], after='z')
+
+    def test_failed_candidate_gets_an_error_record(self):
+        self.failing.add('b')
+        records = self._export(['a', 'b', 'c'])
+        self.assertEqual(
+            [(record['type'], record.get('candidate_id') or record.get('after')) for record in records],
+            [
+                ('feedback', 'a'), ('checkpoint', 'a'),
+                ('error', 'b'), ('checkpoint', 'b'),
+                ('feedback', 'c'), ('checkpoint', 'c'),
+            ],
+        )
+
+    def test_endpoint_refuses_unknown_resume_point(self):
+        response = self.main.app.test_client().get('/export?candidate_ids=a,b&after=z')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportCandidateTest(AppTestCase):
+
+    def test_records_name_the_interviewer(self):
+        self.lever.candidates['c1'] = dict(id='c1', name=u'Sam Lee')
+        self.lever.feedbacks['c1'] = [dict(
+            id='f1',
+            type='interview',
+            text=u'Engineering - System Design',
+            user='ada',
+            createdAt=0,
+            completedAt=1,
+            updatedAt=1,
+            fields=[dict(text=u'Rating', value=u'3 - Hire')],
+        )]
+        self.lever.users['ada'] = dict(id='ada', name=u'Ada Lovelace')
+        keep_feedback, build_records = self.main._export_kind('feedback')
+        records = self.main._export_candidate('c1', keep_feedback, build_records)
+        self.assertEqual(
+            [(record['feedback_id'], record['interviewer']) for record in records],
+            [('f1', u'Ada Lovelace')],
+        )
@@ -0,0 +1,146 @@
+from feedback_model import TEAM_FEEDBACK_KEY
+from tests.appengine import AppEngineTestCase
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _feedback(feedback_id, notes, user='ada', title=u'Engineering - System Design',
+              team=u'', completed_at=100 * DAY_MS):
+    return dict(
+        id=feedback_id,
+        type='interview',
+        text=title,
+        user=user,
+        completedAt=completed_at,
+        updatedAt=completed_at,
+        fields=[
+            dict(text=u'Interview notes', value=notes),
+            dict(text=u'Rating', value=u'3 - Hire'),
+            dict(text=TEAM_FEEDBACK_KEY, value=team),
+        ],
+    )
+
+
+def _candidate(candidate_id):
+    return dict(id=candidate_id, name=u'Candidate %s' % candidate_id)
+
+
+class FeedbackIndexTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(FeedbackIndexTest, self).setUp()
+        import feedback_search
+        self.feedback_search = feedback_search
+        self.index = feedback_search.FeedbackIndex()
+
+    def _ids(self, query, **filters):
+        return [result['feedback_id'] for result in self.index.search(query, **filters)['results']]
+
+    def test_tokenize(self):
+        self.assertEqual(
+            self.feedback_search.tokenize(u'The C++ cache, and its Latency'),
+            [u'c++', u'cache', u'latency'],
+        )
+
+    def test_every_term_must_match(self):
+        self.index.add_candidate(_candidate('c1'), [
+            _feedback('f1', u'Designed a cache with low latency.'),
+            _feedback('f2', u'Designed a cache.'),
+        ])
+        self.assertEqual(self._ids(u'cache latency'), ['f1'])
+        self.assertEqual(sorted(self._ids(u'cache')), ['f1', 'f2'])
+        self.assertEqual(self._ids(u'sharding'), [])
+
+    def test_ranks_by_bm25(self):
+        self.index.add_candidate(_candidate('c1'), [
+            _feedback('once', u'Cache design, queue design, api design, graph design.'),
+            _feedback('often', u'Cache design, cache eviction, cache sizing, cache misses.'),
+        ])
+        results = self.index.search(u'cache')['results']
+        self.assertEqual([result['feedback_id'] for result in results], ['often', 'once'])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+    def test_filters_and_facets(self):
+        self.index.add_candidate(_candidate('c1'), [
+            _feedback('f1', u'Strong debugging.', user='ada'),
+            _feedback('f2', u'Weak debugging.', user='grace',
+                      title=u'Engineering - Problem Solving', completed_at=200 * DAY_MS),
+            _feedback('f3', u'Solid api.', team=u'Great debugging on the team.', user='ada'),
+        ])
+        self.assertEqual(sorted(self._ids(u'debugging', interviewer_id='ada')), ['f1', 'f3'])
+        self.assertEqual(self._ids(u'debugging', field='team'), ['f3'])
+        self.assertEqual(self._ids(u'debugging', since=150 * DAY_MS), ['f2'])
+        problem_solving = self.feedback_search.feedback_model.INTERVIEW_TYPES.index('problem solving')
+        self.assertEqual(self._ids(u'debugging', interview_type=problem_solving), ['f2'])
+
+        facets = self.index.search(u'debugging')['facets']
+        self.assertEqual(facets['interviewers'][0], ('ada', 2))
+
+    def test_no_terms_lists_newest_first(self):
+        self.index.add_candidate(_candidate('c1'), [
+            _feedback('old', u'Fine.', completed_at=1 * DAY_MS),
+            _feedback('new', u'Fine.', completed_at=2 * DAY_MS),
+        ])
+        self.assertEqual(self._ids(u'', interviewer_id='ada'), ['new', 'old'])
+
+    def test_readding_a_candidate_replaces_it(self):
+        self.index.add_candidate(_candidate('c1'), [_feedback('f1', u'Talked about caches.')])
+        self.index.add_candidate(_candidate('c1'), [_feedback('f1', u'Talked about queues.')])
+        self.assertEqual(self._ids(u'caches'), [])
+        self.assertEqual(self._ids(u'queues'), ['f1'])
+        self.assertEqual(self.index.search(u'queues')['total'], 1)
+
+    def test_remove_candidate(self):
+        self.index.add_candidate(_candidate('c1'), [_feedback('f1', u'Talked about caches.')])
+        self.index.add_candidate(_candidate('c2'), [_feedback('f2', u'Talked about caches.')])
+        self.index.remove_candidate('c1')
+        self.assertEqual(self._ids(u'caches'), ['f2'])
+
+
+class CatchUpTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(CatchUpTest, self).setUp()
+        import feedback_search
+        import feedback_store
+        self.index = feedback_search.FeedbackIndex()
+        self.store = feedback_store.MemoryFeedbackStore()
+        for number in range(5):
+            candidate_id = 'c%d' % number
+            self.store.put_candidate(
+                _candidate(candidate_id),
+                [_feedback('f%d' % number, u'Talked about caches.')],
+            )
+
+    def _total(self, query=u'caches'):
+        return self.index.search(query)['total']
+
+    def test_catch_up_indexes_the_store(self):
+        self.index.catch_up(self.store)
+        self.assertTrue(self.index.caught_up())
+        self.assertEqual(self._total(), 5)
+
+    def test_time_budget_spreads_catch_up_over_calls(self):
+        self.index.catch_up(self.store, time_budget=0)
+        self.assertFalse(self.index.caught_up())
+        self.assertEqual(self._total(), 1)
+        for _ in range(10):
+            if self.index.caught_up():
+                break
+            self.index.catch_up(self.store, time_budget=0)
+        self.assertTrue(self.index.caught_up())
+        self.assertEqual(self._total(), 5)
+
+    def test_follows_updates_and_deletions(self):
+        self.index.catch_up(self.store)
+        self.store.put_candidate(_candidate('c0'), [_feedback('f0', u'Talked about queues.')])
+        self.store.delete_candidate('c1')
+        self.index.catch_up(self.store)
+        self.assertEqual(self._total(), 3)
+        self.assertEqual(self._total(u'queues'), 1)
+
+    def test_max_age_skips_recent_catch_up(self):
+        self.index.catch_up(self.store)
+        self.store.delete_candidate('c1')
+        self.index.catch_up(self.store, max_age=60)
+        self.assertEqual(self._total(), 5)
@@ -0,0 +1,124 @@
+from tests.appengine import AppEngineTestCase
+
+
+class StubLever(object):
+    """Lever client serving `pages` of changed candidates, one per offset."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.failing = set()
+        self.walks = []
+        self.feedback_calls = []
+
+    def iter_candidate_pages_updated_since(self, updated_at_start, offset=None):
+        self.walks.append((updated_at_start, offset))
+        while True:
+            candidates, next_offset = self.pages[offset]
+            yield candidates, next_offset
+            if next_offset is None:
+                return
+            offset = next_offset
+
+    def get_candidate(self, candidate_id):
+        return dict(id=candidate_id)
+
+    def get_candidate_feedback(self, candidate_id):
+        self.feedback_calls.append(candidate_id)
+        if candidate_id in self.failing:
+            raise IOError('lever is down')
+        return [dict(id='%s-feedback' % candidate_id, user='interviewer')]
+
+    def get_user(self, user_id):
+        return dict(id=user_id, name='Interviewer')
+
+
+class SyncFromLeverTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(SyncFromLeverTest, self).setUp()
+        import feedback_store
+        self.feedback_store = feedback_store
+        self.store = feedback_store.MemoryFeedbackStore()
+        self.client = StubLever({
+            None: ([dict(id='a'), dict(id='b')], 'page-2'),
+            'page-2': ([dict(id='c')], 'page-3'),
+            'page-3': ([dict(id='d')], None),
+        })
+
+    def _sync(self, time_budget=None):
+        return self.feedback_store.sync_from_lever(self.client, self.store, time_budget=time_budget)
+
+    def _stored_ids(self):
+        return [
+            candidate_id for candidate_id in ['a', 'b', 'c', 'd']
+            if self.store.get_candidate(candidate_id) is not None
+        ]
+
+    def test_syncs_every_page(self):
+        self.assertEqual(self._sync(), dict(synced=4, failed=0, complete=True))
+        self.assertEqual(self._stored_ids(), ['a', 'b', 'c', 'd'])
+        self.assertEqual(self.store.get_users(['interviewer']).keys(), ['interviewer'])
+        state = self.store.sync_state()
+        self.assertIsNotNone(state['high_water_mark'])
+        self.assertIsNone(state['walk_started'])
+        self.assertIsNone(state['cursor'])
+
+    def test_interrupted_walk_resumes_where_it_stopped(self):
+        self.assertEqual(self._sync(time_budget=0), dict(synced=2, failed=0, complete=False))
+        self.assertEqual(self._stored_ids(), ['a', 'b'])
+        state = self.store.sync_state()
+        self.assertEqual(state['cursor'], 'page-2')
+        self.assertIsNone(state['high_water_mark'])
+        walk_started = state['walk_started']
+
+        self.assertEqual(self._sync(time_budget=0), dict(synced=1, failed=0, complete=False))
+        self.assertEqual(self._sync(time_budget=0), dict(synced=1, failed=0, complete=True))
+        self.assertEqual(self.client.walks, [(None, None), (None, 'page-2'), (None, 'page-3')])
+        self.assertEqual(self.client.feedback_calls, ['a', 'b', 'c', 'd'])
+        self.assertEqual(self._stored_ids(), ['a', 'b', 'c', 'd'])
+        # The mark is taken from when the walk began, not when it finished.
+        self.assertEqual(
+            self.store.sync_state()['high_water_mark'],
+            walk_started - self.feedback_store.SYNC_OVERLAP_MS,
+        )
+
+    def test_next_walk_starts_from_the_high_water_mark(self):
+        self._sync()
+        mark = self.store.sync_state()['high_water_mark']
+        self._sync()
+        self.assertEqual(self.client.walks, [(None, None), (mark, None)])
+
+    def test_second_run_is_blocked_by_the_lease(self):
+        self.assertTrue(self.store.acquire_sync_lease(self.feedback_store.SYNC_LEASE_SECONDS))
+        self.assertIsNone(self._sync())
+        self.assertEqual(self.client.walks, [])
+        self.assertEqual(self._stored_ids(), [])
+
+        self.store.release_sync_lease()
+        self.assertEqual(self._sync()['synced'], 4)
+
+    def test_lease_is_released_when_a_run_fails(self):
+        self.client.pages = {}
+        with self.assertRaises(KeyError):
+            self._sync()
+        self.assertTrue(self.store.acquire_sync_lease(self.feedback_store.SYNC_LEASE_SECONDS))
+
+    def test_failed_candidates_are_retried_on_the_next_run(self):
+        self.client.failing = set(['b'])
+        self.assertEqual(self._sync(), dict(synced=3, failed=1, complete=True))
+        self.assertEqual(self._stored_ids(), ['a', 'c', 'd'])
+        self.assertEqual(self.store.sync_state()['failed_ids'], ['b'])
+
+        self.client.failing = set()
+        self.client.pages = {None: ([], None)}
+        self.assertEqual(self._sync(), dict(synced=1, failed=0, complete=True))
+        self.assertEqual(self._stored_ids(), ['a', 'b', 'c', 'd'])
+        self.assertEqual(self.store.sync_state()['failed_ids'], [])
+
+    def test_failed_retry_is_given_up(self):
+        self.client.failing = set(['b'])
+        self._sync()
+        self.client.pages = {None: ([], None)}
+        self.assertEqual(self._sync(), dict(synced=0, failed=0, complete=True))
+        self.assertEqual(self.store.sync_state()['failed_ids'], [])
+        self.assertEqual(self._stored_ids(), ['a', 'c', 'd'])
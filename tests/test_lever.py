@@ -0,0 +1,113 @@
+import json
+
+from tests.appengine import AppEngineTestCase
+from tools import gae_env
+
+
+class FakeResponse(object):
+
+    def __init__(self, status, data='', headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+
+class FakeTransport(object):
+    """Answers requests from `responses`, a list of FakeResponses or exceptions."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def request(self, method, url, fields=None, body=None, headers=None, retry=None):
+        self.requests.append(dict(method=method, url=url, fields=fields, headers=headers))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class LeverTestCase(AppEngineTestCase):
+    """Tests of a LeverClient whose requests go to `self.transport`."""
+
+    def setUp(self):
+        super(LeverTestCase, self).setUp()
+        gae_env.use_lever('http://lever', 'key')
+        import lever
+        self.lever = lever
+        self.transport = FakeTransport()
+        self.patch(lever, '_transport', self.transport)
+        self.patch(lever, '_breakers', {})
+        self.client = lever.LeverClient()
+
+    def _respond(self, status, data=None, headers=None):
+        self.transport.responses.append(FakeResponse(
+            status,
+            json.dumps(data) if data is not None else '',
+            headers,
+        ))
+
+
+class LeverClientTest(LeverTestCase):
+
+    def test_get_posting(self):
+        self._respond(200, dict(data=dict(id='p1')))
+        self.assertEqual(self.client.get_posting('p1'), dict(data=dict(id='p1')))
+        self.assertEqual(self.transport.requests[0]['url'], 'http://lever/postings/p1')
+
+    def test_error_statuses_raise(self):
+        for status, error in [
+            (404, self.lever.LeverNotFound),
+            (429, self.lever.LeverUnavailable),
+            (503, self.lever.LeverUnavailable),
+            (403, self.lever.LeverError),
+        ]:
+            self._respond(status)
+            with self.assertRaises(error):
+                self.client.get_posting('p1')
+
+    def test_connection_failure_raises_lever_unavailable(self):
+        import urllib3
+        self.transport.responses.append(urllib3.exceptions.ProtocolError('reset'))
+        with self.assertRaises(self.lever.LeverUnavailable):
+            self.client.get_candidate('c1')
+
+    def test_post_raises_on_error(self):
+        self._respond(400)
+        with self.assertRaises(self.lever.LeverError):
+            self.client._post_to_lever('/candidates', 'u1', dict(name='Sam'))
+
+
+class RevalidationTest(LeverTestCase):
+
+    def setUp(self):
+        super(RevalidationTest, self).setUp()
+        from util import http_cache
+        self.client = self.lever.LeverClient(
+            validated_cache=http_cache.ValidatedCache('test-validated'))
+
+    def test_single_record_is_revalidated(self):
+        self._respond(200, dict(data=dict(id='c1')), {'ETag': '"v1"'})
+        self._respond(304)
+        self.assertEqual(self.client.get_candidate('c1'), dict(id='c1'))
+        self.assertEqual(self.client.get_candidate('c1'), dict(id='c1'))
+        self.assertEqual(self.transport.requests[1]['headers']['If-None-Match'], '"v1"')
+
+    def test_first_page_is_revalidated(self):
+        page = dict(data=[dict(id='f1')], hasNext=False)
+        self._respond(200, page, {'ETag': '"v1"'})
+        self._respond(304)
+        self.assertEqual(self.client.get_candidate_feedback('c1'), [dict(id='f1')])
+        self.assertEqual(self.client.get_candidate_feedback('c1'), [dict(id='f1')])
+        self.assertEqual(self.transport.requests[1]['headers']['If-None-Match'], '"v1"')
+
+    def test_later_pages_are_not_revalidated(self):
+        self._respond(200, dict(data=[dict(id='f1')], hasNext=True, next='o2'), {'ETag': '"v1"'})
+        self._respond(200, dict(data=[dict(id='f2')], hasNext=False), {'ETag': '"v2"'})
+        self.assertEqual(
+            list(self.client.iter_candidate_feedback('c1')),
+            [dict(id='f1'), dict(id='f2')],
+        )
+        self.assertEqual(self.transport.requests[1]['fields']['offset'], 'o2')
+        self.assertIsNone(self.client._validated_key(
+            '/candidates/c1/feedback', self.transport.requests[1]['fields']))
@@ -0,0 +1,102 @@
+import time
+
+from tests.appengine import AppEngineTestCase
+from tests.appengine import AppTestCase
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _feedback(feedback_id, updated_at=1, notes=u'Solid design.'):
+    return dict(
+        id=feedback_id,
+        type='interview',
+        text=u'Engineering - System Design',
+        user='ada',
+        createdAt=0,
+        completedAt=1,
+        updatedAt=updated_at,
+        fields=[
+            dict(text=u'Interview notes', value=notes),
+            dict(text=u'Rating', value=u'3 - Hire'),
+        ],
+    )
+
+
+class PacketCacheTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(PacketCacheTest, self).setUp()
+        from util import packet_cache
+        self.packet_cache = packet_cache
+        self.packets = packet_cache.PacketCache('test')
+
+    def test_feedback_revision(self):
+        revision = self.packet_cache.feedback_revision
+        first, second = _feedback('f1'), _feedback('f2')
+        self.assertEqual(revision([first, second]), revision([second, first]))
+        self.assertNotEqual(revision([first]), revision([first, second]))
+        self.assertNotEqual(revision([first]), revision([_feedback('f1', updated_at=2)]))
+
+    def test_set_and_get(self):
+        self.assertIsNone(self.packets.get('c1'))
+        self.packets.set('c1', 'r1', 'packet', stamp=5)
+        entry = self.packets.get('c1')
+        self.assertEqual((entry['revision'], entry['stamp'], entry['packet']), ('r1', 5, 'packet'))
+        self.packets.invalidate('c1')
+        self.assertIsNone(self.packets.get('c1'))
+
+    def test_variants_are_kept_apart(self):
+        self.packets.set('c1', 'r1', 'plain')
+        self.packets.set('c1', 'r2', 'cutoff 10', variant=10)
+        self.assertEqual(self.packets.get('c1')['packet'], 'plain')
+        self.assertEqual(self.packets.get('c1', variant=10)['packet'], 'cutoff 10')
+        self.assertIsNone(self.packets.get('c1', variant=20))
+        self.packets.invalidate('c1', variant=10)
+        self.assertIsNone(self.packets.get('c1', variant=10))
+        self.assertEqual(self.packets.get('c1')['packet'], 'plain')
+
+    def test_stamp_trust(self):
+        entry = self.packets.set('c1', 'r1', 'packet', stamp=5)
+        self.assertTrue(self.packet_cache.stamp_trusted(entry, 5))
+        self.assertFalse(self.packet_cache.stamp_trusted(entry, 6))
+        entry['checked_at'] = time.time() - self.packet_cache.STAMP_TRUST_SECONDS
+        self.assertFalse(self.packet_cache.stamp_trusted(entry, 5))
+
+    def test_missing_stamp_is_never_trusted(self):
+        entry = self.packets.set('c1', 'r1', 'packet')
+        self.assertFalse(self.packet_cache.stamp_trusted(entry, None))
+
+
+class CachedPacketTest(AppTestCase):
+
+    def setUp(self):
+        super(CachedPacketTest, self).setUp()
+        self.lever.users['ada'] = dict(id='ada', name=u'Ada Lovelace')
+        self.store.put_candidate(
+            dict(id='c1', name=u'Sam Lee', lastInteractionAt=5 * DAY_MS),
+            [_feedback('f1', notes=u'Original notes.')],
+        )
+
+    def _edit_feedback(self):
+        """Edit the feedback the way Lever does, without moving the stamp."""
+        candidate, _ = self.store.get_candidate('c1')
+        self.store.put_candidate(candidate, [_feedback('f1', updated_at=2, notes=u'Edited notes.')])
+
+    def test_trusted_stamp_serves_the_cached_packet(self):
+        self.assertIn('Original notes.', self.client.get('/feedback/c1').data)
+        self._edit_feedback()
+        self.assertIn('Original notes.', self.client.get('/feedback/c1').data)
+
+    def test_revision_change_recompiles_once_the_stamp_is_stale(self):
+        self.client.get('/feedback/c1')
+        self._edit_feedback()
+        entry = self.main.feedback_packets.get('c1')
+        entry['checked_at'] -= self.main.packet_cache.STAMP_TRUST_SECONDS
+        self.main.packet_cache.memcache.set(self.main.feedback_packets._key('c1'), entry)
+        self.assertIn('Edited notes.', self.client.get('/feedback/c1').data)
+
+    def test_refresh_ignores_the_cache(self):
+        self.client.get('/feedback/c1')
+        self.lever.candidates['c1'] = dict(id='c1', name=u'Sam Lee', lastInteractionAt=5 * DAY_MS)
+        self.lever.feedbacks['c1'] = [_feedback('f1', updated_at=2, notes=u'Edited notes.')]
+        self.assertIn('Edited notes.', self.client.get('/feedback/c1?refresh=1').data)
@@ -0,0 +1,237 @@
+import gzip
+import os
+import StringIO
+
+from feedback_model import TEAM_FEEDBACK_KEY
+from tests.appengine import AppTestCase
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _feedback(feedback_id, user='ada', completed_at=100 * DAY_MS, notes=u'Solid design.'):
+    return dict(
+        id=feedback_id,
+        type='interview',
+        text=u'Engineering - System Design',
+        user=user,
+        createdAt=completed_at - DAY_MS,
+        completedAt=completed_at,
+        updatedAt=completed_at,
+        fields=[
+            dict(text=u'Interview notes', value=notes),
+            dict(text=u'Rating', value=u'3 - Hire'),
+        ],
+    )
+
+
+class PacketPageTest(AppTestCase):
+
+    def setUp(self):
+        super(PacketPageTest, self).setUp()
+        self.lever.candidates['c1'] = dict(
+            id='c1', name=u'Sam Lee', lastInteractionAt=5 * DAY_MS)
+        self.lever.feedbacks['c1'] = [_feedback('f1')]
+        self.lever.users['ada'] = dict(id='ada', name=u'Ada Lovelace')
+
+    def test_renders_packet(self):
+        response = self.client.get('/feedback/c1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Sam Lee', response.data)
+        self.assertIn('Ada Lovelace', response.data)
+
+    def test_unchanged_feedback_is_not_recompiled(self):
+        started = []
+        fetch_plan = self.main.concurrency.FetchPlan
+
+        class RecordingPlan(fetch_plan):
+            def start(self, name, *args, **kwargs):
+                started.append(name)
+                return fetch_plan.start(self, name, *args, **kwargs)
+
+        self.patch(self.main.concurrency, 'FetchPlan', RecordingPlan)
+        self.client.get('/feedback/c1')
+        self.assertIn('users', started)
+
+        # The candidate moved, so the feedback is checked again, but it's the
+        # same, so nobody is looked up.
+        candidate, feedbacks = self.store.get_candidate('c1')
+        self.store.put_candidate(dict(candidate, lastInteractionAt=6 * DAY_MS), feedbacks)
+        del started[:]
+        response = self.client.get('/feedback/c1')
+        self.assertIn('Ada Lovelace', response.data)
+        self.assertIn('feedbacks', started)
+        self.assertNotIn('users', started)
+
+    def test_candidate_lookup_failure_still_renders_feedback(self):
+        del self.lever.candidates['c1']
+        response = self.client.get('/feedback/c1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Ada Lovelace', response.data)
+        # Nothing is cached without the candidate's stamp.
+        self.assertIsNone(self.main.feedback_packets.get('c1'))
+        self.assertIsNone(self.store.get_candidate('c1'))
+
+
+class PageCachingTest(AppTestCase):
+
+    def setUp(self):
+        super(PageCachingTest, self).setUp()
+        self.lever.candidates['c1'] = dict(
+            id='c1', name=u'Sam Lee', lastInteractionAt=5 * DAY_MS)
+        self.lever.feedbacks['c1'] = [_feedback('f1')]
+        self.lever.users['ada'] = dict(id='ada', name=u'Ada Lovelace')
+
+    def _edit_feedback(self, **changes):
+        feedback = dict(self.lever.feedbacks['c1'][0], **changes)
+        self.lever.feedbacks['c1'] = [feedback]
+        candidate, _ = self.store.get_candidate('c1')
+        self.lever.candidates['c1'] = dict(candidate, lastInteractionAt=6 * DAY_MS)
+        self.store.put_candidate(self.lever.candidates['c1'], [feedback])
+
+    def test_matching_etag_gets_not_modified(self):
+        response = self.client.get('/feedback/c1')
+        etag = response.headers['ETag']
+        response = self.client.get('/feedback/c1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, '')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.client.get('/feedback/c1', headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_the_feedback(self):
+        etag = self.client.get('/feedback/c1').headers['ETag']
+        self._edit_feedback(
+            updatedAt=101 * DAY_MS,
+            fields=_feedback('f1')['fields'] + [
+                dict(text=TEAM_FEEDBACK_KEY, value=u'Payments'),
+            ],
+        )
+        response = self.client.get('/feedback/c1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Payments', response.data)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_etag_changes_with_the_template_and_version(self):
+        context = dict(candidate=dict(id='c1'))
+        etag = self.main._page_etag('packet.html', context)
+        self.assertEqual(self.main._page_etag('packet.html', dict(context)), etag)
+        self.assertNotEqual(self.main._page_etag('other.html', context), etag)
+        self.assertNotEqual(
+            self.main._page_etag('packet.html', dict(candidate=dict(id='c2'))), etag)
+
+        version = os.environ.get('CURRENT_VERSION_ID')
+        if version is None:
+            self.addCleanup(os.environ.pop, 'CURRENT_VERSION_ID', None)
+        else:
+            self.addCleanup(os.environ.__setitem__, 'CURRENT_VERSION_ID', version)
+        os.environ['CURRENT_VERSION_ID'] = 'next-deploy.1'
+        self.assertNotEqual(self.main._page_etag('packet.html', context), etag)
+
+    def test_gzip_only_when_accepted(self):
+        plain = self.client.get('/feedback/c1')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Sam Lee', plain.data)
+        self.assertEqual(plain.headers['Vary'], 'Accept-Encoding')
+
+        refused = self.client.get('/feedback/c1', headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertNotIn('Content-Encoding', refused.headers)
+
+        compressed = self.client.get('/feedback/c1', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed.headers['ETag'], plain.headers['ETag'][:-1] + '-gzip"')
+        body = gzip.GzipFile(fileobj=StringIO.StringIO(compressed.data)).read()
+        self.assertEqual(body, plain.data)
+
+    def test_repeat_view_reuses_rendered_page(self):
+        rendered = []
+        render_template = self.main.flask.render_template
+
+        def counting_render_template(template_name, **context):
+            rendered.append(template_name)
+            return render_template(template_name, **context)
+
+        self.patch(self.main.flask, 'render_template', counting_render_template)
+        hits = self.main.rendered_pages.hits
+        first = self.client.get('/feedback/c1')
+        second = self.client.get('/feedback/c1')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(rendered), 1)
+        self.assertEqual(self.main.rendered_pages.hits, hits + 1)
+
+        # Another encoding is another page.
+        self.client.get('/feedback/c1', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(len(rendered), 2)
+
+
+class CommitteeTest(AppTestCase):
+
+    def test_unknown_posting(self):
+        response = self.client.post('/committee', data=dict(posting_id='p1'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_posting_lookup_failure(self):
+        self.lever.down = True
+        for _ in range(2):
+            response = self.client.post('/committee', data=dict(posting_id='p1'))
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.lever.calls, [('get_posting', 'p1')])
+
+
+class FeedbackFragmentTest(AppTestCase):
+
+    def setUp(self):
+        super(FeedbackFragmentTest, self).setUp()
+        import feedback_model
+        _, feedbacks = feedback_model.compile_packet(
+            [_feedback('f1')], dict(ada=dict(id='ada', name=u'Ada Lovelace')))
+        self.feedback = feedbacks[0]
+
+    def _fragment(self, feedback):
+        with self.main.app.test_request_context():
+            return self.main.feedback_fragment('_feedback_paragraph.html', feedback)
+
+    def test_unchanged_feedback_reuses_its_fragment(self):
+        html = self._fragment(self.feedback)
+        self.assertIn('Solid design.', html)
+        # Same revision, so the cached HTML is served as is.
+        self.assertEqual(self._fragment(dict(self.feedback, score=u'4 - Strong Hire')), html)
+
+    def test_edited_feedback_is_rerendered(self):
+        self._fragment(self.feedback)
+        edited = dict(
+            self.feedback,
+            updatedAt=self.feedback['updatedAt'] + 1,
+            feedback_texts=[dict(header=u'Interview notes', text=u'Revised notes.')],
+        )
+        html = self._fragment(edited)
+        self.assertIn('Revised notes.', html)
+        self.assertNotIn('Solid design.', html)
+
+    def test_renamed_interviewer_is_rerendered(self):
+        self._fragment(self.feedback)
+        html = self._fragment(dict(self.feedback, username=u'Ada King'))
+        self.assertIn('Ada King', html)
+
+    def test_feedback_without_an_id_is_not_cached(self):
+        feedback = dict(self.feedback, id=None)
+        self._fragment(feedback)
+        html = self._fragment(dict(feedback, username=u'Ada King'))
+        self.assertIn('Ada King', html)
+        self.assertEqual(self.main.rendered_fragments.stats()['size'], 0)
+
+    def test_edited_feedback_shows_on_the_page(self):
+        self.lever.candidates['c1'] = dict(
+            id='c1', name=u'Sam Lee', lastInteractionAt=5 * DAY_MS)
+        self.lever.feedbacks['c1'] = [_feedback('f1')]
+        self.lever.users['ada'] = dict(id='ada', name=u'Ada Lovelace')
+        self.assertIn('Solid design.', self.client.get('/feedback/c1').data)
+
+        edited = _feedback('f1', notes=u'Revised notes.')
+        edited['updatedAt'] += 1
+        candidate, _ = self.store.get_candidate('c1')
+        self.store.put_candidate(dict(candidate, lastInteractionAt=6 * DAY_MS), [edited])
+        self.lever.feedbacks['c1'] = [edited]
+        response = self.client.get('/feedback/c1')
+        self.assertIn('Revised notes.', response.data)
+        self.assertNotIn('Solid design.', response.data)
@@ -0,0 +1,127 @@
+import threading
+import time
+import unittest
+
+from util import ratelimit
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+
+
+class GovernorTest(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        governor = ratelimit.Governor(rate=20, burst=2, initial_limit=10)
+        start = time.time()
+        for _ in range(3):
+            governor.acquire()
+        # Two tokens were in the bucket; the third took a refill of 1/20s.
+        self.assertGreaterEqual(time.time() - start, 0.04)
+        self.assertEqual(governor.in_flight, 3)
+
+    def test_concurrency_limit_waits_for_release(self):
+        governor = ratelimit.Governor(initial_limit=1)
+        governor.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (governor.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        governor.release(200)
+        self.assertTrue(acquired.wait(5))
+        thread.join(5)
+
+    def test_additive_increase(self):
+        governor = ratelimit.Governor(initial_limit=4, max_limit=5)
+        for _ in range(4):
+            governor.acquire()
+        for _ in range(4):
+            governor.release(200)
+        # About one more per round of `limit` successes.
+        self.assertAlmostEqual(governor.limit, 5, delta=0.1)
+        for _ in range(20):
+            governor.acquire()
+            governor.release(200)
+        self.assertEqual(governor.limit, 5)
+
+    def test_server_errors_leave_the_limit_alone(self):
+        governor = ratelimit.Governor(initial_limit=4)
+        governor.acquire()
+        governor.release(503)
+        self.assertEqual(governor.limit, 4)
+
+    def test_throttling_halves_the_limit_and_pauses(self):
+        governor = ratelimit.Governor(initial_limit=8, min_limit=3)
+        governor.acquire()
+        governor.release(429, retry_after=0.1)
+        self.assertEqual(governor.limit, 4)
+        self.assertEqual(governor.throttled, 1)
+        self.assertGreater(governor.stats()['paused_for'], 0)
+
+        start = time.time()
+        governor.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        governor.release(429, retry_after=0)
+        self.assertEqual(governor.limit, 3)
+
+    def test_interactive_goes_before_batch(self):
+        governor = ratelimit.Governor(initial_limit=1)
+        governor.acquire(ratelimit.INTERACTIVE)
+        order = []
+
+        def wait_for_slot(lane):
+            governor.acquire(lane)
+            order.append(lane)
+            governor.release(200)
+
+        batch = threading.Thread(target=wait_for_slot, args=(ratelimit.BATCH,))
+        batch.start()
+        _wait_until(lambda: governor.stats()['waiting']['batch'] == 1)
+        interactive = threading.Thread(target=wait_for_slot, args=(ratelimit.INTERACTIVE,))
+        interactive.start()
+        _wait_until(lambda: governor.stats()['waiting']['interactive'] == 1)
+
+        governor.release(200)
+        batch.join(5)
+        interactive.join(5)
+        self.assertEqual(order, [ratelimit.INTERACTIVE, ratelimit.BATCH])
+
+    def test_batch_gets_a_share_of_the_limit(self):
+        governor = ratelimit.Governor(initial_limit=4, batch_share=0.5)
+        self.assertEqual(governor._capacity(ratelimit.INTERACTIVE), 4)
+        self.assertEqual(governor._capacity(ratelimit.BATCH), 2)
+
+    def test_slot_releases_with_its_status(self):
+        governor = ratelimit.Governor(initial_limit=8)
+        with governor.slot() as slot:
+            slot.status = 429
+            slot.retry_after = 0
+        self.assertEqual(governor.in_flight, 0)
+        self.assertEqual(governor.limit, 4)
+
+
+class LaneTest(unittest.TestCase):
+
+    def test_lane_is_restored(self):
+        self.assertEqual(ratelimit.current_lane(), ratelimit.INTERACTIVE)
+        with ratelimit.lane(ratelimit.BATCH):
+            self.assertEqual(ratelimit.current_lane(), ratelimit.BATCH)
+        self.assertEqual(ratelimit.current_lane(), ratelimit.INTERACTIVE)
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(ratelimit.parse_retry_after('3'), 3.0)
+
+    def test_http_date(self):
+        self.assertEqual(
+            ratelimit.parse_retry_after('Thu, 01 Jan 1970 00:00:10 GMT', now=4),
+            6.0,
+        )
+
+    def test_unusable(self):
+        self.assertIsNone(ratelimit.parse_retry_after(None))
+        self.assertIsNone(ratelimit.parse_retry_after('soon'))
@@ -0,0 +1,85 @@
+import json
+import unittest
+
+import ratings
+from tests.appengine import AppTestCase
+
+DAY_MS = ratings.DAY_MS
+
+
+def _table(rows):
+    """A table from (interviewer_id, interview, score, completed_at day) rows."""
+    return ratings.from_export_records(
+        dict(
+            type='feedback',
+            interviewer_id=interviewer_id,
+            interview=interview,
+            score=score,
+            completed_at=day * DAY_MS,
+        )
+        for interviewer_id, interview, score, day in rows
+    )
+
+
+class RatingsTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = _table([
+            ('ada', u'Engineering - System Design', u'4 - Strong Hire', 0),
+            ('ada', u'Engineering - System Design', u'2 - No Hire', 1),
+            ('grace', u'Engineering - Problem Solving', u'2 - No Hire', 2),
+            ('grace', u'Engineering - Problem Solving', u'1 - Strong No Hire', 10),
+            ('ada', u'Engineering - Problem Solving', u'3 - Hire', 11),
+        ])
+
+    def test_by_interviewer(self):
+        rows = self.table.by_interviewer()
+        self.assertEqual([row['interviewer_id'] for row in rows], ['ada', 'grace'])
+        self.assertEqual(rows[0]['ratings'], 3)
+        self.assertAlmostEqual(rows[0]['mean'], 3.0)
+        self.assertAlmostEqual(rows[1]['offset'], 1.5 - 2.4)
+        self.assertEqual(self.table.by_interviewer(min_ratings=3)[0]['interviewer_id'], 'ada')
+        self.assertEqual(len(self.table.by_interviewer(min_ratings=3)), 1)
+
+    def test_by_interview_type(self):
+        rows = dict((row['interview_type'], row) for row in self.table.by_interview_type())
+        self.assertEqual(self.table.score_range(), [1, 2, 3, 4])
+        self.assertEqual(rows['system design']['distribution'], [0, 1, 0, 1])
+        self.assertEqual(rows['problem solving']['ratings'], 3)
+
+    def test_drift(self):
+        first, second = self.table.drift(period_ms=7 * DAY_MS)
+        self.assertEqual(first['period_start'], 0)
+        self.assertEqual((first['ratings'], first['interviewers']), (3, 2))
+        self.assertAlmostEqual(first['mean'], 8 / 3.0)
+        # Interviewer means 3 and 2.
+        self.assertAlmostEqual(first['interviewer_spread'], 0.5)
+        self.assertEqual(second['period_start'], 7 * DAY_MS)
+        # Interviewer means 1 and 3.
+        self.assertAlmostEqual(second['interviewer_spread'], 1.0)
+
+    def test_drift_skips_empty_periods(self):
+        periods = self.table.drift(period_ms=DAY_MS)
+        self.assertEqual(
+            [period['period_start'] // DAY_MS for period in periods],
+            [0, 1, 2, 10, 11],
+        )
+        self.assertEqual([period['interviewer_spread'] for period in periods], [0.0] * 5)
+
+    def test_empty(self):
+        table = _table([])
+        self.assertEqual(table.drift(), [])
+        self.assertEqual(table.by_interviewer(), [])
+
+
+class CalibrationPageTest(AppTestCase):
+
+    def _report(self, query=''):
+        response = self.client.get('/calibration?format=json' + query)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def test_period_is_clamped(self):
+        self.assertEqual(self._report('&period_days=1')['period_days'], 7)
+        self.assertEqual(self._report('&period_days=100000')['period_days'], 5 * 365)
+        self.assertEqual(self._report()['period_days'], 91)
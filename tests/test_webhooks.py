@@ -0,0 +1,104 @@
+import hashlib
+import hmac
+import json
+import time
+
+from tests.appengine import AppTestCase
+
+TOKEN = 'webhook-secret'
+
+
+def _signed(event, data, triggered_at=None, token=TOKEN):
+    """A Lever webhook payload signed with `token`."""
+    if triggered_at is None:
+        triggered_at = int(time.time() * 1000)
+    return dict(
+        event=event,
+        data=data,
+        token='event-token',
+        triggeredAt=triggered_at,
+        signature=hmac.new(
+            token,
+            'event-token%s' % (triggered_at,),
+            hashlib.sha256,
+        ).hexdigest(),
+    )
+
+
+class LeverWebhookTest(AppTestCase):
+
+    def setUp(self):
+        super(LeverWebhookTest, self).setUp()
+        self.patch(self.main.secret, 'lever_webhook_signature_token', TOKEN)
+        self.queued = []
+        self.patch(
+            self.main.precompute_queue,
+            'add',
+            lambda key, params: self.queued.append(key) or True,
+        )
+
+    def _post(self, payload):
+        return self.client.post(
+            '/webhooks/lever',
+            data=json.dumps(payload),
+            content_type='application/json',
+        )
+
+    def test_valid_event_queues_precompute(self):
+        response = self._post(_signed('candidateStageChange', dict(candidateId='c1')))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), dict(queued=True))
+        self.assertEqual(self.queued, ['c1'])
+
+    def test_bad_signature(self):
+        response = self._post(_signed('candidateStageChange', dict(candidateId='c1'), token='guess'))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.queued, [])
+
+    def test_missing_signature(self):
+        payload = _signed('candidateStageChange', dict(candidateId='c1'))
+        del payload['signature']
+        self.assertEqual(self._post(payload).status_code, 403)
+
+    def test_missing_timestamp(self):
+        payload = _signed('candidateStageChange', dict(candidateId='c1'))
+        del payload['triggeredAt']
+        self.assertEqual(self._post(payload).status_code, 403)
+
+    def test_stale_event_is_refused(self):
+        triggered_at = int(time.time() * 1000) - self.main.WEBHOOK_MAX_AGE_MS - 1000
+        response = self._post(_signed(
+            'candidateStageChange', dict(candidateId='c1'), triggered_at=triggered_at))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.queued, [])
+
+    def test_unconfigured_token_refuses_everything(self):
+        self.patch(self.main.secret, 'lever_webhook_signature_token', None)
+        response = self._post(_signed('candidateStageChange', dict(candidateId='c1')))
+        self.assertEqual(response.status_code, 403)
+
+    def test_deletion_drops_the_candidate(self):
+        self.store.put_candidate(dict(id='c1', name=u'Sam Lee'), [])
+        self.main.feedback_packets.set('c1', 'r1', 'packet')
+        search_index = self.main.feedback_search.FeedbackIndex()
+        self.patch(self.main, 'search_index', search_index)
+        search_index.catch_up(self.store)
+        self.assertEqual(search_index.stats()['candidates'], 1)
+
+        response = self._post(_signed('candidateDeleted', dict(candidateId='c1')))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.queued, [])
+        self.assertIsNone(self.store.get_candidate('c1'))
+        self.assertIsNone(self.main.feedback_packets.get('c1'))
+        self.assertEqual(search_index.stats()['candidates'], 0)
+
+    def test_deletion_reaches_other_instances_search_indexes(self):
+        self.store.put_candidate(dict(id='c1', name=u'Sam Lee'), [])
+        other_index = self.main.feedback_search.FeedbackIndex()
+        other_index.catch_up(self.store)
+
+        self._post(_signed('candidateDeleted', dict(candidateId='c1')))
+        other_index.catch_up(self.store)
+
+        self.assertEqual(other_index.stats()['candidates'], 0)
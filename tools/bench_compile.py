@@ -0,0 +1,202 @@
+"""Micro-benchmark of per-packet CPU for compiling feedback.
+
+Compares the original dict-scanning implementation with `feedback_model`.
+
+    python -m tools.bench_compile [--feedbacks 12] [--number 500]
+"""
+import argparse
+import copy
+import random
+import timeit
+
+import feedback_model
+from feedback_model import ANYTHING_ELSE_TO_KNOW_KEY
+from feedback_model import TEAM_FEEDBACK_KEY
+from tools import lever_fixtures
+
+
+# The implementation feedback_model replaced, kept verbatim (minus logging) as
+# the baseline.
+
+def _legacy_extract_fields_as_keyval(fields, key, allow_missing=False):
+    for field in fields:
+        if field['text'] == key:
+            return field['value']
+    if allow_missing:
+        return ''
+    raise KeyError(key)
+
+
+def _legacy_assign_arbitrary_feedback_ordering(feedback):
+    feedback_title = feedback['text'].lower()
+    for rank, interview_type in enumerate(feedback_model.FEEDBACK_ORDERING):
+        if interview_type in feedback_title:
+            return rank + 1
+    return None
+
+
+def legacy_compile_packet(feedbacks, users):
+    headers = []
+
+    def arbitrary_order_to_be_consistent_with_docs(feedback):
+        if 'phone' in feedback['text'].lower():
+            return 0
+        if _legacy_assign_arbitrary_feedback_ordering(feedback) is not None:
+            return _legacy_assign_arbitrary_feedback_ordering(feedback)
+        return feedback['completedAt']
+
+    feedbacks = sorted(feedbacks, key=arbitrary_order_to_be_consistent_with_docs)
+    for feedback in feedbacks:
+        try:
+            user = users[feedback['user']]
+            feedback['username'] = user['name']
+            feedback['score'] = _legacy_extract_fields_as_keyval(feedback['fields'], u'Rating')
+            header = dict(
+                score=feedback['score'],
+                interviewer=user['name'].strip(),
+                interview_type=feedback['text'].strip(),
+            )
+            headers.append(feedback_model._truncate_header(header))
+            FIELD_BLACKLIST = [
+                TEAM_FEEDBACK_KEY,
+                ANYTHING_ELSE_TO_KNOW_KEY,
+                u'Rating',
+            ]
+            feedback['feedback_text'] = feedback['fields'][0]['value']
+            feedback['feedback_texts'] = [dict(
+                header=field['text'],
+                text=field['value'],
+            ) for field in feedback['fields']
+                if field['text'] not in FIELD_BLACKLIST
+            ]
+            feedback['team_suggestion'] = _legacy_extract_fields_as_keyval(
+                feedback['fields'], u'Team Suggestions', allow_missing=True)
+            feedback['team_feedback'] = _legacy_extract_fields_as_keyval(
+                feedback['fields'], TEAM_FEEDBACK_KEY, allow_missing=True)
+            feedback['anything_else_we_should_know'] = _legacy_extract_fields_as_keyval(
+                feedback['fields'], ANYTHING_ELSE_TO_KNOW_KEY, allow_missing=True)
+        except Exception:
+            pass
+    return headers, feedbacks
+
+
+def _legacy_is_intern_form_v2(fields):
+    notes_field_count = 0
+    for field in fields:
+        if field['text'].lower().startswith('notes'):
+            notes_field_count += 1
+        if notes_field_count > 1:
+            return True
+    return False
+
+
+def _legacy_intern_fields_v1(fields):
+    cleaned_fields = dict(overall_score=None, notes=None, other_random_fields=[])
+    for field in fields:
+        if field['text'].lower().startswith('overall'):
+            cleaned_fields['overall_score'] = field['value']
+            continue
+        if field['text'].lower().startswith('notes'):
+            cleaned_fields['notes'] = field['value']
+            continue
+        clean_name = field['text'].split('-')[0].strip()
+        cleaned_fields['other_random_fields'].append(dict(label=clean_name, text=field['value']))
+    return cleaned_fields
+
+
+def _legacy_intern_fields_v2(fields):
+    cleaned_fields = dict(overall_score=None, notes=None, other_random_fields=[])
+    current_eval_field = {}
+    for field in fields:
+        if field['text'].lower().startswith('overall'):
+            cleaned_fields['overall_score'] = field['value']
+            continue
+        if field['text'].lower().startswith('notes'):
+            current_eval_field['notes'] = field['value']
+            cleaned_fields['other_random_fields'].append(current_eval_field)
+            current_eval_field = {}
+            continue
+        clean_name = field['text'].split('-')[0].strip()
+        if current_eval_field:
+            cleaned_fields['other_random_fields'].append(current_eval_field)
+            current_eval_field = {}
+        current_eval_field = dict(label=clean_name, text=field['value'])
+    if current_eval_field:
+        cleaned_fields['other_random_fields'].append(current_eval_field)
+    return cleaned_fields
+
+
+def legacy_compile_intern_packet(feedbacks, users):
+    headers = []
+    final_feedbacks = []
+    for feedback in sorted(feedbacks, key=lambda x: x['completedAt']):
+        user = users[feedback['user']]
+        if _legacy_is_intern_form_v2(feedback['fields']):
+            cleaned_fields = _legacy_intern_fields_v2(feedback['fields'])
+        else:
+            cleaned_fields = _legacy_intern_fields_v1(feedback['fields'])
+        cleaned_fields['username'] = user['name']
+        # Not in the original; the current output carries Lever's stamps.
+        cleaned_fields['id'] = feedback.get('id')
+        cleaned_fields['completedAt'] = feedback['completedAt']
+        cleaned_fields['updatedAt'] = feedback.get('updatedAt')
+        final_feedbacks.append(cleaned_fields)
+        headers.append(dict(score=cleaned_fields['overall_score'], interviewer=user['name'].strip()))
+    return headers, final_feedbacks
+
+
+def _packets(seed, feedback_count):
+    rng = random.Random(seed)
+    users = [lever_fixtures.make_user(rng) for _ in range(8)]
+    users_by_id = dict((user['id'], user) for user in users)
+    user_ids = list(users_by_id)
+    onsite = lever_fixtures.make_feedback_history(
+        rng, user_ids, onsite=feedback_count, pending=0)
+    intern = lever_fixtures.make_feedback_history(
+        rng, user_ids, onsite=0, intern=feedback_count, pending=0)
+    return users_by_id, onsite, intern
+
+
+def _time_per_packet(func, feedbacks, users, number, rounds=5):
+    """Best-of-`rounds` microseconds per packet."""
+    best = None
+    for _ in range(rounds):
+        # Each run gets its own copy since the legacy compile annotates the raw
+        # dicts.
+        copies = [copy.deepcopy(feedbacks) for _ in range(number)]
+        total = timeit.timeit(lambda: func(copies.pop(), users), number=number)
+        if best is None or total < best:
+            best = total
+    return best / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--feedbacks', type=int, default=12)
+    parser.add_argument('--number', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    users, onsite, intern = _packets(args.seed, args.feedbacks)
+    assert (
+        legacy_compile_packet(copy.deepcopy(onsite), users)
+        == feedback_model.compile_packet(copy.deepcopy(onsite), users)
+    )
+    assert (
+        legacy_compile_intern_packet(copy.deepcopy(intern), users)
+        == feedback_model.compile_intern_packet(copy.deepcopy(intern), users)
+    )
+
+    print '%d feedbacks per packet, best of 5 x %d runs' % (args.feedbacks, args.number)
+    for name, legacy, current, feedbacks in [
+        ('catapult', legacy_compile_packet, feedback_model.compile_packet, onsite),
+        ('trebuchet', legacy_compile_intern_packet, feedback_model.compile_intern_packet, intern),
+    ]:
+        before = _time_per_packet(legacy, feedbacks, users, args.number)
+        after = _time_per_packet(current, feedbacks, users, args.number)
+        print '%-10s before %8.1fus  after %8.1fus  (%.2fx)' % (
+            name, before, after, before / after)
+
+
+if __name__ == '__main__':
+    main()
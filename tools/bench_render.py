@@ -0,0 +1,131 @@
+"""Micro-benchmark of rendering packet pages with 5, 20 and 100 feedbacks.
+
+Times loading the packet templates from source and from deployed bytecode,
+then rendering /feedback and /trebuchet pages three ways: "cold" with no
+fragments cached, "one new" with all but the newest feedback's fragment
+cached, as after a feedback is submitted, and "warm" with every fragment
+cached.
+
+    python -m tools.bench_render [--sizes 5,20,100] [--number 50]
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import timeit
+
+from tools import gae_env
+from tools import lever_fixtures
+
+
+def _best_ms(func, number, setup=None, rounds=5):
+    """Best-of-`rounds` milliseconds per call, not counting `setup`."""
+    best = None
+    for _ in range(rounds):
+        total = 0.0
+        for _ in range(number):
+            if setup is not None:
+                setup()
+            total += timeit.timeit(func, number=1)
+        if best is None or total < best:
+            best = total
+    return best / number * 1000
+
+
+def bench_template_loading(main, number):
+    from util import template_cache
+    env = main.app.jinja_env
+
+    def load():
+        env.cache.clear()
+        for template_name in main.WARMUP_TEMPLATES:
+            env.get_template(template_name)
+
+    directory = tempfile.mkdtemp()
+    try:
+        env.bytecode_cache = None
+        from_source = _best_ms(load, number)
+        template_cache.build(main.app, directory)
+        env.bytecode_cache = template_cache.DeployedBytecodeCache(directory)
+        from_bytecode = _best_ms(load, number)
+    finally:
+        env.bytecode_cache = None
+        env.cache.clear()
+        shutil.rmtree(directory)
+    print '%d templates: from source %8.2fms  from bytecode %8.2fms  (%.1fx)' % (
+        len(main.WARMUP_TEMPLATES), from_source, from_bytecode, from_source / from_bytecode)
+
+
+def _packet_pages(main, rng, users, size):
+    """(name, template, context, newest-less context) for each packet page."""
+    import feedback_model
+    user_ids = list(users)
+    candidate = lever_fixtures.make_candidate(rng)
+    onsite = lever_fixtures.make_feedback_history(rng, user_ids, onsite=size, pending=0)
+    intern = lever_fixtures.make_feedback_history(
+        rng, user_ids, onsite=0, intern=size, pending=0)
+    pages = []
+    for name, template_name, compile_packet, raw_feedbacks, extra in [
+        ('catapult', 'home.html', feedback_model.compile_packet, onsite,
+            dict(candidate_id=candidate['id'])),
+        ('trebuchet', 'trebuchet.html', feedback_model.compile_intern_packet, intern, {}),
+    ]:
+        headers, feedbacks = compile_packet(raw_feedbacks, users)
+        newest = max(feedbacks, key=lambda feedback: feedback['completedAt'])
+        context = dict(extra, title=main.APP_NAME, candidate=candidate, headers=headers)
+        pages.append((
+            name,
+            template_name,
+            dict(context, feedbacks=feedbacks),
+            dict(context, feedbacks=[f for f in feedbacks if f is not newest]),
+        ))
+    return pages
+
+
+def bench_rendering(main, sizes, number, seed):
+    import flask
+    rng = random.Random(seed)
+    users = dict((user['id'], user) for user in (
+        lever_fixtures.make_user(rng) for _ in range(8)))
+
+    print
+    print '%-10s %9s %10s %10s %10s' % ('page', 'feedbacks', 'cold ms', 'one new ms', 'warm ms')
+    with main.app.test_request_context('/'):
+        for size in sizes:
+            for name, template_name, context, without_newest in _packet_pages(main, rng, users, size):
+                render = lambda: flask.render_template(template_name, **context)
+                render()
+
+                def render_all_but_newest():
+                    main.rendered_fragments.clear()
+                    flask.render_template(template_name, **without_newest)
+
+                cold = _best_ms(render, number, setup=main.rendered_fragments.clear)
+                one_new = _best_ms(render, number, setup=render_all_but_newest)
+                render()
+                warm = _best_ms(render, number)
+                print '%-10s %9d %10.2f %10.2f %10.2f' % (
+                    name, size, cold, one_new, warm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='5,20,100')
+    parser.add_argument('--number', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    gae_env.activate()
+    import main as app_main
+
+    bench_template_loading(app_main, args.number)
+    bench_rendering(
+        app_main,
+        [int(size) for size in args.sizes.split(',')],
+        args.number,
+        args.seed,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""End-to-end benchmark of the packet views against the local Lever stub.
+
+Drives /feedback and /trebuchet through Flask's test client, with the Lever
+stub adding per-call latency, and reports latency percentiles, upstream Lever
+calls and bytes per page load. "cold" runs flush every cache before each
+request; "synced" runs flush the caches too, but start from a store that
+`feedback_store.sync_from_lever` already filled; "warm" runs hit pages that
+were already loaded once.
+
+    python -m tools.bench_views [--requests 20] [--latency-ms 50] [--page-size 5]
+"""
+import argparse
+import time
+
+from tools import gae_env
+from tools import lever_stub
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def reset_app_caches(main, keep_store=False):
+    from google.appengine.api import memcache
+    import feedback_store
+    from util import cache
+    memcache.flush_all()
+    for value in vars(main).values():
+        if isinstance(value, cache.TieredCache):
+            value.local.clear()
+        elif isinstance(value, cache.LRUCache):
+            value.clear()
+    if not keep_store:
+        main.store = feedback_store.MemoryFeedbackStore()
+
+
+def run_scenario(main, client, stub, url_template, ids, requests, mode):
+    import feedback_store
+    reset_app_caches(main)
+    if mode == 'synced':
+        feedback_store.sync_from_lever(main.lever_client, main.store, time_budget=None)
+    elif mode == 'warm':
+        for candidate_id in ids[:requests]:
+            client.get(url_template % (candidate_id,))
+
+    latencies = []
+    upstream_calls = []
+    upstream_bytes = []
+    not_modified = []
+    response_bytes = []
+    for index in range(requests):
+        candidate_id = ids[index % len(ids)]
+        if mode != 'warm':
+            reset_app_caches(main, keep_store=mode == 'synced')
+        stub.reset()
+        start = time.time()
+        response = client.get(url_template % (candidate_id,))
+        body = response.get_data()
+        latencies.append((time.time() - start) * 1000)
+        assert response.status_code == 200, (response.status_code, body[:200])
+        stats = stub.stats()
+        upstream_calls.append(stats['total_requests'])
+        upstream_bytes.append(stats['bytes_sent'])
+        not_modified.append(stats['not_modified'])
+        response_bytes.append(len(body))
+
+    count = float(len(latencies))
+    return dict(
+        p50=percentile(latencies, 50),
+        p90=percentile(latencies, 90),
+        p99=percentile(latencies, 99),
+        calls=sum(upstream_calls) / count,
+        not_modified=sum(not_modified) / count,
+        upstream_kb=sum(upstream_bytes) / count / 1024,
+        response_kb=sum(response_bytes) / count / 1024,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--page-size', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    gae_env.activate()
+    dataset = lever_stub.LeverDataset(seed=args.seed)
+    stub = lever_stub.LeverStub(
+        dataset,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        page_size=args.page_size,
+    )
+    server = lever_stub.serve(stub)
+    gae_env.use_lever('http://%s:%d' % server.server_address)
+
+    import main as app_main
+    client = app_main.app.test_client()
+
+    print 'Lever latency %dms +/- %dms, page size %d, %d requests per scenario' % (
+        args.latency_ms, args.jitter_ms, args.page_size, args.requests)
+    print '%-16s %8s %8s %8s %8s %8s %10s %10s' % (
+        'scenario', 'p50 ms', 'p90 ms', 'p99 ms', 'calls', '304s', 'lever KB', 'page KB')
+    pages = [
+        ('feedback', '/feedback/%s', dataset.candidate_ids),
+        ('trebuchet', '/trebuchet/%s', dataset.intern_ids),
+    ]
+    for page, url_template, ids in pages:
+        for mode in ('cold', 'synced', 'warm'):
+            result = run_scenario(
+                app_main, client, stub, url_template, ids, args.requests, mode)
+            print '%-16s %8.1f %8.1f %8.1f %8.1f %8.1f %10.1f %10.1f' % (
+                '%s %s' % (page, mode),
+                result['p50'],
+                result['p90'],
+                result['p99'],
+                result['calls'],
+                result['not_modified'],
+                result['upstream_kb'],
+                result['response_kb'],
+            )
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Compile the app's templates to Jinja bytecode for deployment.
+
+Writes template_cache/, which instances load at startup instead of compiling
+templates themselves. `make deploy` runs this; it has to run with the same
+Jinja (lib/) and Python versions as App Engine.
+
+    python -m tools.build_templates
+"""
+import argparse
+import time
+
+from tools import gae_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--directory', help='defaults to util.template_cache.cache_dir()')
+    args = parser.parse_args()
+
+    gae_env.activate()
+    from util import template_cache
+    import main as app_main
+
+    directory = args.directory or template_cache.cache_dir()
+    start = time.time()
+    names = template_cache.build(app_main.app, directory)
+    print 'compiled %d templates into %s in %.1fms' % (
+        len(names), directory, (time.time() - start) * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Interviewer calibration from a JSONL export, without running the app.
+
+Reads a file written by tools.export_feedback (or /export) and prints the
+tables /calibration shows, with interviewer IDs instead of names.
+
+    python -m tools.calibration_report export.jsonl [--min-ratings 5] [--period-days 91]
+"""
+import argparse
+import json
+import time
+
+import ratings
+
+
+def read_records(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('export')
+    parser.add_argument('--min-ratings', type=int, default=5)
+    parser.add_argument('--period-days', type=int, default=91)
+    args = parser.parse_args()
+
+    start = time.time()
+    table = ratings.from_export_records(read_records(args.export))
+    built = time.time()
+    interviewers = table.by_interviewer(args.min_ratings)
+    interview_types = table.by_interview_type()
+    drift = table.drift(args.period_days * ratings.DAY_MS)
+    aggregated = time.time()
+    print '%d ratings: built in %.1fms, aggregated in %.1fms' % (
+        len(table), (built - start) * 1000, (aggregated - built) * 1000)
+
+    print
+    print '%-40s %8s %6s %6s %7s %7s' % (
+        'interviewer', 'ratings', 'mean', 'std', 'offset', 'trend')
+    for row in interviewers:
+        print '%-40s %8d %6.2f %6.2f %+7.2f %7s' % (
+            row['interviewer_id'],
+            row['ratings'],
+            row['mean'],
+            row['std'],
+            row['offset'],
+            '%+.2f' % row['trend'] if row['trend'] is not None else '',
+        )
+
+    print
+    print '%-24s %8s %6s  %s' % (
+        'interview', 'ratings', 'mean', ' '.join('%6d' % score for score in table.score_range()))
+    for row in interview_types:
+        print '%-24s %8d %6.2f  %s' % (
+            row['interview_type'],
+            row['ratings'],
+            row['mean'],
+            ' '.join('%6d' % count for count in row['distribution']),
+        )
+
+    print
+    print '%-12s %8s %12s %6s %6s %6s' % (
+        'from', 'ratings', 'interviewers', 'mean', 'std', 'spread')
+    for row in drift:
+        print '%-12s %8d %12d %6.2f %6.2f %6.2f' % (
+            time.strftime('%Y-%m-%d', time.gmtime(row['period_start'] / 1000)),
+            row['ratings'],
+            row['interviewers'],
+            row['mean'],
+            row['std'],
+            row['interviewer_spread'],
+        )
+
+
+if __name__ == '__main__':
+    main()
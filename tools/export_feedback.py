@@ -0,0 +1,123 @@
+"""Export compiled feedback for many candidates to a JSONL or CSV file.
+
+Candidates come from a posting, a file of IDs (one per line), or both. After
+each candidate the output is flushed and a checkpoint file next to it records
+the last candidate written and the output's size, so an interrupted export
+run again with the same arguments picks up where it stopped.
+
+    python -m tools.export_feedback --posting-id ID [--ids-file FILE]
+        [--kind feedback|intern] [--format jsonl|csv] [--workers 8]
+        [--lever-url http://127.0.0.1:8765] --output FILE
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from tools import gae_env
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_checkpoint(path, checkpoint):
+    # Written aside and renamed over the old one, so a crash never leaves a
+    # half-written checkpoint.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.rename(temp_path, path)
+
+
+def candidate_ids(main, args):
+    ids = []
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            ids = main._parse_candidate_ids(f.read())
+    if args.posting_id:
+        known = set(ids)
+        ids.extend(sorted(
+            candidate['id']
+            for candidate in main.lever_client.get_posting_candidates(args.posting_id)
+            if candidate['id'] not in known
+        ))
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--posting-id')
+    parser.add_argument('--ids-file')
+    parser.add_argument('--kind', choices=['feedback', 'intern'], default='feedback')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--lever-url', help='Lever API base, e.g. a tools.lever_stub')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--checkpoint', help='defaults to OUTPUT.checkpoint')
+    args = parser.parse_args()
+    if not args.posting_id and not args.ids_file:
+        parser.error('give --posting-id, --ids-file or both')
+    checkpoint_path = args.checkpoint or args.output + '.checkpoint'
+
+    gae_env.activate()
+    if args.lever_url:
+        gae_env.use_lever(args.lever_url)
+    import main as app_main
+
+    ids = candidate_ids(app_main, args)
+    checkpoint = read_checkpoint(checkpoint_path)
+    if checkpoint is not None and os.path.exists(args.output):
+        after = checkpoint['after']
+        exported = checkpoint['exported']
+        if after not in ids:
+            sys.exit('%s from %s is no longer among the candidates; remove the '
+                     'checkpoint to start over' % (after, checkpoint_path))
+        out = open(args.output, 'r+b')
+        # Drop anything written after the last checkpoint.
+        out.truncate(checkpoint['offset'])
+        out.seek(checkpoint['offset'])
+        print >> sys.stderr, 'resuming after %s, %d of %d candidates done' % (
+            after, exported, len(ids))
+    else:
+        out = open(args.output, 'wb')
+        after = None
+        exported = 0
+        if args.format == 'csv':
+            out.write(app_main._csv_line(app_main.feedback_model.EXPORT_COLUMNS))
+
+    start = time.time()
+    try:
+        for candidate_id, text in app_main._export_chunks(
+            ids,
+            args.kind,
+            args.format,
+            after=after,
+            max_workers=args.workers,
+        ):
+            out.write(text)
+            out.flush()
+            exported += 1
+            write_checkpoint(checkpoint_path, dict(
+                after=candidate_id,
+                offset=out.tell(),
+                exported=exported,
+            ))
+            if exported % 100 == 0:
+                print >> sys.stderr, '%d of %d candidates, %.1fs' % (
+                    exported, len(ids), time.time() - start)
+    finally:
+        out.close()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print >> sys.stderr, 'exported %d candidates to %s in %.1fs' % (
+        exported, args.output, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Run the app's modules outside dev_appserver, for benchmarks and CLI tools.
+
+Needs the App Engine Python SDK: set GAE_SDK to its directory, or have
+dev_appserver.py on PATH. Dependencies come from lib/ (`make build`).
+"""
+import importlib
+import os
+import sys
+import types
+
+
+def _find_sdk():
+    if os.environ.get('GAE_SDK'):
+        return os.environ['GAE_SDK']
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        script = os.path.join(directory, 'dev_appserver.py')
+        if not os.path.exists(script):
+            continue
+        sdk = os.path.dirname(os.path.realpath(script))
+        # The Cloud SDK keeps the App Engine SDK under platform/.
+        for candidate in [sdk, os.path.join(sdk, '..', 'platform', 'google_appengine')]:
+            if os.path.isdir(os.path.join(candidate, 'google', 'appengine')):
+                return os.path.abspath(candidate)
+    raise RuntimeError(
+        'App Engine SDK not found: set GAE_SDK or put dev_appserver.py on PATH',
+    )
+
+
+_path_fixed = False
+
+
+def _fix_path():
+    global _path_fixed
+    if _path_fixed:
+        return
+    sys.path.insert(0, _find_sdk())
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+    # Puts lib/ on the path, the same way an instance does on startup.
+    importlib.import_module('appengine_config')
+    _path_fixed = True
+
+
+def activate(user_email='tools@yelp.com', admin=True):
+    """Set up API stubs and a signed-in user. Returns the active Testbed.
+
+    Can be called again, e.g. once per test, after deactivating the last one.
+    """
+    _fix_path()
+
+    from google.appengine.ext import testbed
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.init_memcache_stub()
+    bed.init_datastore_v3_stub()
+    bed.init_urlfetch_stub()
+    bed.init_user_stub()
+    bed.setup_env(
+        USER_EMAIL=user_email,
+        USER_ID='1',
+        USER_IS_ADMIN='1' if admin else '0',
+        overwrite=True,
+    )
+    return bed
+
+
+def use_lever(api_path, api_key='tools'):
+    """Point LeverClient at `api_path`, e.g. a tools.lever_stub server."""
+    try:
+        import secret
+    except ImportError:
+        secret = sys.modules['secret'] = types.ModuleType('secret')
+    secret.lever_api_path = api_path
+    secret.lever_api_key = api_key
@@ -0,0 +1,151 @@
+"""Synthetic Lever records for benchmarks and local development.
+
+Everything is generated from a seeded `random.Random`, so the same seed always
+produces the same candidates, interviewers and feedback forms. Timestamps are
+relative to import time so that recency filters (e.g. the intern evaluation
+lookback) see fresh data.
+"""
+import time
+import uuid
+
+from feedback_model import ANYTHING_ELSE_TO_KNOW_KEY
+from feedback_model import TEAM_FEEDBACK_KEY
+
+WORDS = (
+    'candidate design system scale cache latency tradeoff communicated clearly '
+    'tests edge cases queue database shard replica team ownership collaborate '
+    'mentor debugging api interface complexity algorithm graph tree hash '
+    'distributed consistency availability partition pushed back hint struggled '
+    'recovered quickly strong solid weak follow-up questions production oncall'
+).split()
+
+ONSITE_TYPES = [
+    'Phone Screen',
+    'Engineering - Problem Solving',
+    'Engineering - Problem Solving II',
+    'Engineering - System Design',
+    'Engineering - Plays Well With Others',
+    'Engineering - Ownership',
+    'Engineering - Lunch',
+]
+RATINGS = [
+    u'1 - Strong No Hire',
+    u'2 - No Hire',
+    u'3 - Hire',
+    u'4 - Strong Hire',
+]
+INTERN_METRICS = [
+    'Technical Ability - how well did they write and ship code',
+    'Learning - how quickly did they ramp up',
+    'Communication - how well did they share progress',
+    'Ownership - did they drive their project',
+]
+DAY_MS = 24 * 60 * 60 * 1000
+NOW_MS = int(time.time()) * 1000
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def _sentence(rng, words):
+    return u' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + u'.'
+
+
+def _paragraph(rng, sentences):
+    return u' '.join(_sentence(rng, rng.randint(6, 18)) for _ in range(sentences))
+
+
+def make_user(rng, user_id=None):
+    first = rng.choice(['Ada', 'Grace', 'Alan', 'Edsger', 'Barbara', 'Ken', 'Radia'])
+    last = rng.choice(['Lovelace', 'Hopper', 'Turing', 'Dijkstra', 'Liskov', 'Thompson'])
+    return dict(
+        id=user_id or _uuid(rng),
+        name=u'%s %s' % (first, last),
+        email='%s.%s@yelp.com' % (first.lower(), last.lower()),
+        accessRole='interviewer',
+    )
+
+
+def make_candidate(rng, candidate_id=None, posting_ids=()):
+    created_at = NOW_MS - rng.randint(10, 400) * DAY_MS
+    last_interaction_at = created_at + rng.randint(1, 9) * DAY_MS
+    return dict(
+        id=candidate_id or _uuid(rng),
+        name=u'%s %s' % (
+            rng.choice(['Sam', 'Alex', 'Jordan', 'Riley', 'Casey']),
+            rng.choice(['Smith', 'Lee', 'Garcia', 'Nguyen', 'Patel']),
+        ),
+        headline=_sentence(rng, 5),
+        createdAt=created_at,
+        lastInteractionAt=last_interaction_at,
+        updatedAt=last_interaction_at,
+        postings=list(posting_ids),
+    )
+
+
+def make_onsite_feedback(rng, user_id, completed_at, paragraphs=3, legacy_team_field=None):
+    if legacy_team_field is None:
+        legacy_team_field = rng.random() < 0.3
+    fields = [
+        dict(text=u'Interview notes', value=_paragraph(rng, paragraphs)),
+        dict(text=u'Rating', value=rng.choice(RATINGS)),
+        dict(text=u'What went well?', value=_paragraph(rng, 2)),
+        dict(text=u'What could have gone better?', value=_paragraph(rng, 2)),
+    ]
+    if legacy_team_field:
+        fields.append(dict(text=u'Team Suggestions', value=_sentence(rng, 4)))
+    else:
+        fields.append(dict(text=TEAM_FEEDBACK_KEY, value=_paragraph(rng, 1)))
+    fields.append(dict(text=ANYTHING_ELSE_TO_KNOW_KEY, value=_sentence(rng, 8)))
+    return dict(
+        id=_uuid(rng),
+        type='interview',
+        text=rng.choice(ONSITE_TYPES),
+        user=user_id,
+        createdAt=completed_at - DAY_MS,
+        completedAt=completed_at,
+        updatedAt=completed_at,
+        fields=fields,
+    )
+
+
+def make_intern_feedback(rng, user_id, completed_at, form_version=None):
+    """Intern evaluation in either the v1 (one notes field) or v2 form."""
+    if form_version is None:
+        form_version = rng.choice([1, 2])
+    fields = []
+    for metric in INTERN_METRICS:
+        fields.append(dict(text=metric, value=rng.choice(RATINGS)))
+        if form_version == 2:
+            fields.append(dict(text=u'Notes - %s' % metric.split(' - ')[0], value=_paragraph(rng, 1)))
+    fields.append(dict(text=u'Overall Score', value=rng.choice(RATINGS)))
+    if form_version == 1:
+        fields.append(dict(text=u'Notes', value=_paragraph(rng, 3)))
+    return dict(
+        id=_uuid(rng),
+        type='interview',
+        text=u'Intern Evaluations - Summer',
+        user=user_id,
+        createdAt=completed_at - DAY_MS,
+        completedAt=completed_at,
+        updatedAt=completed_at,
+        fields=fields,
+    )
+
+
+def make_feedback_history(rng, user_ids, onsite=6, intern=0, pending=1):
+    """A candidate's feedback, in no particular order, including pending forms."""
+    feedbacks = []
+    for _ in range(onsite):
+        completed_at = NOW_MS - rng.randint(1, 120) * DAY_MS
+        feedbacks.append(make_onsite_feedback(rng, rng.choice(user_ids), completed_at))
+    for _ in range(intern):
+        completed_at = NOW_MS - rng.randint(1, 300) * DAY_MS
+        feedbacks.append(make_intern_feedback(rng, rng.choice(user_ids), completed_at))
+    for _ in range(pending):
+        feedback = make_onsite_feedback(rng, rng.choice(user_ids), NOW_MS)
+        feedback['completedAt'] = None
+        feedbacks.append(feedback)
+    rng.shuffle(feedbacks)
+    return feedbacks
@@ -0,0 +1,296 @@
+"""Local stand-in for the Lever API, serving synthetic data.
+
+Serves the endpoints LeverClient uses, with Lever's `hasNext`/`next` pagination,
+configurable latency and page size, and counters for requests and bytes sent:
+
+    GET /candidates?posting_id=...     GET /users/<id>
+    GET /candidates?updated_at_start=...
+    GET /candidates/<id>               GET /postings?team=...
+    GET /candidates/<id>/feedback      GET /postings/<id>
+
+Responses carry an ETag, and a GET whose If-None-Match matches gets an empty
+304 instead of the body.
+
+GET /__stats returns the counters as JSON and POST /__reset clears them.
+
+    python -m tools.lever_stub --port 8081 --latency-ms 80 --page-size 5
+
+then point `secret.lever_api_path` at http://localhost:8081.
+"""
+import argparse
+import BaseHTTPServer
+import hashlib
+import json
+import random
+import re
+import SocketServer
+import threading
+import time
+import urlparse
+
+from tools import lever_fixtures
+
+DEFAULT_PAGE_SIZE = 100
+
+
+class LeverDataset(object):
+    """A seeded, self-consistent set of postings, candidates, users and feedback."""
+
+    def __init__(
+        self,
+        seed=0,
+        candidates=50,
+        interns=20,
+        users=30,
+        postings=5,
+        onsite_per_candidate=8,
+        evals_per_intern=6,
+        team='Engineering',
+    ):
+        rng = random.Random(seed)
+        self.users = {}
+        for _ in range(users):
+            user = lever_fixtures.make_user(rng)
+            self.users[user['id']] = user
+        user_ids = sorted(self.users)
+
+        self.postings = {}
+        for index in range(postings):
+            posting_id = lever_fixtures._uuid(rng)
+            self.postings[posting_id] = dict(
+                id=posting_id,
+                text=u'Software Engineer %d' % (index + 1,),
+                categories=dict(team=team),
+                owner=rng.choice(user_ids),
+            )
+        posting_ids = sorted(self.postings)
+
+        self.candidates = {}
+        self.feedback = {}
+        for index in range(candidates + interns):
+            is_intern = index >= candidates
+            candidate = lever_fixtures.make_candidate(
+                rng,
+                posting_ids=[rng.choice(posting_ids)],
+            )
+            self.candidates[candidate['id']] = candidate
+            self.feedback[candidate['id']] = lever_fixtures.make_feedback_history(
+                rng,
+                user_ids,
+                onsite=0 if is_intern else onsite_per_candidate,
+                intern=evals_per_intern if is_intern else 0,
+            )
+        self.candidate_ids = sorted(
+            candidate_id
+            for candidate_id in self.candidates
+            if not self._is_intern(candidate_id)
+        )
+        self.intern_ids = sorted(
+            candidate_id
+            for candidate_id in self.candidates
+            if self._is_intern(candidate_id)
+        )
+
+    def _is_intern(self, candidate_id):
+        return any(
+            feedback['text'].startswith('Intern Evaluations')
+            for feedback in self.feedback[candidate_id]
+        )
+
+
+class LeverStub(object):
+    """Routes Lever API paths to a LeverDataset and keeps traffic counters."""
+
+    def __init__(self, dataset, latency_ms=0, jitter_ms=0, page_size=DEFAULT_PAGE_SIZE):
+        self.dataset = dataset
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+            self.bytes_sent = 0
+            self.not_modified = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                requests=dict(self.requests),
+                total_requests=sum(self.requests.itervalues()),
+                bytes_sent=self.bytes_sent,
+                not_modified=self.not_modified,
+            )
+
+    def _record(self, endpoint, size, not_modified=False):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes_sent += size
+            if not_modified:
+                self.not_modified += 1
+
+    def _page(self, items, params):
+        offset = int(params.get('offset', 0) or 0)
+        # page_size caps `limit`, the way Lever caps it at 100.
+        limit = min(int(params.get('limit', self.page_size) or self.page_size), self.page_size)
+        page = items[offset:offset + limit]
+        body = dict(data=page, hasNext=offset + limit < len(items))
+        if body['hasNext']:
+            body['next'] = str(offset + limit)
+        return body
+
+    def route(self, path, params):
+        """Return (endpoint, status, body) for a GET."""
+        dataset = self.dataset
+        match = re.match(r'^/candidates/([^/]+)/feedback$', path)
+        if match:
+            feedback = dataset.feedback.get(match.group(1))
+            if feedback is None:
+                return 'candidate_feedback', 404, dict(code='ResourceNotFound')
+            return 'candidate_feedback', 200, self._page(feedback, params)
+        match = re.match(r'^/candidates/([^/]+)$', path)
+        if match:
+            candidate = dataset.candidates.get(match.group(1))
+            if candidate is None:
+                return 'candidate', 404, dict(code='ResourceNotFound')
+            return 'candidate', 200, dict(data=candidate)
+        if path == '/candidates':
+            posting_id = params.get('posting_id')
+            updated_at_start = int(params.get('updated_at_start', 0) or 0)
+            candidates = [
+                dataset.candidates[candidate_id]
+                for candidate_id in sorted(dataset.candidates)
+                if (
+                    posting_id is None
+                    or posting_id in dataset.candidates[candidate_id]['postings']
+                )
+                and dataset.candidates[candidate_id]['updatedAt'] >= updated_at_start
+            ]
+            return 'candidates', 200, self._page(candidates, params)
+        match = re.match(r'^/users/([^/]+)$', path)
+        if match:
+            user = dataset.users.get(match.group(1))
+            if user is None:
+                return 'user', 404, dict(code='ResourceNotFound')
+            return 'user', 200, dict(data=user)
+        match = re.match(r'^/postings/([^/]+)$', path)
+        if match:
+            posting = dataset.postings.get(match.group(1))
+            if posting is None:
+                return 'posting', 404, dict(code='ResourceNotFound')
+            return 'posting', 200, dict(data=posting)
+        if path == '/postings':
+            team = params.get('team')
+            postings = [
+                dataset.postings[pid]
+                for pid in sorted(dataset.postings)
+                if team is None
+                or dataset.postings[pid]['categories']['team'] == team
+            ]
+            return 'postings', 200, self._page(postings, params)
+        return 'unknown', 404, dict(code='ResourceNotFound')
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            jitter = random.uniform(-self.jitter_ms, self.jitter_ms)
+            time.sleep(max(0, self.latency_ms + jitter) / 1000.0)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body)
+        headers = dict(headers or {})
+        if status == 200:
+            headers['ETag'] = '"%s"' % (hashlib.sha1(payload).hexdigest(),)
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                status = 304
+                payload = ''
+        self.send_response(status)
+        if payload:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.iteritems():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        return status, len(payload)
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlparse.urlparse(self.path)
+        if url.path == '/__stats':
+            self._send(200, stub.stats())
+            return
+        params = dict(urlparse.parse_qsl(url.query))
+        endpoint, status, body = stub.route(url.path, params)
+        stub.delay()
+        status, size = self._send(status, body)
+        stub._record(endpoint, size, not_modified=status == 304)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path == '/__reset':
+            self.server.stub.reset()
+            self._send(200, {})
+            return
+        self._send(404, dict(code='ResourceNotFound'))
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(stub, host='127.0.0.1', port=0):
+    """Start serving `stub` on a background thread. Returns the server.
+
+    The base URL is `'http://%s:%d' % server.server_address`.
+    """
+    server = _Server((host, port), _Handler)
+    server.stub = stub
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    dataset = LeverDataset(seed=args.seed)
+    stub = LeverStub(
+        dataset,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        page_size=args.page_size,
+    )
+    server = serve(stub, args.host, args.port)
+    print 'Lever stub on http://%s:%d' % server.server_address
+    print 'candidates: %s' % ', '.join(dataset.candidate_ids[:3])
+    print 'interns:    %s' % ', '.join(dataset.intern_ids[:3])
+    print 'postings:   %s' % ', '.join(sorted(dataset.postings)[:3])
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Profile what importing the app costs, the way an instance cold start does.
+
+Runs appengine_config with PROFILE_IMPORTS on, imports main, and prints the
+slowest imports by their own time. App Engine SDK modules loaded by the
+testbed before appengine_config are not counted.
+
+    python -m tools.profile_imports [--limit 25]
+"""
+import argparse
+import importlib
+import os
+
+from tools import gae_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--limit', type=int, default=25)
+    args = parser.parse_args()
+
+    os.environ['PROFILE_IMPORTS'] = 'true'
+    gae_env.activate()
+    from util import import_profile
+    importlib.import_module('main')
+
+    profile = import_profile.report(args.limit)
+    print '%d imports took %.1fms of a %.1fms start-up' % (
+        profile['imports'], profile['import_ms'], profile['startup_ms'])
+    for step in profile['steps']:
+        print '%-40s %8.1fms' % (step['step'], step['ms'])
+    print
+    print '%-40s %10s %10s' % ('module', 'self ms', 'total ms')
+    for entry in profile['slowest']:
+        print '%-40s %10.1f %10.1f' % (entry['module'], entry['self_ms'], entry['total_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Who is making a request, and what they're allowed to see.
+
+`current_principal()` works out the signed-in user and their role once per
+request and keeps the answer on `flask.g`. Views are guarded with
+`require(role)`. Roles rank USER < COMPANY < ADMIN; the `Policy` decides
+who gets which.
+
+When the app has a secret key, the principal is also kept in Flask's signed
+session cookie for `session_ttl` seconds, so clients making many calls,
+like exports, skip the admin lookup between them. The cached principal is
+only used while App Engine still reports the same signed-in user, so
+signing out or switching accounts takes effect at once.
+"""
+import collections
+import time
+from functools import wraps
+
+import flask
+from google.appengine.api import users
+
+USER = 'user'
+COMPANY = 'company'
+ADMIN = 'admin'
+_ROLE_RANKS = {USER: 1, COMPANY: 2, ADMIN: 3}
+
+SESSION_KEY = 'principal'
+
+Principal = collections.namedtuple('Principal', ['email', 'role'])
+
+
+class Policy(object):
+    """Signed-in users at one of `domains` are COMPANY, App Engine admins
+    among them ADMIN, and everyone else USER.
+    """
+
+    def __init__(self, domains=('yelp.com',), session_ttl=5 * 60):
+        self.domains = frozenset(domain.lower() for domain in domains)
+        self.session_ttl = session_ttl
+
+    def role(self, email, is_admin):
+        if email.rsplit('@', 1)[-1].lower() not in self.domains:
+            return USER
+        return ADMIN if is_admin else COMPANY
+
+
+policy = Policy()
+
+
+def configure(new_policy):
+    global policy
+    policy = new_policy
+
+
+def _session_enabled():
+    return bool(policy.session_ttl and flask.current_app.secret_key)
+
+
+def _from_session(email):
+    if not _session_enabled():
+        return None
+    cached = flask.session.get(SESSION_KEY)
+    if not cached or cached.get('expires', 0) < time.time():
+        return None
+    if cached.get('email') != email:
+        return None
+    return Principal(cached['email'], cached['role'])
+
+
+def _to_session(principal):
+    if _session_enabled():
+        flask.session[SESSION_KEY] = dict(
+            email=principal.email,
+            role=principal.role,
+            expires=time.time() + policy.session_ttl,
+        )
+
+
+def _resolve():
+    user = users.get_current_user()
+    if user is None:
+        return None
+    email = user.email()
+    principal = _from_session(email)
+    if principal is not None:
+        return principal
+    principal = Principal(email, policy.role(email, users.is_current_user_admin()))
+    _to_session(principal)
+    return principal
+
+
+def current_principal():
+    """The requesting user as a Principal, or None if they aren't signed in."""
+    if not hasattr(flask.g, 'principal'):
+        flask.g.principal = _resolve()
+    return flask.g.principal
+
+
+def require(role):
+    """Decorate a view so only principals of at least `role` can use it.
+
+    Signed-out users are sent to sign in; signed-in ones below `role` get a
+    403 with a link to sign in as someone else.
+    """
+    def decorator(view):
+        @wraps(view)
+        def guarded(*args, **kwargs):
+            principal = current_principal()
+            if principal is None:
+                return flask.redirect(users.create_login_url(flask.request.url))
+            if _ROLE_RANKS[principal.role] < _ROLE_RANKS[role]:
+                return _forbidden(principal)
+            return view(*args, **kwargs)
+        return guarded
+    return decorator
+
+
+def _forbidden(principal):
+    switch_url = users.create_logout_url(users.create_login_url(flask.request.url))
+    return flask.Markup(
+        'Sorry, {} can\'t see this page. <a href="{}">Sign in as someone else</a>.'
+    ).format(principal.email, switch_url), 403
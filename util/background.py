@@ -0,0 +1,113 @@
+"""Deduplicated background jobs, on App Engine push queues or in-process.
+
+Jobs are keyed (e.g. by candidate ID). A burst of jobs for the same key runs
+once: a push queue gets one named task per key per dedupe window, set to run
+when the window closes, and the local queue drops a key that's already
+waiting.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import Queue
+
+from google.appengine.api import taskqueue
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_WINDOW_SECONDS = 30
+
+
+class PushQueue(object):
+    """A named App Engine push queue that POSTs each job's params to `url`.
+
+    Worker concurrency is bounded by the queue's max_concurrent_requests in
+    queue.yaml.
+    """
+
+    def __init__(self, queue_name, url, dedupe_window=DEDUPE_WINDOW_SECONDS):
+        self.queue_name = queue_name
+        self.url = url
+        self.dedupe_window = dedupe_window
+
+    def add(self, key, params):
+        """Enqueue a job, returning False if one for `key` is already queued."""
+        now = time.time()
+        window = int(now // self.dedupe_window)
+        name = re.sub(r'[^a-zA-Z0-9_-]', '-', '%s-%s' % (key, window))
+        try:
+            taskqueue.add(
+                queue_name=self.queue_name,
+                url=self.url,
+                params=params,
+                name=name,
+                # Run once the window closes so the whole burst is covered.
+                countdown=(window + 1) * self.dedupe_window - now,
+            )
+        except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+            return False
+        return True
+
+
+class LocalQueue(object):
+    """In-process stand-in for a push queue, for development and tests.
+
+    `handler(**params)` runs on at most `max_workers` threads.
+    """
+
+    def __init__(self, handler, max_workers=2):
+        self.handler = handler
+        self.max_workers = max_workers
+        self._pending = {}
+        self._work = Queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = 0
+
+    def add(self, key, params):
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = params
+            self._work.put(key)
+            if self._workers < self.max_workers:
+                self._workers += 1
+                worker = threading.Thread(target=self._run)
+                worker.daemon = True
+                worker.start()
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                try:
+                    key = self._work.get_nowait()
+                except Queue.Empty:
+                    self._workers -= 1
+                    return
+                params = self._pending.pop(key)
+            try:
+                self.handler(**params)
+            except Exception:
+                logger.exception('background job %s failed', key)
+            finally:
+                self._work.task_done()
+
+    def join(self):
+        """Block until every queued job has run."""
+        self._work.join()
+
+
+def running_on_app_engine():
+    """True in production and dev_appserver, False under a bare testbed."""
+    server = os.environ.get('SERVER_SOFTWARE', '')
+    if 'testbed' in server:
+        return False
+    return server.startswith('Google App Engine') or server.startswith('Development')
+
+
+def make_queue(queue_name, url, handler, max_local_workers=2):
+    """A PushQueue on App Engine (including dev_appserver), else a LocalQueue."""
+    if running_on_app_engine():
+        return PushQueue(queue_name, url)
+    return LocalQueue(handler, max_workers=max_local_workers)
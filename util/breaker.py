@@ -0,0 +1,64 @@
+"""Circuit breakers, so calls to a failing upstream fail fast."""
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    """Trips after `failure_threshold` consecutive failures.
+
+    While open, `allow` refuses calls for `reset_timeout` seconds. After that
+    one trial call is let through: success closes the breaker again, failure
+    re-opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if (
+                not self._trial_in_flight
+                and time.time() - self._opened_at >= self.reset_timeout
+            ):
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self._opened_at = time.time()
+            self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._trial_in_flight:
+                return 'half-open'
+            return 'open'
+
+    def stats(self):
+        return dict(
+            state=self.state,
+            failures=self.failures,
+            rejected=self.rejected,
+        )
@@ -0,0 +1,318 @@
+import collections
+import logging
+import threading
+import time
+
+from google.appengine.api import memcache
+
+from util import concurrency
+from util import tracing
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class NegativeEntry(object):
+    """Cached record of a failed load, so it isn't retried on every request."""
+
+    def __init__(self, error_type, message):
+        self.error_type = error_type
+        self.message = message
+
+
+class CachedFailure(LookupError):
+    """Raised for a key whose last load failed within the negative TTL.
+
+    `error_type` is the name of the exception that load raised.
+    """
+
+    def __init__(self, message, error_type):
+        super(CachedFailure, self).__init__(message)
+        self.error_type = error_type
+
+
+class LRUCache(object):
+    """Thread-safe in-process cache bounded by size and entry age.
+
+    Expired entries stay around until they're evicted, so `get_stale` can
+    still return them when fresh data can't be had.
+    """
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            # Re-insert to mark the key as most recently used.
+            self._entries[key] = entry
+            value, expires_at = entry
+            if expires_at < time.time():
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def get_stale(self, key, default=None):
+        """Return the value for `key` even if it has expired."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING or isinstance(entry[0], NegativeEntry):
+            return default
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires_at)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return dict(
+            size=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.fresh = False
+        self.error = None
+
+
+class TieredCache(object):
+    """Instance-local LRU in front of memcache, in front of a loader.
+
+    Concurrent misses for the same key within an instance are coalesced: the
+    first caller runs `loader` and everyone else waiting on that key gets its
+    result, so a cold user ID costs one Lever call no matter how many requests
+    want it at once.
+
+    When a load fails, a copy that has expired locally is served instead, if
+    there is one. Otherwise, with `negative_ttl`, the failure itself is
+    cached for that long: `get` raises CachedFailure and `get_multi` leaves
+    the key out, without calling the loader again.
+    """
+
+    def __init__(
+        self,
+        namespace,
+        loader,
+        max_size=1000,
+        local_ttl=300,
+        memcache_ttl=60 * 60,
+        max_workers=concurrency.DEFAULT_MAX_WORKERS,
+        negative_ttl=None,
+    ):
+        self.namespace = namespace
+        self.negative_ttl = negative_ttl
+        self.key_prefix = namespace + ':'
+        self.loader = loader
+        self.memcache_ttl = memcache_ttl
+        self.max_workers = max_workers
+        self.local = LRUCache(max_size=max_size, ttl=local_ttl)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.memcache_hits = 0
+        self.memcache_misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.stale_served = 0
+
+    def _load(self, key, store_remote=True):
+        """Return (value, fresh) for `key`, running `loader` at most once at a time.
+
+        `fresh` is False when the load failed and a stale copy came back
+        instead; those must not be written to memcache.
+        """
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, flight.fresh
+
+        try:
+            self.loads += 1
+            flight.value = self.loader(key)
+            flight.fresh = True
+            self.local.set(key, flight.value)
+            if store_remote:
+                memcache.set(self.key_prefix + key, flight.value, self.memcache_ttl)
+            return flight.value, True
+        except Exception as e:
+            self.failures += 1
+            flight.value = self._on_failure(key, e)
+            if flight.value is _MISSING:
+                flight.error = e
+                raise
+            return flight.value, False
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _on_failure(self, key, error):
+        """Return a stale value for `key`, or _MISSING after caching the error."""
+        stale = self.local.get_stale(key, _MISSING)
+        if stale is not _MISSING:
+            logger.warning('serving stale %s %s: %s', self.namespace, key, error)
+            self.stale_served += 1
+            if self.negative_ttl:
+                self.local.set(key, stale, ttl=self.negative_ttl)
+            return stale
+        if self.negative_ttl:
+            entry = NegativeEntry(type(error).__name__, str(error))
+            self.local.set(key, entry, ttl=self.negative_ttl)
+            memcache.set(self.key_prefix + key, entry, self.negative_ttl)
+        return _MISSING
+
+    def _remember(self, key, value):
+        """Keep a value read from memcache locally, failures only briefly."""
+        if isinstance(value, NegativeEntry):
+            self.local.set(key, value, ttl=self.negative_ttl)
+        else:
+            self.local.set(key, value)
+
+    def _checked(self, key, value):
+        if isinstance(value, NegativeEntry):
+            raise CachedFailure(
+                '%s %s: %s' % (self.namespace, key, value.message),
+                value.error_type,
+            )
+        return value
+
+    def get(self, key):
+        with tracing.span('cache', self.namespace) as span:
+            value = self.local.get(key, _MISSING)
+            if value is not _MISSING:
+                span['hits'] = 1
+                return self._checked(key, value)
+            value = memcache.get(self.key_prefix + key)
+            if value is not None:
+                span['hits'] = 1
+                self.memcache_hits += 1
+                self._remember(key, value)
+                return self._checked(key, value)
+            span['misses'] = 1
+            self.memcache_misses += 1
+            value, _ = self._load(key)
+            return value
+
+    def get_multi(self, keys):
+        """Return a dict of key -> value, leaving out keys that failed to load.
+
+        Keys missing locally are read with one memcache.get_multi, the
+        remaining misses are loaded concurrently and written back with one
+        memcache.set_multi. Stale copies served for failed loads are only
+        kept locally.
+        """
+        keys = set(keys)
+        with tracing.span('cache', self.namespace) as span:
+            found, missing = self._get_multi(keys)
+            span['hits'] = len(keys) - missing
+            span['misses'] = missing
+            return dict(
+                (key, value)
+                for key, value in found.iteritems()
+                if not isinstance(value, NegativeEntry)
+            )
+
+    def _get_multi(self, keys):
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key, _MISSING)
+            if value is _MISSING:
+                remote_keys.append(key)
+            else:
+                found[key] = value
+        if not remote_keys:
+            return found, 0
+
+        remote = memcache.get_multi(remote_keys, key_prefix=self.key_prefix)
+        self.memcache_hits += len(remote)
+        for key, value in remote.iteritems():
+            self._remember(key, value)
+        found.update(remote)
+
+        missing = [key for key in remote_keys if key not in remote]
+        self.memcache_misses += len(missing)
+
+        def load(key):
+            try:
+                return self._load(key, store_remote=False)
+            except Exception:
+                logger.exception('error loading %s %s', self.namespace, key)
+                return _MISSING, False
+
+        loaded = {}
+        results = concurrency.bounded_map(load, missing, max_workers=self.max_workers)
+        for key, (value, fresh) in zip(missing, results):
+            if value is _MISSING:
+                continue
+            found[key] = value
+            if fresh:
+                loaded[key] = value
+        if loaded:
+            memcache.set_multi(
+                loaded,
+                self.memcache_ttl,
+                key_prefix=self.key_prefix,
+            )
+        return found, len(missing)
+
+    def invalidate(self, key):
+        self.local.delete(key)
+        memcache.delete(self.key_prefix + key)
+
+    def stats(self):
+        stats = dict(
+            ('local_' + name, value)
+            for name, value in self.local.stats().iteritems()
+        )
+        stats.update(
+            memcache_hits=self.memcache_hits,
+            memcache_misses=self.memcache_misses,
+            loads=self.loads,
+            coalesced=self.coalesced,
+            failures=self.failures,
+            stale_served=self.stale_served,
+        )
+        return stats
@@ -0,0 +1,223 @@
+import collections
+import logging
+import sys
+import threading
+import Queue
+
+from util import ratelimit
+from util import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def _carry_trace(func):
+    """Wrap a thread target so it keeps the caller's trace and rate limit lane."""
+    trace = tracing.current()
+    lane = ratelimit.current_lane()
+
+    def run(*args, **kwargs):
+        tracing.activate(trace)
+        ratelimit.set_lane(lane)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            tracing.deactivate()
+    return run
+
+
+def bounded_map(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """Call `func` on every item using at most `max_workers` threads.
+
+    Results come back in the same order as `items`. If any call raises, the
+    first exception is re-raised once every worker has finished.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if len(items) == 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    errors = []
+    work = Queue.Queue()
+    for index, item in enumerate(items):
+        work.put((index, item))
+
+    def worker():
+        while True:
+            try:
+                index, item = work.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[index] = func(item)
+            except Exception as e:
+                logger.exception('bounded_map worker failed on %r', item)
+                errors.append(e)
+
+    threads = [
+        threading.Thread(target=_carry_trace(worker))
+        for _ in range(min(max_workers, len(items)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def imap_unordered(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """Call `func` on every item, yielding (item, result, error) as each finishes.
+
+    `error` is None on success and `result` is None on failure. If the caller
+    stops iterating, workers finish the calls in progress and stop picking up
+    new items.
+    """
+    items = list(items)
+    work = Queue.Queue()
+    for item in items:
+        work.put(item)
+    finished = Queue.Queue()
+    stopped = threading.Event()
+
+    def worker():
+        while not stopped.is_set():
+            try:
+                item = work.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                finished.put((item, func(item), None))
+            except Exception as e:
+                logger.exception('imap_unordered worker failed on %r', item)
+                finished.put((item, None, e))
+
+    for _ in range(min(max_workers, len(items))):
+        thread = threading.Thread(target=_carry_trace(worker))
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for _ in items:
+            yield finished.get()
+    finally:
+        stopped.set()
+
+
+def imap(func, items, max_workers=DEFAULT_MAX_WORKERS, window=None):
+    """Like imap_unordered, but yields (item, result, error) in input order.
+
+    `items` is consumed lazily and at most `window` (default twice
+    `max_workers`) items are running or waiting to be yielded, so memory stays
+    flat however many items there are.
+    """
+    window = window or 2 * max_workers
+    slots = threading.BoundedSemaphore(max_workers)
+
+    def run(item):
+        with slots:
+            return func(item)
+
+    def finish(item, task):
+        try:
+            return item, task.result(), None
+        except Exception as e:
+            logger.exception('imap worker failed on %r', item)
+            return item, None, e
+
+    pending = collections.deque()
+    for item in items:
+        pending.append((item, spawn(run, item)))
+        if len(pending) >= window:
+            yield finish(*pending.popleft())
+    while pending:
+        yield finish(*pending.popleft())
+
+
+class Task(object):
+    """A function call running on its own thread."""
+
+    def __init__(self, func, args=(), kwargs=None):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._thread = threading.Thread(
+            target=_carry_trace(self._run),
+            args=(func, args, kwargs or {}),
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, func, args, kwargs):
+        try:
+            self._result = func(*args, **kwargs)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        finally:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the call and return its value, re-raising its exception."""
+        if not self._done.wait(timeout):
+            raise RuntimeError('task did not finish within %ss' % (timeout,))
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+class _Finished(object):
+    """A Task stand-in for a value that's already known."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def done(self):
+        return True
+
+    def result(self, timeout=None):
+        return self._value
+
+
+def spawn(func, *args, **kwargs):
+    return Task(func, args, kwargs)
+
+
+class FetchPlan(object):
+    """Request-scoped set of named fetches that run concurrently.
+
+    Each fetch starts as soon as the fetches it depends on have finished, so
+    the total wait is the longest dependency chain rather than the sum of all
+    the calls.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    def __contains__(self, name):
+        return name in self._tasks
+
+    def start(self, name, func, *args, **kwargs):
+        self._tasks[name] = spawn(func, *args, **kwargs)
+        return self._tasks[name]
+
+    def provide(self, name, value):
+        """Add a result that needs no fetching, e.g. one read from a local store."""
+        self._tasks[name] = _Finished(value)
+        return self._tasks[name]
+
+    def after(self, name, dependencies, func):
+        """Start `func` with the results of `dependencies` once they're done."""
+        def run():
+            return func(*[self.result(dependency) for dependency in dependencies])
+        return self.start(name, run)
+
+    def result(self, name, timeout=None):
+        return self._tasks[name].result(timeout)
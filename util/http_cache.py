@@ -0,0 +1,60 @@
+"""Cached HTTP bodies kept with their validators, for conditional GETs.
+
+A client looks up the entry for a URL, sends `conditional_headers(entry)`
+with its request, and on a 304 reuses `entry['data']`, already parsed,
+instead of downloading and decoding the body again.
+"""
+import logging
+
+from google.appengine.api import memcache
+
+logger = logging.getLogger(__name__)
+
+VALIDATED_TTL = 60 * 60 * 24 * 7
+
+
+def conditional_headers(entry):
+    if entry is None:
+        return {}
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+class ValidatedCache(object):
+    """Memcache of parsed response bodies with their ETag and Last-Modified."""
+
+    def __init__(self, namespace, ttl=VALIDATED_TTL):
+        self.key_prefix = namespace + ':'
+        self.ttl = ttl
+        self.revalidated = 0
+        self.replaced = 0
+
+    def get(self, url):
+        return memcache.get(self.key_prefix + url)
+
+    def store(self, url, headers, data):
+        """Keep `data` if the response had validators to revalidate it with."""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        self.replaced += 1
+        self._set(url, dict(etag=etag, last_modified=last_modified, data=data))
+
+    def refresh(self, url, entry):
+        """Record a 304: the entry is still current, so restart its TTL."""
+        self.revalidated += 1
+        self._set(url, entry)
+
+    def _set(self, url, entry):
+        try:
+            memcache.set(self.key_prefix + url, entry, self.ttl)
+        except ValueError:
+            logger.warning('%s too large to keep for revalidation', url)
+
+    def stats(self):
+        return dict(revalidated=self.revalidated, replaced=self.replaced)
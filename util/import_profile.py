@@ -0,0 +1,103 @@
+"""Import-time profiling, to see what an instance cold start spends its time on.
+
+`install()` wraps `__import__` so every import that loads something new is
+timed. Each record has the module's own time and its total including the
+imports it triggered, so the top of `report()` names the modules worth
+loading lazily. appengine_config installs it when PROFILE_IMPORTS is set,
+before anything else is imported; main logs the report and uninstalls it
+once it has loaded, and /debug/stats includes the report.
+"""
+import __builtin__
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_original_import = None
+_local = threading.local()
+_records = []
+_steps = []
+_started = None
+_stopped = None
+
+
+def active():
+    return _original_import is not None
+
+
+def _timed_import(name, *args, **kwargs):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    loaded = len(sys.modules)
+    stack.append(0.0)
+    start = time.time()
+    try:
+        return _original_import(name, *args, **kwargs)
+    finally:
+        total = time.time() - start
+        children = stack.pop()
+        if stack:
+            stack[-1] += total
+        if len(sys.modules) > loaded:
+            _records.append((name, (total - children) * 1000, total * 1000))
+
+
+def install():
+    global _original_import, _started
+    if _original_import is None:
+        _started = time.time()
+        _original_import = __builtin__.__import__
+        __builtin__.__import__ = _timed_import
+
+
+def uninstall():
+    global _original_import, _stopped
+    if _original_import is not None:
+        __builtin__.__import__ = _original_import
+        _original_import = None
+        _stopped = time.time()
+
+
+def record(step, ms):
+    """Note a startup step that isn't an import, e.g. setting up sys.path."""
+    _steps.append((step, ms))
+
+
+def report(limit=20):
+    """The `limit` slowest imports by their own time, and startup totals.
+
+    None if profiling was never installed.
+    """
+    if _started is None:
+        return None
+    slowest = sorted(_records, key=lambda record: -record[1])[:limit]
+    return dict(
+        startup_ms=((_stopped or time.time()) - _started) * 1000,
+        imports=len(_records),
+        import_ms=sum(self_ms for _, self_ms, _ in _records),
+        steps=[dict(step=step, ms=ms) for step, ms in _steps],
+        slowest=[
+            dict(module=name, self_ms=self_ms, total_ms=total_ms)
+            for name, self_ms, total_ms in slowest
+        ],
+    )
+
+
+def log_report(limit=20):
+    profile = report(limit)
+    if profile is None:
+        return
+    logger.info(
+        'startup: %d imports took %.1fms of %.1fms',
+        profile['imports'], profile['import_ms'], profile['startup_ms'],
+    )
+    for step in profile['steps']:
+        logger.info('startup step %-30s %8.1fms', step['step'], step['ms'])
+    for entry in profile['slowest']:
+        logger.info(
+            'import %-30s %8.1fms self %8.1fms total',
+            entry['module'], entry['self_ms'], entry['total_ms'],
+        )
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import time
+
+from google.appengine.api import memcache
+
+from util import tracing
+
+logger = logging.getLogger(__name__)
+
+PACKET_CACHE_TTL = 60 * 60 * 24
+# Bump whenever the shape of a compiled packet changes so stale entries from a
+# previous deploy are never served.
+PACKET_FORMAT_VERSION = 2
+# How long an unchanged `lastInteractionAt` alone vouches for a cached packet.
+# Lever doesn't bump it when completed feedback is edited, so after this the
+# feedback revision is checked again.
+STAMP_TRUST_SECONDS = 5 * 60
+
+
+def feedback_revision(feedbacks):
+    """Fingerprint a candidate's feedback by what Lever says changed."""
+    digest = hashlib.sha1()
+    for stamp in sorted(
+        (
+            feedback['id'],
+            feedback.get('completedAt'),
+            feedback.get('updatedAt'),
+        )
+        for feedback in feedbacks
+    ):
+        digest.update(repr(stamp))
+    return digest.hexdigest()
+
+
+def fragment_revision(feedback):
+    """Fingerprint one compiled feedback, for caching its rendered HTML.
+
+    Lever's stamps cover the feedback itself. The interviewer's name is looked
+    up separately, so it's part of the fingerprint too. None for feedback
+    without an ID, which can't be told apart from other feedback.
+    """
+    if feedback.get('id') is None:
+        return None
+    return (
+        feedback['id'],
+        feedback.get('completedAt'),
+        feedback.get('updatedAt'),
+        feedback.get('username'),
+    )
+
+
+class PacketCache(object):
+    """Memcache of compiled packets, keyed by candidate and feedback revision.
+
+    Each entry also remembers the candidate's `lastInteractionAt` when it was
+    stored and when its revision was last checked. While that stamp hasn't
+    moved and the check is recent (`stamp_trusted`), the entry can be served
+    without paginating the feedback again; otherwise the caller re-fetches
+    the feedback and compares revisions before recompiling.
+
+    `variant` keeps packets compiled under different settings apart, e.g.
+    intern packets for different lookback cutoffs.
+    """
+
+    def __init__(self, kind, ttl=PACKET_CACHE_TTL):
+        self.kind = kind
+        self.ttl = ttl
+
+    def _key(self, candidate_id, variant=None):
+        key = 'packet:%s:v%s:%s' % (self.kind, PACKET_FORMAT_VERSION, candidate_id)
+        if variant is not None:
+            key += ':%s' % (variant,)
+        return key
+
+    def get(self, candidate_id, variant=None):
+        """Return the cached entry dict (revision, stamp, packet) or None."""
+        with tracing.span('cache', 'packet-' + self.kind) as span:
+            entry = memcache.get(self._key(candidate_id, variant))
+            span['hits' if entry is not None else 'misses'] = 1
+            return entry
+
+    def set(self, candidate_id, revision, packet, stamp=None, variant=None):
+        entry = dict(
+            revision=revision,
+            stamp=stamp,
+            checked_at=time.time(),
+            packet=packet,
+        )
+        try:
+            memcache.set(self._key(candidate_id, variant), entry, self.ttl)
+        except ValueError:
+            # Packets with very long histories can exceed memcache's value size
+            # limit. Those just don't get cached.
+            logger.warning('packet for %s too large to cache', candidate_id)
+        return entry
+
+    def invalidate(self, candidate_id, variant=None):
+        memcache.delete(self._key(candidate_id, variant))
+
+
+def stamp_trusted(entry, stamp):
+    """Whether `entry` can be served on the strength of `stamp` alone."""
+    return (
+        entry['stamp'] is not None
+        and stamp == entry['stamp']
+        and time.time() - entry.get('checked_at', 0) < STAMP_TRUST_SECONDS
+    )
+
+
+def candidate_stamp(candidate):
+    return candidate.get('lastInteractionAt')
@@ -0,0 +1,189 @@
+"""Client-side rate limiting and adaptive concurrency for one upstream API.
+
+A `Governor` hands out request slots. A slot needs a token from a token
+bucket, which holds the steady request rate, and room under a concurrency
+limit. The limit grows by about one per round of successful requests and
+halves on a 429 (AIMD), and a `Retry-After` pauses every new request until it
+passes.
+
+Waiters are served in lane order, so interactive page loads go ahead of
+queued batch work (webhook precomputation, syncs). Batch requests also only
+get a share of the concurrency limit, which leaves room for an interactive
+request to start straight away.
+"""
+import contextlib
+import email.utils
+import heapq
+import itertools
+import threading
+import time
+
+from util import tracing
+
+INTERACTIVE = 0
+BATCH = 1
+LANE_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+# Used when a 429 comes without a usable Retry-After.
+DEFAULT_RETRY_AFTER = 1.0
+
+_local = threading.local()
+
+
+def current_lane():
+    return getattr(_local, 'lane', INTERACTIVE)
+
+
+def set_lane(lane):
+    _local.lane = lane
+
+
+@contextlib.contextmanager
+def lane(lane):
+    """Run the enclosed block's upstream calls in `lane`.
+
+    util.concurrency carries the lane over to worker threads.
+    """
+    previous = current_lane()
+    set_lane(lane)
+    try:
+        yield
+    finally:
+        set_lane(previous)
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delay or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, email.utils.mktime_tz(parsed) - now)
+
+
+class Slot(object):
+    """Permission to send one request. Set `status` and `retry_after` on it."""
+
+    __slots__ = ('status', 'retry_after')
+
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+
+class Governor(object):
+
+    def __init__(
+        self,
+        rate=10.0,
+        burst=20,
+        initial_limit=8,
+        min_limit=1,
+        max_limit=32,
+        batch_share=0.75,
+    ):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.batch_share = batch_share
+        self.in_flight = 0
+        self.throttled = 0
+        self._tokens = self.burst
+        self._refilled_at = time.time()
+        self._paused_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.burst,
+            self._tokens + (now - self._refilled_at) * self.rate,
+        )
+        self._refilled_at = now
+
+    def _capacity(self, lane):
+        if lane == INTERACTIVE:
+            return int(self.limit)
+        return max(1, int(self.limit * self.batch_share))
+
+    def _wait_time(self, lane, now):
+        """Seconds until `lane` could start, 0 if it can now, None if unknown."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= self._capacity(lane):
+            # Only a release frees this up.
+            return None
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0
+
+    def acquire(self, lane=None):
+        lane = current_lane() if lane is None else lane
+        entry = (lane, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            while True:
+                now = time.time()
+                self._refill(now)
+                wait = self._wait_time(lane, now)
+                if self._waiting[0] == entry and wait == 0:
+                    heapq.heappop(self._waiting)
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    # The next waiter may be able to go too.
+                    self._cond.notify_all()
+                    return
+                if self._waiting[0] != entry:
+                    wait = None
+                self._cond.wait(wait)
+
+    def release(self, status=None, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            if status == 429:
+                self.throttled += 1
+                self.limit = max(self.min_limit, self.limit / 2)
+                if retry_after is None:
+                    retry_after = DEFAULT_RETRY_AFTER
+                self._paused_until = max(self._paused_until, time.time() + retry_after)
+            elif status is not None and status < 500:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, lane=None):
+        """Hold a slot for the enclosed request.
+
+        The wait for it is traced as a 'ratelimit' span named after the lane,
+        which gives queueing delay per request and in /debug/stats.
+        """
+        lane = current_lane() if lane is None else lane
+        with tracing.span('ratelimit', LANE_NAMES.get(lane, str(lane))):
+            self.acquire(lane)
+        slot = Slot()
+        try:
+            yield slot
+        finally:
+            self.release(slot.status, slot.retry_after)
+
+    def stats(self):
+        with self._cond:
+            waiting = dict((name, 0) for name in LANE_NAMES.itervalues())
+            for lane, _ in self._waiting:
+                waiting[LANE_NAMES.get(lane, str(lane))] += 1
+            return dict(
+                limit=round(self.limit, 2),
+                in_flight=self.in_flight,
+                waiting=waiting,
+                throttled=self.throttled,
+                paused_for=round(max(0.0, self._paused_until - time.time()), 2),
+            )
@@ -0,0 +1,82 @@
+"""Jinja bytecode compiled at deploy time, so instances don't compile templates.
+
+`make deploy` runs tools.build_templates, which compiles every template into
+template_cache/ next to the app. Instances load that bytecode instead of
+parsing and compiling the templates on their first requests. Bytecode only
+works for the Jinja and Python versions that wrote it, so each pair gets its
+own directory; an instance that finds none for its versions compiles
+templates as usual.
+"""
+import glob
+import logging
+import os
+import sys
+
+import jinja2
+
+logger = logging.getLogger(__name__)
+
+CACHE_ROOT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'template_cache',
+)
+
+
+def cache_dir():
+    """Where bytecode for the running Jinja and Python versions lives."""
+    return os.path.join(CACHE_ROOT, 'jinja2-%s-py%d.%d' % (
+        jinja2.__version__,
+        sys.version_info[0],
+        sys.version_info[1],
+    ))
+
+
+class DeployedBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Bytecode files keyed by template name alone.
+
+    Jinja keys them by the template's absolute path as well, which differs
+    between the machine building them and the instances. Jinja still checks
+    each file against its template's source, so a template changed since the
+    build is compiled as usual. Unless `writable`, nothing is ever written:
+    instances can't write to their app directory.
+    """
+
+    def __init__(self, directory, writable=False):
+        super(DeployedBytecodeCache, self).__init__(directory)
+        self.writable = writable
+
+    def get_cache_key(self, name, filename=None):
+        return super(DeployedBytecodeCache, self).get_cache_key(name)
+
+    def dump_bytecode(self, bucket):
+        if self.writable:
+            super(DeployedBytecodeCache, self).dump_bytecode(bucket)
+
+
+def install(app):
+    """Load `app`'s templates from deployed bytecode. False if there's none."""
+    directory = cache_dir()
+    if not os.path.isdir(directory):
+        logger.info('no precompiled templates in %s', directory)
+        return False
+    app.jinja_env.bytecode_cache = DeployedBytecodeCache(directory)
+    return True
+
+
+def build(app, directory=None):
+    """Compile all of `app`'s HTML templates into `directory`.
+
+    Must run before `app` has loaded any template. Returns the template
+    names.
+    """
+    directory = directory or cache_dir()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for stale in glob.glob(os.path.join(directory, '*.cache')):
+        os.remove(stale)
+    env = app.jinja_env
+    env.bytecode_cache = DeployedBytecodeCache(directory, writable=True)
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    return names
@@ -0,0 +1,153 @@
+"""Per-request timing of upstream calls, plus process-wide rolling stats.
+
+Code that talks to Lever, memcache or the template engine wraps the work in
+`span(kind, name)`. Each span is added to the current request's `Trace`, if
+one is active on this thread, and to the process-wide `STATS` window.
+util.concurrency carries the active trace over to worker threads, so fan-out
+calls are still attributed to the request that made them.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+SAMPLES_PER_KEY = 1000
+
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+def activate(trace):
+    _local.trace = trace
+
+
+def deactivate():
+    _local.trace = None
+
+
+class Trace(object):
+    """Spans recorded while serving one request."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """Totals per (kind, name): call count, time, errors and cache hits."""
+        totals = collections.OrderedDict()
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            key = '%s:%s' % (span['kind'], span['name'])
+            total = totals.setdefault(key, dict(
+                calls=0,
+                ms=0.0,
+                max_ms=0.0,
+                errors=0,
+            ))
+            total['calls'] += 1
+            total['ms'] += span['ms']
+            total['max_ms'] = max(total['max_ms'], span['ms'])
+            if span.get('error'):
+                total['errors'] += 1
+            for counter in ('hits', 'misses'):
+                if counter in span:
+                    total[counter] = total.get(counter, 0) + span[counter]
+            if 'status' in span:
+                statuses = total.setdefault('statuses', {})
+                statuses[span['status']] = statuses.get(span['status'], 0) + 1
+        for total in totals.itervalues():
+            total['ms'] = round(total['ms'], 1)
+            total['max_ms'] = round(total['max_ms'], 1)
+        return dict(
+            request=self.name,
+            ms=round((time.time() - self.start) * 1000, 1),
+            upstream=totals,
+        )
+
+
+class RollingStats(object):
+    """The last SAMPLES_PER_KEY latencies and hit/miss counts per span key."""
+
+    def __init__(self, samples_per_key=SAMPLES_PER_KEY):
+        self.samples_per_key = samples_per_key
+        self._latencies = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        key = '%s:%s' % (span['kind'], span['name'])
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = collections.deque(
+                    maxlen=self.samples_per_key,
+                )
+            latencies.append(span['ms'])
+            counters = self._counters.setdefault(key, collections.Counter())
+            counters['calls'] += 1
+            if span.get('error'):
+                counters['errors'] += 1
+            for counter in ('hits', 'misses'):
+                if counter in span:
+                    counters[counter] += span[counter]
+
+    def snapshot(self):
+        with self._lock:
+            items = [
+                (key, sorted(latencies), dict(self._counters[key]))
+                for key, latencies in self._latencies.iteritems()
+            ]
+        snapshot = {}
+        for key, latencies, counters in sorted(items):
+            stats = dict(
+                counters,
+                p50_ms=round(_percentile(latencies, 50), 1),
+                p95_ms=round(_percentile(latencies, 95), 1),
+            )
+            lookups = counters.get('hits', 0) + counters.get('misses', 0)
+            if lookups:
+                stats['hit_ratio'] = round(counters.get('hits', 0) / float(lookups), 3)
+            snapshot[key] = stats
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._counters.clear()
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[int(round(pct / 100.0 * (len(ordered) - 1)))]
+
+
+STATS = RollingStats()
+
+
+@contextlib.contextmanager
+def span(kind, name, **details):
+    """Time the enclosed block. Callers can add details to the yielded dict."""
+    record = dict(details, kind=kind, name=name)
+    start = time.time()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['ms'] = (time.time() - start) * 1000
+        trace = current()
+        if trace is not None:
+            trace.add(record)
+        STATS.record(record)
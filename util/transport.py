@@ -0,0 +1,131 @@
+import logging
+import random
+import time
+
+import urllib3
+
+from util import ratelimit
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class PooledTransport(object):
+    """Keep-alive HTTP transport shared by everything talking to one API.
+
+    Connections are pooled per host by a single urllib3 PoolManager, so only
+    the first request to a host pays for the TLS handshake. Requests that fail
+    with a connection error or a 429/5xx are retried with jittered
+    exponential backoff, waiting at least as long as any Retry-After.
+
+    With a `governor` (util.ratelimit.Governor), every attempt waits for a
+    slot from it first and reports its status back.
+    """
+
+    def __init__(
+        self,
+        pool_size=10,
+        num_pools=4,
+        connect_timeout=5.0,
+        read_timeout=30.0,
+        max_retries=3,
+        backoff_base=0.25,
+        backoff_cap=8.0,
+        governor=None,
+    ):
+        self.governor = governor
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.pool = urllib3.PoolManager(
+            num_pools=num_pools,
+            maxsize=pool_size,
+            timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout),
+            retries=False,
+        )
+
+    def backoff(self, attempt):
+        # "Full jitter": sleep anywhere between zero and the exponential cap so
+        # that clients which failed together don't retry together.
+        ceiling = min(self.backoff_cap, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def request(self, method, url, fields=None, body=None, headers=None, retry=None):
+        """Issue a request, returning the urllib3 response.
+
+        `retry` defaults to True for idempotent methods only; pass it
+        explicitly for requests the server dedupes.
+        """
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = self._send(method, url, fields, body, headers)
+            except urllib3.exceptions.HTTPError:
+                if not retry or attempt >= self.max_retries:
+                    raise
+                logger.warning('%s %s failed, retrying', method, url, exc_info=True)
+            else:
+                retry_after = ratelimit.parse_retry_after(
+                    response.headers.get('Retry-After'),
+                )
+                if (
+                    not retry
+                    or response.status not in RETRY_STATUSES
+                    or attempt >= self.max_retries
+                    # Not worth holding the caller that long.
+                    or (retry_after or 0) > self.backoff_cap
+                ):
+                    return response
+                logger.warning('%s %s returned %s, retrying', method, url, response.status)
+            time.sleep(max(self.backoff(attempt), retry_after or 0))
+            attempt += 1
+
+    def warm(self, url, connections=1):
+        """Open `connections` keep-alive connections to `url`'s host now.
+
+        They go back into the pool connected, so the first requests skip the
+        TCP and TLS handshakes.
+        """
+        pool = self.pool.connection_from_url(url)
+        taken = []
+        try:
+            for _ in range(connections):
+                conn = pool._get_conn()
+                taken.append(conn)
+                conn.connect()
+        finally:
+            for conn in taken:
+                pool._put_conn(conn)
+
+    def _send(self, method, url, fields, body, headers):
+        if self.governor is None:
+            return self._urlopen(method, url, fields, body, headers)
+        with self.governor.slot() as slot:
+            response = self._urlopen(method, url, fields, body, headers)
+            slot.status = response.status
+            slot.retry_after = ratelimit.parse_retry_after(
+                response.headers.get('Retry-After'),
+            )
+        return response
+
+    def _urlopen(self, method, url, fields, body, headers):
+        if body is None:
+            return self.pool.request(
+                method,
+                url,
+                fields=fields,
+                headers=headers,
+                retries=False,
+            )
+        return self.pool.urlopen(
+            method,
+            url,
+            body=body,
+            headers=headers,
+            retries=False,
+        )